@@ -1,5 +1,6 @@
 import os
 import logging
+import multiprocessing
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
@@ -77,7 +78,9 @@ with app.app_context():
     db.create_all()
     logger.info("Database tables created")
     
-    # Start background document processor
-    from utils.document_processor import start_background_processor
-    start_background_processor()
-    logger.info("Background document processor started")
\ No newline at end of file
+    # Start background document processor, except in the ingestion pool's worker
+    # processes, which import this module when the app was started as __main__
+    if multiprocessing.parent_process() is None:
+        from utils.document_processor import start_background_processor
+        start_background_processor()
+        logger.info("Background document processor started")
\ No newline at end of file
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+"""
+Recall-vs-latency report for the HNSW index against exact search
+
+This script will:
+1. Load the stored chunk embeddings (or generate a synthetic corpus)
+2. Hold out a sample of vectors to use as queries
+3. Build an HNSW graph for each requested M value
+4. Measure recall@k and query latency for each ef_search value,
+   compared with the exact matrix-vector search used by VectorIndex
+5. Extrapolate exact-search latency to a target corpus size (default 1M)
+
+Use the results to pick HNSW_M, HNSW_EF_CONSTRUCTION and HNSW_EF_SEARCH.
+
+Usage:
+    python benchmark_ann_recall.py [--limit 50000] [--m 8 16 32] [--ef 16 32 64 128 256]
+    python benchmark_ann_recall.py --synthetic 20000 --json report.json
+"""
+import sys
+import time
+import json
+import argparse
+import logging
+import numpy as np
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Benchmark HNSW recall and latency against exact search')
+    parser.add_argument('--synthetic', type=int, default=0,
+                        help='Use N synthetic bag-of-words vectors instead of the database')
+    parser.add_argument('--limit', type=int, default=0,
+                        help='Maximum number of stored embeddings to load (default: all)')
+    parser.add_argument('--queries', type=int, default=200, help='Number of held-out query vectors (default: 200)')
+    parser.add_argument('--top-k', type=int, default=5, help='Neighbours per query (default: 5)')
+    parser.add_argument('--m', type=int, nargs='+', default=[8, 16, 32], help='M values to build (default: 8 16 32)')
+    parser.add_argument('--ef-construction', type=int, default=100,
+                        help='ef_construction for every build (default: 100)')
+    parser.add_argument('--ef', type=int, nargs='+', default=[16, 32, 64, 128, 256],
+                        help='ef_search values to test (default: 16 32 64 128 256)')
+    parser.add_argument('--target-size', type=int, default=1000000,
+                        help='Corpus size to extrapolate exact-search latency to (default: 1000000)')
+    parser.add_argument('--vector-size', type=int, default=128,
+                        help='Dimensionality of synthetic vectors (default: 128)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+    parser.add_argument('--json', type=str, default=None, help='Also write the report to this JSON file')
+    return parser.parse_args()
+
+def load_stored_vectors(limit):
+    """Load the active embedding version's stored embeddings from the database"""
+    from app import app
+    from utils.vector_index import iter_stored_embeddings
+    from utils.embedding_versions import get_active_embedding_version
+
+    vectors = []
+    with app.app_context():
+        version = get_active_embedding_version()
+        vector_size = version.vector_size
+        for _, vector in iter_stored_embeddings(vector_size, version.id):
+            vectors.append(vector)
+            if limit and len(vectors) >= limit:
+                break
+
+    if not vectors:
+        return np.zeros((0, vector_size), dtype=np.float32)
+    return np.vstack(vectors).astype(np.float32)
+
+def synthetic_vectors(count, vector_size, rng):
+    """
+    Generate vectors shaped like SimpleEmbedder output: sparse word counts with
+    Zipf-distributed term frequencies and lower-weight bigram positions
+    """
+    vectors = np.zeros((count, vector_size), dtype=np.float32)
+    for row in range(count):
+        length = rng.integers(40, 200)
+        words = np.minimum(rng.zipf(1.3, size=length) - 1, vector_size - 1)
+        np.add.at(vectors[row], words, 1.0)
+        bigrams = rng.integers(40, vector_size, size=length - 1)
+        np.add.at(vectors[row], bigrams, 0.5)
+    return vectors
+
+def normalize(matrix):
+    """Scale rows to unit length"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+def exact_search(matrix, query, top_k):
+    """Exact top-k by cosine similarity, as VectorIndex.search does it"""
+    scores = matrix @ query
+    top = np.argpartition(-scores, top_k - 1)[:top_k]
+    return top[np.argsort(-scores[top])]
+
+def percentile_ms(samples, pct):
+    """Percentile of a list of durations in seconds, as milliseconds"""
+    return float(np.percentile(samples, pct) * 1000)
+
+def main():
+    args = parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    from utils.hnsw_index import HNSWIndex
+
+    if args.synthetic:
+        logger.info(f"Generating {args.synthetic} synthetic vectors")
+        vectors = synthetic_vectors(args.synthetic, args.vector_size, rng)
+    else:
+        logger.info("Loading stored embeddings from the database")
+        vectors = load_stored_vectors(args.limit)
+
+    vectors = normalize(vectors[np.any(vectors != 0, axis=1)])
+    if len(vectors) <= args.queries + args.top_k:
+        logger.error(f"Need more than {args.queries + args.top_k} non-empty vectors, found {len(vectors)}")
+        return 1
+
+    # Hold out queries so they are not trivially their own nearest neighbour
+    order = rng.permutation(len(vectors))
+    queries = vectors[order[:args.queries]]
+    corpus = np.ascontiguousarray(vectors[order[args.queries:]])
+    top_k = args.top_k
+    logger.info(f"Corpus: {len(corpus)} vectors, {len(queries)} queries, top_k={top_k}")
+
+    # Ground truth and exact latency
+    truth = []
+    exact_times = []
+    for query in queries:
+        start = time.perf_counter()
+        truth.append(set(exact_search(corpus, query, top_k).tolist()))
+        exact_times.append(time.perf_counter() - start)
+
+    exact_mean_ms = float(np.mean(exact_times) * 1000)
+    scale = args.target_size / len(corpus)
+    report = {
+        'corpus_size': len(corpus),
+        'queries': len(queries),
+        'top_k': top_k,
+        'exact': {
+            'mean_ms': exact_mean_ms,
+            'p95_ms': percentile_ms(exact_times, 95),
+            'estimated_mean_ms_at_target': exact_mean_ms * scale,
+            'target_size': args.target_size,
+        },
+        'hnsw': [],
+    }
+
+    for m in args.m:
+        index = HNSWIndex(corpus.shape[1], m=m, ef_construction=args.ef_construction, seed=args.seed)
+        start = time.perf_counter()
+        for node, vector in enumerate(corpus):
+            index.add(node, vector)
+        build_seconds = time.perf_counter() - start
+        link_count = sum(len(layer) for node_links in index.links for layer in node_links)
+        logger.info(f"Built M={m} in {build_seconds:.1f}s ({build_seconds / len(corpus) * 1000:.2f} ms/insert)")
+
+        for ef in args.ef:
+            hits = 0
+            times = []
+            for query, expected in zip(queries, truth):
+                start = time.perf_counter()
+                results = index.search(query, top_k=top_k, similarity_threshold=-1.0, ef_search=ef)
+                times.append(time.perf_counter() - start)
+                hits += len(expected & {chunk_id for chunk_id, _ in results})
+
+            report['hnsw'].append({
+                'm': m,
+                'ef_construction': args.ef_construction,
+                'ef_search': ef,
+                'recall': hits / (top_k * len(queries)),
+                'mean_ms': float(np.mean(times) * 1000),
+                'p50_ms': percentile_ms(times, 50),
+                'p95_ms': percentile_ms(times, 95),
+                'build_seconds': build_seconds,
+                'estimated_build_hours_at_target': build_seconds * scale / 3600,
+                'links_per_node': link_count / len(corpus),
+            })
+
+    # Print the report
+    print("\n" + "=" * 80)
+    print(f"Corpus: {len(corpus)} vectors  Queries: {len(queries)}  top_k: {top_k}")
+    print(f"Exact search: mean {exact_mean_ms:.3f} ms, p95 {report['exact']['p95_ms']:.3f} ms "
+          f"(~{report['exact']['estimated_mean_ms_at_target']:.1f} ms at {args.target_size} vectors)")
+    print("=" * 80)
+    print(f"{'M':>4} {'ef':>5} {'recall':>8} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'build s':>9} {'build h @target':>16}")
+    print("-" * 80)
+    for row in report['hnsw']:
+        print(f"{row['m']:>4} {row['ef_search']:>5} {row['recall']:>8.3f} {row['mean_ms']:>9.3f} "
+              f"{row['p50_ms']:>9.3f} {row['p95_ms']:>9.3f} {row['build_seconds']:>9.1f} "
+              f"{row['estimated_build_hours_at_target']:>16.2f}")
+    print("-" * 80)
+    print("HNSW query latency grows roughly with log(N); exact search grows linearly with N.")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Wrote report to {args.json}")
+
+    return 0
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\nBenchmark canceled.")
+        sys.exit(130)
+    except Exception as e:
+        logger.exception(f"Error running benchmark: {str(e)}")
+        sys.exit(1)
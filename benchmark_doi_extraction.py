@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark of DOI extraction over first-5000-character snippets
+
+This script will:
+1. Load a fixture corpus of snippets: .txt files from a directory, the start of
+   the stored documents' text, or a generated corpus of article front matter
+2. Check that the combined scan finds the same candidates as running each
+   pattern with re.finditer
+3. Time, per snippet:
+   - each DOI pattern passed to re.finditer as a string (re's internal cache)
+   - each precompiled DOI pattern with finditer
+   - the combined scan (scan_doi_candidates)
+   - extract_dois end to end
+
+Usage:
+    python benchmark_doi_extraction.py [--snippets 2000] [--repeat 5]
+    python benchmark_doi_extraction.py --fixtures fixtures/doi_snippets
+    python benchmark_doi_extraction.py --from-db --save-fixtures fixtures/doi_snippets
+"""
+import os
+import re
+import sys
+import time
+import json
+import random
+import argparse
+import logging
+import statistics
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Characters of each document searched for DOIs, as in document processing
+SNIPPET_CHARS = 5000
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Benchmark DOI candidate extraction')
+    parser.add_argument('--fixtures', type=str, default=None,
+                        help='Directory of .txt snippets to use instead of a generated corpus')
+    parser.add_argument('--from-db', action='store_true',
+                        help='Use the start of the stored documents\' text instead of a generated corpus')
+    parser.add_argument('--snippets', type=int, default=2000,
+                        help='Number of generated snippets, or maximum number of documents (default: 2000)')
+    parser.add_argument('--save-fixtures', type=str, default=None,
+                        help='Write the corpus to this directory as .txt files')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed passes over the corpus (default: 5)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+    parser.add_argument('--json', type=str, default=None, help='Also write the report to this JSON file')
+    return parser.parse_args()
+
+def load_fixture_snippets(directory, limit):
+    """Read the first SNIPPET_CHARS characters of each .txt file in a directory"""
+    snippets = []
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith('.txt'):
+            continue
+        with open(os.path.join(directory, filename), encoding='utf-8', errors='replace') as f:
+            snippets.append(f.read(SNIPPET_CHARS))
+        if limit and len(snippets) >= limit:
+            break
+    return snippets
+
+def load_stored_snippets(limit):
+    """Take the start of the stored documents' full text"""
+    from app import app, db
+    from models import Document
+
+    with app.app_context():
+        query = (
+            db.session.query(db.func.substr(Document.full_text, 1, SNIPPET_CHARS))
+            .filter(Document.full_text.isnot(None))
+            .order_by(Document.id)
+        )
+        if limit:
+            query = query.limit(limit)
+        return [row[0] for row in query]
+
+def generated_snippets(count, rng):
+    """
+    Generate the front matter of journal articles: a journal line, title,
+    authors, a DOI in one of the forms seen in PDFs and filler text, with
+    some snippets carrying no DOI at all
+    """
+    from utils.doi_validator import JOURNAL_DOI_PATTERNS
+
+    journals = list(JOURNAL_DOI_PATTERNS)
+    words = ('patients disease treatment rheumatoid arthritis lupus interstitial lung '
+             'clinical trial cohort methods results conclusion therapy risk outcome '
+             'inflammation methotrexate biologic response analysis study').split()
+    doi_forms = (
+        'doi: {doi}', 'DOI:{doi}', 'https://doi.org/{doi}', 'http://dx.doi.org/{doi}',
+        '{doi}', '{doi}First published', 'doi:{doi}.', '({doi})'
+    )
+
+    def digits(n):
+        return ''.join(rng.choice('0123456789') for _ in range(n))
+
+    def doi():
+        return rng.choice((
+            f"10.3899/jrheum.{digits(6)}",
+            f"10.1136/annrheumdis-{digits(4)}-{digits(6)}",
+            f"10.1002/art.{digits(5)}",
+            f"10.1093/rheumatology/kea{digits(3)}",
+            f"10.1186/s13075-{digits(3)}-{digits(5)}-{digits(1)}",
+            f"10.1016/j.semarthrit.{digits(4)}.{digits(6)}",
+            f"10.{digits(4)}/{digits(4)}-{digits(4)}.{digits(3)}",
+        ))
+
+    def sentence():
+        return ' '.join(rng.choice(words) for _ in range(rng.randint(8, 25))).capitalize() + '. '
+
+    snippets = []
+    for _ in range(count):
+        parts = [rng.choice(journals), '\n', sentence(), '\n']
+        parts.append(', '.join(f"{rng.choice('ABCDEFGH')}. {rng.choice(words).title()}" for _ in range(rng.randint(2, 8))))
+        parts.append('\n')
+        if rng.random() < 0.8:
+            parts.append(rng.choice(doi_forms).format(doi=doi()) + '\n')
+        while sum(len(part) for part in parts) < SNIPPET_CHARS:
+            parts.append(sentence())
+            # References cite other articles' DOIs
+            if rng.random() < 0.05:
+                parts.append(f"doi:{doi()} ")
+        snippets.append(''.join(parts)[:SNIPPET_CHARS])
+    return snippets
+
+def finditer_candidates(text, patterns, compiled):
+    """The candidates of each pattern in turn, as extraction found them before the combined scan"""
+    candidates = []
+    for pattern in patterns:
+        if compiled:
+            matches = pattern.regex.finditer(text)
+        else:
+            matches = re.finditer(pattern.regex.pattern, text, pattern.regex.flags)
+        for match in matches:
+            candidates.append(match.group(1) if match.lastindex else match.group(0))
+    return candidates
+
+def time_passes(func, snippets, repeat):
+    """Mean time per snippet of each pass over the corpus, in microseconds"""
+    passes = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for snippet in snippets:
+            func(snippet)
+        passes.append((time.perf_counter() - start) / len(snippets) * 1e6)
+    return passes
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+
+    from utils.doi_validator import DOI_PATTERNS, JOURNAL_SCAN_PATTERNS, scan_doi_candidates, extract_dois
+
+    if args.fixtures:
+        logger.info(f"Loading snippets from {args.fixtures}")
+        snippets = load_fixture_snippets(args.fixtures, args.snippets)
+    elif args.from_db:
+        logger.info("Loading snippets of the stored documents")
+        snippets = load_stored_snippets(args.snippets)
+    else:
+        logger.info(f"Generating {args.snippets} snippets")
+        snippets = generated_snippets(args.snippets, rng)
+
+    snippets = [snippet for snippet in snippets if snippet]
+    if not snippets:
+        logger.error("No snippets to benchmark")
+        return 1
+
+    if args.save_fixtures:
+        os.makedirs(args.save_fixtures, exist_ok=True)
+        for index, snippet in enumerate(snippets):
+            with open(os.path.join(args.save_fixtures, f"snippet_{index:05d}.txt"), 'w', encoding='utf-8') as f:
+                f.write(snippet)
+        logger.info(f"Wrote {len(snippets)} snippets to {args.save_fixtures}")
+
+    # Every pattern, as if each snippet were from every known journal
+    patterns = DOI_PATTERNS + [pattern for journal in JOURNAL_SCAN_PATTERNS.values() for pattern in journal]
+
+    mismatches = 0
+    candidate_count = 0
+    for snippet in snippets:
+        expected = finditer_candidates(snippet, patterns, compiled=True)
+        found = [candidate.doi for candidate in scan_doi_candidates(snippet, patterns)]
+        candidate_count += len(found)
+        if found != expected:
+            mismatches += 1
+    if mismatches:
+        logger.error(f"The combined scan differs from per-pattern finditer on {mismatches} snippets")
+
+    # re.finditer with a pattern string goes through re's internal cache
+    runs = [
+        ('per-pattern re.finditer(str)', lambda snippet: finditer_candidates(snippet, patterns, compiled=False)),
+        ('per-pattern compiled finditer', lambda snippet: finditer_candidates(snippet, patterns, compiled=True)),
+        ('combined scan', lambda snippet: scan_doi_candidates(snippet, patterns)),
+        ('extract_dois', extract_dois),
+    ]
+    report = {
+        'snippets': len(snippets),
+        'patterns': len(patterns),
+        'candidates': candidate_count,
+        'mismatches': mismatches,
+        'timings': [],
+    }
+    # Journal-specific DOIs are logged as they are found
+    logging.getLogger('utils.doi_validator').setLevel(logging.WARNING)
+    for name, func in runs:
+        passes = time_passes(func, snippets, args.repeat)
+        report['timings'].append({
+            'name': name,
+            'mean_us': statistics.mean(passes),
+            'best_us': min(passes),
+        })
+
+    # Print the report
+    baseline = report['timings'][0]['best_us']
+    print("\n" + "=" * 72)
+    print(f"Snippets: {len(snippets)}  Patterns: {len(patterns)}  Candidates: {candidate_count}  "
+          f"Mismatches: {mismatches}")
+    print("=" * 72)
+    print(f"{'':<32} {'mean us/snippet':>16} {'best us/snippet':>16} {'speedup':>8}")
+    print("-" * 72)
+    for row in report['timings']:
+        print(f"{row['name']:<32} {row['mean_us']:>16.1f} {row['best_us']:>16.1f} "
+              f"{baseline / row['best_us']:>7.1f}x")
+    print("-" * 72)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Wrote report to {args.json}")
+
+    return 0 if not mismatches else 1
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\nBenchmark canceled.")
+        sys.exit(130)
+    except Exception as e:
+        logger.exception(f"Error running benchmark: {str(e)}")
+        sys.exit(1)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""
+Utility script to build a new embedding version alongside the active one.
+
+This script will:
+1. Register a new embedder configuration (vector size and hashing scheme)
+2. Embed every text chunk into the new version while search keeps using the active one
+3. Optionally switch search to the new version once every chunk is embedded
+
+Building can be interrupted and resumed with --resume; only chunks without an
+embedding in the version are encoded.
+
+Usage:
+    python build_embedding_version.py --vector-size 256 [--hashing md5] [--activate]
+    python build_embedding_version.py --resume 3 --activate
+    python build_embedding_version.py --activate-only 2
+    python build_embedding_version.py --list
+
+Note: This script needs to be run in the Flask application context
+"""
+import sys
+import json
+import argparse
+import logging
+from datetime import datetime
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Build and activate embedding versions')
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument('--vector-size', type=int, help='Dimensionality of the new version')
+    action.add_argument('--resume', type=int, metavar='VERSION_ID', help='Continue building an existing version')
+    action.add_argument('--activate-only', type=int, metavar='VERSION_ID',
+                        help='Switch search to an already built (or retired) version')
+    action.add_argument('--list', action='store_true', help='List embedding versions and exit')
+    parser.add_argument('--hashing', type=str, default='md5', help='Hashing scheme of the new version (default: md5)')
+    parser.add_argument('--activate', action='store_true', help='Activate the version once it is complete')
+    parser.add_argument('--batch-size', type=int, default=500, help='Chunks encoded per batch (default: 500)')
+    return parser.parse_args()
+
+def main():
+    """Main function to build an embedding version"""
+    args = parse_args()
+
+    # Import here to ensure Flask app context is available
+    from app import app
+    from utils.embedding_versions import (
+        create_embedding_version,
+        populate_embedding_version,
+        activate_embedding_version,
+        list_embedding_versions
+    )
+
+    with app.app_context():
+        if args.list:
+            print(json.dumps(list_embedding_versions(), indent=2))
+            return 0
+
+        if args.activate_only:
+            results = activate_embedding_version(args.activate_only)
+            if 'error' in results:
+                logger.error(results['error'])
+                return 1
+            logger.info(f"Embedding version {results['activated']} is now active")
+            return 0
+
+        if args.resume:
+            version_id = args.resume
+        else:
+            version_id = create_embedding_version(args.vector_size, hashing=args.hashing).id
+
+        start_time = datetime.now()
+        logger.info(f"Building embedding version {version_id}")
+        results = populate_embedding_version(version_id, batch_size=args.batch_size)
+        if 'error' in results:
+            logger.error(results['error'])
+            return 1
+        logger.info(f"Embedded {results['success']} chunks with {results['errors']} errors "
+                    f"in {datetime.now() - start_time}")
+
+        if args.activate:
+            results = activate_embedding_version(version_id)
+            if 'error' in results:
+                logger.error(results['error'])
+                return 1
+            logger.info(f"Embedding version {version_id} is now active (retired {results['retired']})")
+        else:
+            logger.info(f"Run with --activate-only {version_id} to switch search to the new version")
+
+        return 0
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\nBuild interrupted; run again with --resume to continue.")
+        sys.exit(130)
+    except Exception as e:
+        logger.exception(f"Error building embedding version: {str(e)}")
+        sys.exit(1)
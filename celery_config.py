@@ -49,6 +49,14 @@ def setup_celery(app):
             'task': 'tasks.update_system_metrics_task',
             'schedule': 60.0,  # Every minute
         },
+        'prune-embedding-change-log-every-hour': {
+            'task': 'tasks.prune_embedding_change_log_task',
+            'schedule': 3600.0,  # Every hour
+        },
+        'prune-embedding-vectors-every-hour': {
+            'task': 'tasks.prune_embedding_vectors_task',
+            'schedule': 3600.0,  # Every hour
+        },
     }
 
     # Set base task for context
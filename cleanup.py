@@ -5,7 +5,7 @@ Database cleanup utility to reset all documents, chunks, embeddings, and process
 import os
 import logging
 from app import app, db
-from models import Document, TextChunk, VectorEmbedding, ProcessingQueue, QueryHistory
+from models import Document, TextChunk, VectorEmbedding, EmbeddingVector, ProcessingQueue, QueryHistory
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -35,6 +35,10 @@ def clean_database():
             embedding_count = VectorEmbedding.query.delete()
             logger.info(f"Deleted {embedding_count} vector embeddings")
             
+            # Delete the vectors they shared
+            vector_count = EmbeddingVector.query.delete()
+            logger.info(f"Deleted {vector_count} shared embedding vectors")
+            
             # Delete text chunks
             chunk_count = TextChunk.query.delete()
             logger.info(f"Deleted {chunk_count} text chunks")
@@ -51,6 +55,10 @@ def clean_database():
             document_count = Document.query.delete()
             logger.info(f"Deleted {document_count} documents")
             
+            # Force in-memory vector indexes to rebuild
+            from utils.vector_index import record_embedding_changes
+            record_embedding_changes(reset=True)
+            
             # Commit the changes
             db.session.commit()
             logger.info("Database cleanup completed successfully")
@@ -31,6 +31,8 @@ def parse_args():
     parser.add_argument('query', type=str, help='Search query')
     parser.add_argument('--top-k', type=int, default=5, help='Number of chunks to retrieve (default: 5)')
     parser.add_argument('--threshold', type=float, default=0.3, help='Similarity threshold (default: 0.3)')
+    parser.add_argument('--ef-search', type=int, default=None,
+                        help='Candidate list size for approximate search (default: HNSW_EF_SEARCH)')
     parser.add_argument('--full-text', action='store_true', help='Show full text of chunks (default: show preview)')
     return parser.parse_args()
 
@@ -46,7 +48,8 @@ def main():
     with app.app_context():
         # Search for similar chunks
         print(f"\nSearching for: \"{args.query}\"")
-        similar_chunks = search_similar_chunks(args.query, top_k=args.top_k, similarity_threshold=args.threshold)
+        similar_chunks = search_similar_chunks(args.query, top_k=args.top_k, similarity_threshold=args.threshold,
+                                               ef_search=args.ef_search)
         
         if not similar_chunks:
             print("No relevant chunks found for your query.")
@@ -0,0 +1,178 @@
+"""
+Database migration script to enable pgvector-backed similarity search.
+
+This script will:
+1. Create the pgvector extension if it isn't installed
+2. Add the embedding_vec vector column to the vector_embedding table if it doesn't exist
+3. Backfill embedding_vec from the stored embeddings in batches
+4. Build an HNSW (default) or IVFFlat cosine index on the column
+
+Once the column exists, search_similar_chunks sends queries to PostgreSQL
+(unless EMBEDDING_SEARCH_BACKEND=numpy) and new embeddings are copied into the
+column as they are written.
+
+Usage:
+    python enable_pgvector.py [--dimensions 128] [--index hnsw|ivfflat] [--m 16] [--ef-construction 64] [--lists 100]
+"""
+import sys
+import os
+import argparse
+import logging
+import numpy as np
+from sqlalchemy import text, create_engine
+
+from fix_text_chunk_schema import check_column_exists, add_column_to_table
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "ix_vector_embedding_embedding_vec"
+
+# Must match utils.embeddings.SPARSE_BLOB_MAGIC
+SPARSE_BLOB_MAGIC = b'SPV1'
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Enable pgvector similarity search')
+    parser.add_argument('--dimensions', type=int, default=128,
+                        help='Embedding dimensionality (default: 128, the SimpleEmbedder vector size)')
+    parser.add_argument('--index', choices=['hnsw', 'ivfflat', 'none'], default='hnsw',
+                        help='Type of ANN index to build (default: hnsw)')
+    parser.add_argument('--m', type=int, default=16,
+                        help='HNSW: maximum connections per node (default: 16)')
+    parser.add_argument('--ef-construction', type=int, default=64,
+                        help='HNSW: candidate list size while building (default: 64)')
+    parser.add_argument('--lists', type=int, default=100,
+                        help='IVFFlat: number of inverted lists (default: 100)')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='Rows backfilled per transaction (default: 1000)')
+    return parser.parse_args()
+
+def to_vector_literal(embedding):
+    """Format an embedding as a pgvector text literal"""
+    return "[" + ",".join(repr(float(value)) for value in embedding) + "]"
+
+def decode_blob(blob):
+    """Decode a dense or sparse embedding blob into a dense float32 vector"""
+    if bytes(blob[:4]) != SPARSE_BLOB_MAGIC:
+        return np.frombuffer(blob, dtype='<f4')
+    vector_size = int(np.frombuffer(blob, dtype='<u4', count=1, offset=4)[0])
+    nnz = (len(blob) - 8) // 8
+    vector = np.zeros(vector_size, dtype=np.float32)
+    vector[np.frombuffer(blob, dtype='<i4', count=nnz, offset=8)] = np.frombuffer(
+        blob, dtype='<f4', count=nnz, offset=8 + 4 * nnz)
+    return vector
+
+def backfill_batch(engine, last_id, batch_size, dimensions):
+    """
+    Fill embedding_vec for one batch of rows
+
+    Returns:
+        tuple: (number of rows filled, highest id in the batch or None when done)
+    """
+    with engine.begin() as connection:
+        # Rows sharing a vector (vector_id) read it from embedding_vector
+        rows = connection.execute(text("""
+            SELECT ve.id,
+                   COALESCE(ve.embedding_blob, ev.embedding_blob),
+                   COALESCE(ve.embedding, ev.embedding)
+            FROM vector_embedding ve
+            LEFT JOIN embedding_vector ev ON ev.id = ve.vector_id
+            WHERE ve.id > :last_id
+            AND ve.embedding_vec IS NULL
+            ORDER BY ve.id
+            LIMIT :batch_size
+        """), {"last_id": last_id, "batch_size": batch_size}).all()
+
+        if not rows:
+            return 0, None
+
+        params = []
+        for row_id, embedding_blob, embedding in rows:
+            if embedding_blob:
+                vector = decode_blob(embedding_blob)
+            elif embedding:
+                vector = np.asarray(embedding, dtype=np.float32)
+            else:
+                continue
+            if len(vector) != dimensions:
+                logger.warning(f"Skipping embedding {row_id}: expected {dimensions} dimensions, found {len(vector)}")
+                continue
+            params.append({"id": row_id, "vec": to_vector_literal(vector)})
+
+        if params:
+            connection.execute(
+                text("UPDATE vector_embedding SET embedding_vec = CAST(:vec AS vector) WHERE id = :id"),
+                params
+            )
+
+        return len(params), rows[-1][0]
+
+def create_index(engine, args):
+    """Build the ANN index on embedding_vec"""
+    if args.index == 'hnsw':
+        index_sql = (f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME} ON vector_embedding "
+                     f"USING hnsw (embedding_vec vector_cosine_ops) "
+                     f"WITH (m = {args.m}, ef_construction = {args.ef_construction})")
+    else:
+        index_sql = (f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME} ON vector_embedding "
+                     f"USING ivfflat (embedding_vec vector_cosine_ops) WITH (lists = {args.lists})")
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text(index_sql))
+    logger.info(f"Created {args.index} index {INDEX_NAME}")
+
+def main():
+    args = parse_args()
+
+    try:
+        # Get database URL from environment variable
+        database_url = os.environ.get("DATABASE_URL")
+        if not database_url:
+            logger.error("DATABASE_URL environment variable is not set")
+            sys.exit(1)
+
+        # Handle Render's postgres vs postgresql prefix for SQLAlchemy
+        if database_url and database_url.startswith("postgres://"):
+            database_url = database_url.replace("postgres://", "postgresql://", 1)
+
+        # Create SQLAlchemy engine
+        engine = create_engine(database_url)
+
+        # Install the extension (requires sufficient privileges on managed databases)
+        with engine.begin() as connection:
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        logger.info("pgvector extension is installed")
+
+        if not check_column_exists(engine, "vector_embedding", "embedding_vec"):
+            logger.info("The embedding_vec column does not exist in the vector_embedding table. Adding it now...")
+            if not add_column_to_table(engine, "vector_embedding", "embedding_vec", f"vector({args.dimensions})",
+                                       nullable=True):
+                return False
+        else:
+            logger.info("The embedding_vec column already exists in the vector_embedding table")
+
+        # Backfill existing rows using keyset pagination on the primary key
+        filled = 0
+        last_id = 0
+        while last_id is not None:
+            count, last_id = backfill_batch(engine, last_id, args.batch_size, args.dimensions)
+            filled += count
+            if last_id is not None:
+                logger.info(f"Backfilled {filled} embeddings (last id {last_id})")
+
+        if args.index != 'none':
+            create_index(engine, args)
+
+        logger.info(f"pgvector migration completed successfully: {filled} rows backfilled")
+        return True
+
+    except Exception as e:
+        logger.error(f"Migration error: {e}")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
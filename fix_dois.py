@@ -8,7 +8,7 @@ This script will:
 
 from app import app, db
 from models import Document
-from utils.doi_validator import check_doi_exists
+from utils.doi_validator import check_doi_exists, ARD_DOI_PATTERN
 from utils.citation_generator import generate_apa_citation
 import re
 import logging
@@ -19,15 +19,15 @@ logger = logging.getLogger(__name__)
 # Common patterns to fix DOIs
 DOI_CLEANUP_PATTERNS = [
     # Pattern for incorrectly attached capitalized words - handles cases like "10.1136/annrheumdis-2017-211138Clinical"
-    (r'(10\.\d{4,9}/[-._;\(\)/:a-zA-Z0-9-]+?)([A-Z][a-z]+(?:[A-Z][a-z]+)*)', r'\1'),
+    (re.compile(r'(10\.\d{4,9}/[-._;\(\)/:a-zA-Z0-9-]+?)([A-Z][a-z]+(?:[A-Z][a-z]+)*)'), r'\1'),
     # Remove any whitespace in DOIs
-    (r'(10\.\d{4,9}/\S*)\s+(\S*)', r'\1\2'),
+    (re.compile(r'(10\.\d{4,9}/\S*)\s+(\S*)'), r'\1\2'),
     # Fix common typos in DOI prefixes
-    (r'10,(\d{4,9}/)', r'10.\1'),
+    (re.compile(r'10,(\d{4,9}/)'), r'10.\1'),
     # Remove trailing punctuation
-    (r'(10\.\d{4,9}/[^.,;:]+)[.,;:]', r'\1'),
+    (re.compile(r'(10\.\d{4,9}/[^.,;:]+)[.,;:]'), r'\1'),
     # Specific pattern for Annals of the Rheumatic Diseases DOIs (common in rheumatology)
-    (r'(10\.\d{4}/annrheumdis-\d{4}-\d+)[^\d].*', r'\1'),
+    (re.compile(r'(10\.\d{4}/annrheumdis-\d{4}-\d+)[^\d].*'), r'\1'),
 ]
 
 def clean_doi(doi):
@@ -39,7 +39,7 @@ def clean_doi(doi):
     
     # Apply each cleanup pattern
     for pattern, replacement in DOI_CLEANUP_PATTERNS:
-        cleaned_doi = re.sub(pattern, replacement, cleaned_doi)
+        cleaned_doi = pattern.sub(replacement, cleaned_doi)
     
     # Check if the doi has any common suffixes that need to be removed
     common_suffixes = [
@@ -56,7 +56,7 @@ def clean_doi(doi):
     # Further cleanup for special journal patterns
     if 'annrheumdis' in cleaned_doi.lower():
         # Try to extract just the ARD journal pattern
-        ard_match = re.search(r'(10\.\d{4}/annrheumdis-\d{4}-\d+)', cleaned_doi)
+        ard_match = ARD_DOI_PATTERN.search(cleaned_doi)
         if ard_match:
             cleaned_doi = ard_match.group(1)
     
@@ -0,0 +1,101 @@
+"""
+Database migration script to add normalized-text hashes to text chunks.
+
+This script will:
+1. Add the text_hash column to the text_chunk table if it doesn't exist
+2. Index it without blocking writes, for embedding reuse and search deduplication
+3. Fill in the hash of existing chunks in batches
+
+Usage:
+    python migrate_chunk_text_hash.py [--batch-size N]
+"""
+import sys
+import os
+import hashlib
+import logging
+import argparse
+from sqlalchemy import text, create_engine
+
+from fix_text_chunk_schema import check_column_exists, add_column_to_table
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+logger = logging.getLogger(__name__)
+
+def chunk_text_hash(chunk_text):
+    """Same hash as utils.embeddings.chunk_text_hash, without loading the app"""
+    if not chunk_text:
+        return None
+    return hashlib.sha256(' '.join(chunk_text.lower().split()).encode('utf-8')).hexdigest()
+
+def backfill_text_hashes(engine, batch_size):
+    """Hash the text of chunks that don't have a text hash yet, one batch per transaction"""
+    last_id = 0
+    updated = 0
+    while True:
+        with engine.begin() as connection:
+            chunks = connection.execute(
+                text(
+                    "SELECT id, text FROM text_chunk WHERE id > :last_id AND text_hash IS NULL "
+                    "ORDER BY id LIMIT :batch_size"
+                ),
+                {"last_id": last_id, "batch_size": batch_size}
+            ).fetchall()
+            if not chunks:
+                break
+
+            connection.execute(
+                text("UPDATE text_chunk SET text_hash = :text_hash WHERE id = :id"),
+                [{"text_hash": chunk_text_hash(chunk_text), "id": chunk_id} for chunk_id, chunk_text in chunks]
+            )
+
+        last_id = chunks[-1][0]
+        updated += len(chunks)
+        logger.info(f"Hashed {updated} chunks (up to ID {last_id})")
+
+    logger.info(f"Filled in the text hash of {updated} chunks")
+
+def main():
+    parser = argparse.ArgumentParser(description='Add normalized-text hashes to text chunks')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Chunks hashed per transaction')
+    args = parser.parse_args()
+
+    try:
+        # Get database URL from environment variable
+        database_url = os.environ.get("DATABASE_URL")
+        if not database_url:
+            logger.error("DATABASE_URL environment variable is not set")
+            sys.exit(1)
+
+        # Handle Render's postgres vs postgresql prefix for SQLAlchemy
+        if database_url and database_url.startswith("postgres://"):
+            database_url = database_url.replace("postgres://", "postgresql://", 1)
+
+        # Create SQLAlchemy engine
+        engine = create_engine(database_url)
+
+        if check_column_exists(engine, "text_chunk", "text_hash"):
+            logger.info("The text_hash column already exists in the text_chunk table")
+        else:
+            logger.info("The text_hash column does not exist in the text_chunk table. Adding it now...")
+            if not add_column_to_table(engine, "text_chunk", "text_hash", "VARCHAR(64)", nullable=True):
+                return False
+
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_text_chunk_text_hash ON text_chunk (text_hash)"
+            ))
+
+        backfill_text_hashes(engine, args.batch_size)
+
+        logger.info("Chunk text hash migration completed successfully")
+        return True
+
+    except Exception as e:
+        logger.error(f"Migration error: {e}")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
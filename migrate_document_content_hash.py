@@ -0,0 +1,95 @@
+"""
+Database migration script to add content hashes to documents.
+
+This script will:
+1. Add the content_hash column to the document table if it doesn't exist
+2. Index it without blocking writes, for the duplicate check at upload
+3. Fill in the hash of existing documents whose PDF is still in the uploads folder
+
+Usage:
+    python migrate_document_content_hash.py
+"""
+import sys
+import os
+import hashlib
+import logging
+from sqlalchemy import text, create_engine
+
+from fix_text_chunk_schema import check_column_exists, add_column_to_table
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+logger = logging.getLogger(__name__)
+
+UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads")
+
+def backfill_content_hashes(engine):
+    """Hash the PDFs of documents that don't have a content hash yet"""
+    with engine.connect() as connection:
+        documents = connection.execute(text(
+            "SELECT id, filename FROM document WHERE content_hash IS NULL"
+        )).fetchall()
+
+    updated = 0
+    for document_id, filename in documents:
+        file_path = os.path.join(UPLOAD_FOLDER, filename or "")
+        if not filename or not os.path.isfile(file_path):
+            logger.warning(f"File of document {document_id} not found, leaving its content hash empty")
+            continue
+
+        # Same digest as utils.document_dedup.compute_content_hash, without loading the app
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as pdf_file:
+            for block in iter(lambda: pdf_file.read(1024 * 1024), b''):
+                digest.update(block)
+        content_hash = digest.hexdigest()
+
+        with engine.begin() as connection:
+            connection.execute(
+                text("UPDATE document SET content_hash = :content_hash WHERE id = :id"),
+                {"content_hash": content_hash, "id": document_id}
+            )
+        updated += 1
+
+    logger.info(f"Filled in the content hash of {updated} of {len(documents)} documents")
+
+def main():
+    try:
+        # Get database URL from environment variable
+        database_url = os.environ.get("DATABASE_URL")
+        if not database_url:
+            logger.error("DATABASE_URL environment variable is not set")
+            sys.exit(1)
+
+        # Handle Render's postgres vs postgresql prefix for SQLAlchemy
+        if database_url and database_url.startswith("postgres://"):
+            database_url = database_url.replace("postgres://", "postgresql://", 1)
+
+        # Create SQLAlchemy engine
+        engine = create_engine(database_url)
+
+        if check_column_exists(engine, "document", "content_hash"):
+            logger.info("The content_hash column already exists in the document table")
+        else:
+            logger.info("The content_hash column does not exist in the document table. Adding it now...")
+            if not add_column_to_table(engine, "document", "content_hash", "VARCHAR(64)", nullable=True):
+                return False
+
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_document_content_hash ON document (content_hash)"
+            ))
+
+        backfill_content_hashes(engine)
+
+        logger.info("Document content hash migration completed successfully")
+        return True
+
+    except Exception as e:
+        logger.error(f"Migration error: {e}")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,133 @@
+"""
+Database migration script to move vector embeddings from the float8[] column to
+the compact float32 binary column.
+
+This script will:
+1. Add the embedding_blob column to the vector_embedding table if it doesn't exist
+2. Convert existing rows in batches, committing after each batch
+3. Optionally clear the legacy float8[] values once a row has been converted
+
+The conversion is resumable: only rows without an embedding_blob are selected,
+so the script can be interrupted and run again.
+
+Usage:
+    python migrate_embedding_storage.py [--batch-size 1000] [--clear-array]
+"""
+import sys
+import os
+import argparse
+import logging
+import numpy as np
+from sqlalchemy import text, create_engine
+
+from fix_text_chunk_schema import check_column_exists, add_column_to_table
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+logger = logging.getLogger(__name__)
+
+# Must match utils.embeddings.EMBEDDING_BLOB_DTYPE
+EMBEDDING_BLOB_DTYPE = np.dtype('<f4')
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Convert vector embeddings to the binary storage format')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='Number of rows converted per transaction (default: 1000)')
+    parser.add_argument('--clear-array', action='store_true',
+                        help='Set the legacy float8[] column to NULL for converted rows')
+    return parser.parse_args()
+
+def convert_batch(engine, last_id, batch_size, clear_array):
+    """
+    Convert one batch of rows that still lack a binary embedding
+
+    Args:
+        engine: SQLAlchemy engine
+        last_id (int): Highest vector_embedding.id already visited
+        batch_size (int): Maximum rows to convert
+        clear_array (bool): Whether to clear the legacy column of converted rows
+
+    Returns:
+        tuple: (number of rows converted, highest id in the batch or None when done)
+    """
+    with engine.begin() as connection:
+        rows = connection.execute(text("""
+            SELECT id, embedding
+            FROM vector_embedding
+            WHERE id > :last_id
+            AND embedding_blob IS NULL
+            AND embedding IS NOT NULL
+            ORDER BY id
+            LIMIT :batch_size
+        """), {"last_id": last_id, "batch_size": batch_size}).all()
+
+        if not rows:
+            return 0, None
+
+        params = [
+            {"id": row_id, "blob": np.asarray(embedding, dtype=EMBEDDING_BLOB_DTYPE).tobytes()}
+            for row_id, embedding in rows
+        ]
+
+        if clear_array:
+            update_stmt = text("UPDATE vector_embedding SET embedding_blob = :blob, embedding = NULL WHERE id = :id")
+        else:
+            update_stmt = text("UPDATE vector_embedding SET embedding_blob = :blob WHERE id = :id")
+        connection.execute(update_stmt, params)
+
+        return len(rows), rows[-1][0]
+
+def main():
+    args = parse_args()
+
+    try:
+        # Get database URL from environment variable
+        database_url = os.environ.get("DATABASE_URL")
+        if not database_url:
+            logger.error("DATABASE_URL environment variable is not set")
+            sys.exit(1)
+
+        # Handle Render's postgres vs postgresql prefix for SQLAlchemy
+        if database_url and database_url.startswith("postgres://"):
+            database_url = database_url.replace("postgres://", "postgresql://", 1)
+
+        # Create SQLAlchemy engine
+        engine = create_engine(database_url)
+
+        # Make sure the binary column exists
+        if not check_column_exists(engine, "vector_embedding", "embedding_blob"):
+            logger.info("The embedding_blob column does not exist in the vector_embedding table. Adding it now...")
+            if not add_column_to_table(engine, "vector_embedding", "embedding_blob", "BYTEA", nullable=True):
+                return False
+        else:
+            logger.info("The embedding_blob column already exists in the vector_embedding table")
+
+        # Convert rows in batches using keyset pagination on the primary key
+        with engine.connect() as connection:
+            remaining = connection.execute(text(
+                "SELECT COUNT(*) FROM vector_embedding WHERE embedding_blob IS NULL AND embedding IS NOT NULL"
+            )).scalar()
+        logger.info(f"Found {remaining} embeddings to convert")
+
+        converted = 0
+        last_id = 0
+        while True:
+            count, last_id = convert_batch(engine, last_id, args.batch_size, args.clear_array)
+            if not count:
+                break
+            converted += count
+            logger.info(f"Converted {converted}/{remaining} embeddings (last id {last_id})")
+
+        logger.info(f"Embedding storage migration completed successfully: {converted} rows converted")
+        if args.clear_array and converted:
+            logger.info("Run VACUUM on vector_embedding to reclaim the space used by the cleared arrays")
+        return True
+
+    except Exception as e:
+        logger.error(f"Migration error: {e}")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
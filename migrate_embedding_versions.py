@@ -0,0 +1,177 @@
+"""
+Database migration script to introduce versioned embedding sets.
+
+This script will:
+1. Create the embedding_model_version table if it doesn't exist
+2. Register the current embedder configuration as the active version
+3. Add the model_version column to the vector_embedding table if it doesn't exist
+4. Assign existing embeddings to the active version in batches, committing after each batch
+5. Index vector_embedding.model_version without blocking writes
+
+The backfill is resumable: only rows without a model_version are selected,
+so the script can be interrupted and run again.
+
+Usage:
+    python migrate_embedding_versions.py [--vector-size 128] [--hashing md5] [--batch-size 5000]
+"""
+import sys
+import os
+import argparse
+import logging
+from sqlalchemy import text, create_engine
+
+from fix_text_chunk_schema import check_column_exists, add_column_to_table
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+logger = logging.getLogger(__name__)
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Add embedding versions to the vector_embedding table')
+    parser.add_argument('--vector-size', type=int, default=int(os.environ.get("EMBEDDING_VECTOR_SIZE", 128)),
+                        help='Dimensionality of the existing embeddings (default: EMBEDDING_VECTOR_SIZE or 128)')
+    parser.add_argument('--hashing', type=str, default=os.environ.get("EMBEDDING_HASHING", "md5"),
+                        help='Hashing scheme of the existing embeddings (default: EMBEDDING_HASHING or md5)')
+    parser.add_argument('--batch-size', type=int, default=5000,
+                        help='Number of rows updated per transaction (default: 5000)')
+    return parser.parse_args()
+
+def create_version_table(engine):
+    """Create the embedding_model_version table and its single-active-version index"""
+    with engine.begin() as connection:
+        connection.execute(text("""
+            CREATE TABLE IF NOT EXISTS embedding_model_version (
+                id SERIAL PRIMARY KEY,
+                name VARCHAR(100) NOT NULL,
+                vector_size INTEGER NOT NULL,
+                hashing VARCHAR(20) NOT NULL DEFAULT 'md5',
+                status VARCHAR(20) NOT NULL DEFAULT 'building',
+                created_at TIMESTAMP WITHOUT TIME ZONE,
+                activated_at TIMESTAMP WITHOUT TIME ZONE
+            )
+        """))
+        connection.execute(text("""
+            CREATE UNIQUE INDEX IF NOT EXISTS uq_embedding_model_version_active
+            ON embedding_model_version (status)
+            WHERE status = 'active'
+        """))
+
+def ensure_active_version(engine, vector_size, hashing):
+    """
+    Get the active version, registering the given configuration if there is none
+
+    Returns:
+        int: ID of the active version
+    """
+    with engine.begin() as connection:
+        version_id = connection.execute(text(
+            "SELECT id FROM embedding_model_version WHERE status = 'active'"
+        )).scalar()
+        if version_id is not None:
+            logger.info(f"Embedding version {version_id} is already active")
+            return version_id
+
+        version_id = connection.execute(text("""
+            INSERT INTO embedding_model_version (name, vector_size, hashing, status, created_at, activated_at)
+            VALUES (:name, :vector_size, :hashing, 'active', NOW() AT TIME ZONE 'utc', NOW() AT TIME ZONE 'utc')
+            RETURNING id
+        """), {"name": f"simple-{hashing}-{vector_size}", "vector_size": vector_size, "hashing": hashing}).scalar()
+        logger.info(f"Registered embedding version {version_id} (simple-{hashing}-{vector_size}) as active")
+        return version_id
+
+def backfill_batch(engine, last_id, batch_size, version_id):
+    """
+    Assign one batch of unversioned rows to a version
+
+    Args:
+        engine: SQLAlchemy engine
+        last_id (int): Highest vector_embedding.id already visited
+        batch_size (int): Maximum rows to update
+        version_id (int): Version to assign
+
+    Returns:
+        tuple: (number of rows updated, highest id in the batch or None when done)
+    """
+    with engine.begin() as connection:
+        ids = connection.execute(text("""
+            SELECT id
+            FROM vector_embedding
+            WHERE id > :last_id
+            AND model_version IS NULL
+            ORDER BY id
+            LIMIT :batch_size
+        """), {"last_id": last_id, "batch_size": batch_size}).scalars().all()
+
+        if not ids:
+            return 0, None
+
+        connection.execute(
+            text("UPDATE vector_embedding SET model_version = :version_id WHERE id = ANY(:ids)"),
+            {"version_id": version_id, "ids": list(ids)}
+        )
+        return len(ids), ids[-1]
+
+def main():
+    args = parse_args()
+
+    try:
+        # Get database URL from environment variable
+        database_url = os.environ.get("DATABASE_URL")
+        if not database_url:
+            logger.error("DATABASE_URL environment variable is not set")
+            sys.exit(1)
+
+        # Handle Render's postgres vs postgresql prefix for SQLAlchemy
+        if database_url and database_url.startswith("postgres://"):
+            database_url = database_url.replace("postgres://", "postgresql://", 1)
+
+        # Create SQLAlchemy engine
+        engine = create_engine(database_url)
+
+        create_version_table(engine)
+        version_id = ensure_active_version(engine, args.vector_size, args.hashing)
+
+        # Make sure the version column exists
+        if not check_column_exists(engine, "vector_embedding", "model_version"):
+            logger.info("The model_version column does not exist in the vector_embedding table. Adding it now...")
+            if not add_column_to_table(engine, "vector_embedding", "model_version", "INTEGER", nullable=True,
+                                       foreign_key=("embedding_model_version", "id")):
+                return False
+        else:
+            logger.info("The model_version column already exists in the vector_embedding table")
+
+        # Assign rows in batches using keyset pagination on the primary key
+        with engine.connect() as connection:
+            remaining = connection.execute(text(
+                "SELECT COUNT(*) FROM vector_embedding WHERE model_version IS NULL"
+            )).scalar()
+        logger.info(f"Found {remaining} embeddings without a version")
+
+        updated = 0
+        last_id = 0
+        while True:
+            count, last_id = backfill_batch(engine, last_id, args.batch_size, version_id)
+            if not count:
+                break
+            updated += count
+            logger.info(f"Assigned {updated}/{remaining} embeddings to version {version_id} (last id {last_id})")
+
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_vector_embedding_model_version "
+                "ON vector_embedding (model_version)"
+            ))
+
+        logger.info(f"Embedding version migration completed successfully: {updated} rows assigned "
+                    f"to version {version_id}")
+        return True
+
+    except Exception as e:
+        logger.error(f"Migration error: {e}")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
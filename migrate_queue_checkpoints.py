@@ -0,0 +1,61 @@
+"""
+Database migration script to add ingestion checkpoints to the processing queue.
+
+This script will:
+1. Add the stage and checkpoint columns to the processing_queue table if they don't exist
+
+Existing entries have no checkpoint and are processed from the start.
+
+Usage:
+    python migrate_queue_checkpoints.py
+"""
+import sys
+import os
+import logging
+from sqlalchemy import create_engine
+
+from fix_text_chunk_schema import check_column_exists, add_column_to_table
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_COLUMNS = (
+    ("stage", "VARCHAR(20)"),
+    ("checkpoint", "JSON"),
+)
+
+def main():
+    try:
+        # Get database URL from environment variable
+        database_url = os.environ.get("DATABASE_URL")
+        if not database_url:
+            logger.error("DATABASE_URL environment variable is not set")
+            sys.exit(1)
+
+        # Handle Render's postgres vs postgresql prefix for SQLAlchemy
+        if database_url and database_url.startswith("postgres://"):
+            database_url = database_url.replace("postgres://", "postgresql://", 1)
+
+        # Create SQLAlchemy engine
+        engine = create_engine(database_url)
+
+        for column_name, column_type in CHECKPOINT_COLUMNS:
+            if check_column_exists(engine, "processing_queue", column_name):
+                logger.info(f"The {column_name} column already exists in the processing_queue table")
+                continue
+
+            logger.info(f"The {column_name} column does not exist in the processing_queue table. Adding it now...")
+            if not add_column_to_table(engine, "processing_queue", column_name, column_type, nullable=True):
+                return False
+
+        logger.info("Queue checkpoint migration completed successfully")
+        return True
+
+    except Exception as e:
+        logger.error(f"Migration error: {e}")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
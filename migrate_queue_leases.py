@@ -0,0 +1,75 @@
+"""
+Database migration script to add worker leases to the processing queues.
+
+This script will:
+1. Add the lease_owner, lease_expires_at, heartbeat_at and attempts columns to
+   the processing_queue and webpage_processing_queue tables if they don't exist
+2. Index both tables by status without blocking writes, for the claim query
+
+Entries that are already 'processing' keep a NULL lease; they become
+claimable again once they have been processing for QUEUE_LEASE_SECONDS.
+
+Usage:
+    python migrate_queue_leases.py
+"""
+import sys
+import os
+import logging
+from sqlalchemy import text, create_engine
+
+from fix_text_chunk_schema import check_column_exists, add_column_to_table
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+logger = logging.getLogger(__name__)
+
+QUEUE_TABLES = ("processing_queue", "webpage_processing_queue")
+
+LEASE_COLUMNS = (
+    ("lease_owner", "VARCHAR(100)"),
+    ("lease_expires_at", "TIMESTAMP WITHOUT TIME ZONE"),
+    ("heartbeat_at", "TIMESTAMP WITHOUT TIME ZONE"),
+    ("attempts", "INTEGER DEFAULT 0"),
+)
+
+def main():
+    try:
+        # Get database URL from environment variable
+        database_url = os.environ.get("DATABASE_URL")
+        if not database_url:
+            logger.error("DATABASE_URL environment variable is not set")
+            sys.exit(1)
+
+        # Handle Render's postgres vs postgresql prefix for SQLAlchemy
+        if database_url and database_url.startswith("postgres://"):
+            database_url = database_url.replace("postgres://", "postgresql://", 1)
+
+        # Create SQLAlchemy engine
+        engine = create_engine(database_url)
+
+        for table_name in QUEUE_TABLES:
+            for column_name, column_type in LEASE_COLUMNS:
+                if check_column_exists(engine, table_name, column_name):
+                    logger.info(f"The {column_name} column already exists in the {table_name} table")
+                    continue
+
+                logger.info(f"The {column_name} column does not exist in the {table_name} table. Adding it now...")
+                if not add_column_to_table(engine, table_name, column_name, column_type, nullable=True):
+                    return False
+
+            # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                connection.execute(text(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{table_name}_status ON {table_name} (status)"
+                ))
+
+        logger.info("Queue lease migration completed successfully")
+        return True
+
+    except Exception as e:
+        logger.error(f"Migration error: {e}")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,167 @@
+"""
+Database migration script to store each chunk text's embedding once.
+
+This script will:
+1. Create the embedding_vector table if it doesn't exist
+2. Add the vector_id column to the vector_embedding table if it doesn't exist
+3. Index it without blocking writes, for pruning unused vectors
+4. Move the vectors stored inline on existing embeddings into shared rows, one
+   per (chunk text hash, embedding version), in batches
+
+The backfill is resumable: only embeddings without a vector_id are selected,
+so the script can be interrupted and run again. Chunks need a text hash
+(migrate_chunk_text_hash.py) for their embedding to be shared. PostgreSQL
+reuses the space freed in vector_embedding for new rows; VACUUM FULL returns
+it to the operating system.
+
+Usage:
+    python migrate_shared_embeddings.py [--batch-size 5000]
+"""
+import sys
+import os
+import argparse
+import logging
+from sqlalchemy import text, create_engine
+
+from fix_text_chunk_schema import check_column_exists, add_column_to_table
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+logger = logging.getLogger(__name__)
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Share embedding vectors between chunks with identical text')
+    parser.add_argument('--batch-size', type=int, default=5000,
+                        help='Number of embeddings moved per transaction (default: 5000)')
+    return parser.parse_args()
+
+def create_vector_table(engine):
+    """Create the embedding_vector table and its indexes"""
+    with engine.begin() as connection:
+        connection.execute(text("""
+            CREATE TABLE IF NOT EXISTS embedding_vector (
+                id SERIAL PRIMARY KEY,
+                text_hash VARCHAR(64) NOT NULL,
+                model_version INTEGER NOT NULL REFERENCES embedding_model_version (id),
+                embedding DOUBLE PRECISION[],
+                embedding_blob BYTEA,
+                CONSTRAINT uq_embedding_vector_text_hash_version UNIQUE (text_hash, model_version)
+            )
+        """))
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_embedding_vector_model_version ON embedding_vector (model_version)"
+        ))
+
+def share_batch(engine, last_id, batch_size):
+    """
+    Move the inline vectors of one batch of embeddings into shared rows
+
+    Args:
+        engine: SQLAlchemy engine
+        last_id (int): Highest vector_embedding.id already visited
+        batch_size (int): Maximum embeddings to visit
+
+    Returns:
+        tuple: (number of embeddings moved, highest id in the batch or None when done)
+    """
+    with engine.begin() as connection:
+        ids = connection.execute(text("""
+            SELECT ve.id
+            FROM vector_embedding ve
+            JOIN text_chunk tc ON tc.id = ve.chunk_id
+            WHERE ve.id > :last_id
+            AND ve.vector_id IS NULL
+            AND ve.model_version IS NOT NULL
+            AND tc.text_hash IS NOT NULL
+            ORDER BY ve.id
+            LIMIT :batch_size
+        """), {"last_id": last_id, "batch_size": batch_size}).scalars().all()
+
+        if not ids:
+            return 0, None
+
+        # The first embedding of each text keeps its values; texts that already
+        # have a shared vector keep that one
+        connection.execute(text("""
+            INSERT INTO embedding_vector (text_hash, model_version, embedding_blob, embedding)
+            SELECT DISTINCT ON (tc.text_hash, ve.model_version)
+                tc.text_hash, ve.model_version, ve.embedding_blob, ve.embedding
+            FROM vector_embedding ve
+            JOIN text_chunk tc ON tc.id = ve.chunk_id
+            WHERE ve.id = ANY(:ids)
+            AND (ve.embedding_blob IS NOT NULL OR ve.embedding IS NOT NULL)
+            ORDER BY tc.text_hash, ve.model_version, ve.id
+            ON CONFLICT (text_hash, model_version) DO NOTHING
+        """), {"ids": list(ids)})
+
+        moved = connection.execute(text("""
+            UPDATE vector_embedding ve
+            SET vector_id = ev.id, embedding_blob = NULL, embedding = NULL
+            FROM text_chunk tc, embedding_vector ev
+            WHERE ve.id = ANY(:ids)
+            AND (ve.embedding_blob IS NOT NULL OR ve.embedding IS NOT NULL)
+            AND tc.id = ve.chunk_id
+            AND ev.text_hash = tc.text_hash
+            AND ev.model_version = ve.model_version
+        """), {"ids": list(ids)}).rowcount
+        return moved, ids[-1]
+
+def main():
+    args = parse_args()
+
+    try:
+        # Get database URL from environment variable
+        database_url = os.environ.get("DATABASE_URL")
+        if not database_url:
+            logger.error("DATABASE_URL environment variable is not set")
+            sys.exit(1)
+
+        # Handle Render's postgres vs postgresql prefix for SQLAlchemy
+        if database_url and database_url.startswith("postgres://"):
+            database_url = database_url.replace("postgres://", "postgresql://", 1)
+
+        # Create SQLAlchemy engine
+        engine = create_engine(database_url)
+
+        create_vector_table(engine)
+
+        # Make sure the shared vector column exists
+        if not check_column_exists(engine, "vector_embedding", "vector_id"):
+            logger.info("The vector_id column does not exist in the vector_embedding table. Adding it now...")
+            if not add_column_to_table(engine, "vector_embedding", "vector_id", "INTEGER", nullable=True,
+                                       foreign_key=("embedding_vector", "id")):
+                return False
+        else:
+            logger.info("The vector_id column already exists in the vector_embedding table")
+
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_vector_embedding_vector_id ON vector_embedding (vector_id)"
+            ))
+
+        # Move vectors in batches using keyset pagination on the primary key
+        last_id = 0
+        total = 0
+        while True:
+            moved, batch_last_id = share_batch(engine, last_id, args.batch_size)
+            if batch_last_id is None:
+                break
+            last_id = batch_last_id
+            total += moved
+            logger.info(f"Moved {total} embeddings to shared vectors (up to ID {last_id})")
+
+        with engine.connect() as connection:
+            vectors = connection.execute(text("SELECT COUNT(*) FROM embedding_vector")).scalar()
+        logger.info(f"Moved {total} embeddings to {vectors} shared vectors")
+        logger.info("Shared embedding migration completed successfully")
+        return True
+
+    except Exception as e:
+        logger.error(f"Migration error: {e}")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -68,6 +68,8 @@ class Document(db.Model):
     upload_date = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     processed = db.Column(db.Boolean, default=False)
     full_text = db.Column(db.Text)
+    # SHA-256 of the uploaded PDF, for recognizing re-uploads (see utils/document_dedup.py)
+    content_hash = db.Column(db.String(64), index=True)
     # Added collection_id foreign key
     collection_id = db.Column(db.Integer, db.ForeignKey('collection.id'), nullable=True)
     
@@ -83,6 +85,8 @@ class TextChunk(db.Model):
     document_id = db.Column(db.Integer, db.ForeignKey('document.id'), nullable=True)
     webpage_id = db.Column(db.Integer, db.ForeignKey('webpage.id'), nullable=True)
     text = db.Column(db.Text, nullable=False)
+    # SHA-256 of the normalized text, shared by chunks that get the same embedding
+    text_hash = db.Column(db.String(64), index=True)
     page_num = db.Column(db.Integer)
     chunk_index = db.Column(db.Integer)
     document = db.relationship('Document', backref=db.backref('chunks', lazy=True), foreign_keys=[document_id])
@@ -96,27 +100,122 @@ class TextChunk(db.Model):
             return f"<TextChunk {self.id}: Unattached>"
 
 
+class EmbeddingModelVersion(db.Model):
+    """Model for a set of embeddings produced with one embedder configuration"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    vector_size = db.Column(db.Integer, nullable=False)
+    hashing = db.Column(db.String(20), nullable=False, default='md5')
+    status = db.Column(db.String(20), nullable=False, default='building')  # building, active, retired
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    activated_at = db.Column(db.DateTime)
+    
+    # At most one version is searched at a time
+    __table_args__ = (
+        db.Index('uq_embedding_model_version_active', 'status', unique=True,
+                 postgresql_where=sa.text("status = 'active'")),
+    )
+    
+    def __repr__(self):
+        return f"<EmbeddingModelVersion {self.id}: {self.name} ({self.status})>"
+
+
+class EmbeddingVector(db.Model):
+    """Model for a vector stored once and shared by every chunk with the same normalized text"""
+    id = db.Column(db.Integer, primary_key=True)
+    text_hash = db.Column(db.String(64), nullable=False)  # TextChunk.text_hash of the chunks using it
+    model_version = db.Column(db.Integer, db.ForeignKey('embedding_model_version.id'), nullable=False, index=True)
+    embedding = db.Column(db.ARRAY(db.Float))  # Legacy float8[] storage, see EMBEDDING_STORAGE_FORMAT
+    embedding_blob = db.Column(db.LargeBinary)  # Little-endian float32 bytes, read with np.frombuffer
+    
+    __table_args__ = (
+        db.UniqueConstraint('text_hash', 'model_version', name='uq_embedding_vector_text_hash_version'),
+    )
+    
+    def __repr__(self):
+        return f"<EmbeddingVector {self.id}: version {self.model_version}>"
+
+
 class VectorEmbedding(db.Model):
     """Model for storing vector embeddings of text chunks"""
     id = db.Column(db.Integer, primary_key=True)
     chunk_id = db.Column(db.Integer, db.ForeignKey('text_chunk.id'), nullable=False)
-    embedding = db.Column(db.ARRAY(db.Float))
+    # Embedding set this row belongs to; only the active version is searched
+    model_version = db.Column(db.Integer, db.ForeignKey('embedding_model_version.id'), nullable=True, index=True)
+    # Shared vector of the chunk's text; rows that have one store no vector of their own
+    vector_id = db.Column(db.Integer, db.ForeignKey('embedding_vector.id'), nullable=True, index=True)
+    embedding = db.Column(db.ARRAY(db.Float))  # Legacy float8[] storage, see EMBEDDING_STORAGE_FORMAT
+    embedding_blob = db.Column(db.LargeBinary)  # Little-endian float32 bytes, read with np.frombuffer
     chunk = db.relationship('TextChunk', backref=db.backref('embedding', uselist=False))
     
     def __repr__(self):
         return f"<VectorEmbedding {self.id}: Chunk {self.chunk_id}>"
 
 
+class EmbeddingIndexState(db.Model):
+    """Single-row generation counter bumped whenever stored embeddings change"""
+    id = db.Column(db.Integer, primary_key=True)
+    generation = db.Column(db.BigInteger, nullable=False, default=0)
+    # Change log entries up to this generation have been pruned
+    pruned_through = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<EmbeddingIndexState generation {self.generation}>"
+
+
+class EmbeddingChangeLog(db.Model):
+    """Model for recording embedding additions and removals so in-memory indexes can apply deltas"""
+    id = db.Column(db.BigInteger, primary_key=True)
+    generation = db.Column(db.BigInteger, nullable=False, index=True)
+    chunk_id = db.Column(db.Integer, nullable=True)  # Not a foreign key: the chunk may already be deleted
+    operation = db.Column(db.String(10), nullable=False)  # add, delete, reset
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<EmbeddingChangeLog {self.id}: {self.operation} chunk {self.chunk_id} @ {self.generation}>"
+
+
+class EmbeddingRebuildJob(db.Model):
+    """Model for tracking the progress of an online embedding regeneration"""
+    id = db.Column(db.Integer, primary_key=True)
+    model_version = db.Column(db.Integer, db.ForeignKey('embedding_model_version.id'), nullable=False)  # Shadow set
+    previous_version = db.Column(db.Integer)  # Version that was active when the job started
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, completed, failed
+    total_chunks = db.Column(db.Integer, default=0)
+    processed_chunks = db.Column(db.Integer, default=0)
+    embedded_chunks = db.Column(db.Integer, default=0)
+    error_count = db.Column(db.Integer, default=0)
+    last_chunk_id = db.Column(db.Integer, default=0)  # Chunks up to this ID have been processed
+    deleted_embeddings = db.Column(db.Integer)
+    started_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    completed_at = db.Column(db.DateTime)
+    error_message = db.Column(db.Text)
+    
+    def __repr__(self):
+        return f"<EmbeddingRebuildJob {self.id}: version {self.model_version}, {self.status}>"
+
+
 class ProcessingQueue(db.Model):
     """Model for tracking document processing queue"""
     id = db.Column(db.Integer, primary_key=True)
     document_id = db.Column(db.Integer, db.ForeignKey('document.id'), nullable=False)
-    status = db.Column(db.String(20), default='pending')  # pending, processing, completed, failed
+    status = db.Column(db.String(20), default='pending', index=True)  # pending, processing, completed, failed
     document = db.relationship('Document', backref=db.backref('queue_entry', uselist=False))
     queued_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     started_at = db.Column(db.DateTime)
     completed_at = db.Column(db.DateTime)
     error_message = db.Column(db.Text)
+    # Lease held by the worker processing the entry (see utils/job_queue.py)
+    lease_owner = db.Column(db.String(100))
+    lease_expires_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    attempts = db.Column(db.Integer, default=0)
+    # Last ingestion checkpoint reached and the results saved there, so that a
+    # retry continues from it (see CHECKPOINT_STAGES in utils/document_processor.py)
+    stage = db.Column(db.String(20))
+    checkpoint = db.Column(JSON)
     
     def __repr__(self):
         return f"<ProcessingQueue {self.id}: Document {self.document_id}, Status {self.status}>"
@@ -126,17 +225,36 @@ class WebpageProcessingQueue(db.Model):
     """Model for tracking webpage processing queue"""
     id = db.Column(db.Integer, primary_key=True)
     webpage_id = db.Column(db.Integer, db.ForeignKey('webpage.id'), nullable=False)
-    status = db.Column(db.String(20), default='pending')  # pending, processing, completed, failed
+    status = db.Column(db.String(20), default='pending', index=True)  # pending, processing, completed, failed
     webpage = db.relationship('Webpage', backref=db.backref('queue_entry', uselist=False))
     queued_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     started_at = db.Column(db.DateTime)
     completed_at = db.Column(db.DateTime)
     error_message = db.Column(db.Text)
+    # Lease held by the worker processing the entry (see utils/job_queue.py)
+    lease_owner = db.Column(db.String(100))
+    lease_expires_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    attempts = db.Column(db.Integer, default=0)
     
     def __repr__(self):
         return f"<WebpageProcessingQueue {self.id}: Webpage {self.webpage_id}, Status {self.status}>"
 
 
+class DoiCache(db.Model):
+    """Model for caching DOI lookups at doi.org and Crossref, including misses (see utils/doi_cache.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    doi = db.Column(db.String(255), nullable=False, unique=True)  # Lowercased
+    resolves = db.Column(db.Boolean)  # Whether doi.org resolves the DOI; None if not checked
+    checked_at = db.Column(db.DateTime)
+    crossref_status = db.Column(db.Integer)  # HTTP status of the Crossref lookup; None if not looked up
+    crossref_metadata = db.Column(JSON)  # Crossref's work metadata when the status is 200
+    crossref_checked_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f"<DoiCache {self.id}: {self.doi}>"
+
+
 class QueryHistory(db.Model):
     """Model for storing user query history"""
     id = db.Column(db.Integer, primary_key=True)
@@ -3,12 +3,17 @@
 Utility script to regenerate all document embeddings with the improved algorithm.
 
 This script will:
-1. Delete all existing embeddings
-2. Regenerate embeddings for all text chunks using the improved algorithm
+1. Regenerate embeddings for all text chunks into a shadow embedding version,
+   while search keeps using the existing embeddings
+2. Switch search to the new embeddings and delete the old ones
 3. Report statistics on the process
 
+An interrupted run is resumed from its last committed batch the next time the
+script is started.
+
 Usage:
-    python regenerate_embeddings.py
+    python regenerate_embeddings.py [--restart] [--keep-previous]
+    python regenerate_embeddings.py --status
 
 Note: This script needs to be run in the Flask application context
 """
@@ -28,6 +33,11 @@ def parse_args():
     """Parse command line arguments"""
     parser = argparse.ArgumentParser(description='Regenerate all document embeddings')
     parser.add_argument('--verbose', '-v', action='store_true', help='Enable verbose output')
+    parser.add_argument('--restart', action='store_true',
+                        help='Abandon an unfinished regeneration instead of resuming it')
+    parser.add_argument('--keep-previous', action='store_true',
+                        help='Keep the replaced embeddings as a retired version')
+    parser.add_argument('--status', action='store_true', help='Show the progress of the latest regeneration and exit')
     return parser.parse_args()
 
 def main():
@@ -44,11 +54,16 @@ def main():
         # Import here to ensure Flask app context is available
         from app import app
         from utils.embeddings import regenerate_all_embeddings
+        from utils.embedding_rebuild import get_rebuild_status
         
         # Run inside Flask app context
         with app.app_context():
+            if args.status:
+                logger.info(f"Latest regeneration: {get_rebuild_status()}")
+                return
+            
             logger.info("Starting regeneration process...")
-            results = regenerate_all_embeddings()
+            results = regenerate_all_embeddings(resume=not args.restart, keep_previous=args.keep_previous)
             
             if 'error' in results:
                 logger.error(f"Error regenerating embeddings: {results['error']}")
@@ -6,6 +6,7 @@ import datetime
 import logging
 from app import db
 from models import Document, ProcessingQueue, TextChunk, VectorEmbedding, Collection
+from utils.vector_index import record_embedding_changes
 from utils.auth import requires_auth
 
 # Create blueprint
@@ -347,6 +348,7 @@ def delete_document(document_id):
         # Delete vector embeddings for these chunks
         if chunk_ids:
             VectorEmbedding.query.filter(VectorEmbedding.chunk_id.in_(chunk_ids)).delete(synchronize_session=False)
+            record_embedding_changes(removed_chunk_ids=chunk_ids)
         
         # Delete text chunks
         TextChunk.query.filter_by(document_id=document_id).delete()
@@ -381,7 +383,59 @@ def delete_document(document_id):
             'success': False,
             'error': f"Failed to delete document: {str(e)}"
         }), 500
-        
+
+@document_routes.route('/api/documents/<int:document_id>/retry', methods=['POST'])
+def retry_document(document_id):
+    """
+    Queue a document whose processing failed again
+
+    Processing continues after the last checkpoint the failed attempt reached;
+    pass {"restart": true} to start over from text extraction.
+    """
+    from utils.document_processor import process_document_job
+
+    try:
+        queue_entry = ProcessingQueue.query.filter_by(document_id=document_id).first()
+
+        if not queue_entry:
+            return jsonify({
+                'success': False,
+                'error': f'Document with ID {document_id} has no processing queue entry'
+            }), 404
+
+        if queue_entry.status != 'failed':
+            return jsonify({
+                'success': False,
+                'error': f'Only failed documents can be retried (status: {queue_entry.status})'
+            }), 400
+
+        data = request.get_json(silent=True) or {}
+        if data.get('restart'):
+            queue_entry.stage = None
+            queue_entry.checkpoint = None
+
+        queue_entry.status = 'pending'
+        queue_entry.started_at = None
+        queue_entry.completed_at = None
+        queue_entry.error_message = None
+        db.session.commit()
+
+        # Start processing
+        process_document_job(document_id)
+
+        return jsonify({
+            'success': True,
+            'message': f'Document {document_id} queued for processing',
+            'resume_after': queue_entry.stage
+        })
+    except Exception as e:
+        db.session.rollback()
+        logging.exception(f"Error retrying document {document_id}: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f"Failed to retry document: {str(e)}"
+        }), 500
+
 @document_routes.route('/api/documents/batch/move', methods=['POST'])
 def batch_move_documents():
     """
@@ -483,6 +537,7 @@ def batch_delete_documents():
             
         # For each document, delete chunks, embeddings, queue entries, and files
         deleted_count = 0
+        removed_chunk_ids = []
         for document in documents:
             # Get all chunk IDs for this document
             chunks = TextChunk.query.filter_by(document_id=document.id).all()
@@ -491,6 +546,7 @@ def batch_delete_documents():
             # Delete vector embeddings for these chunks
             if chunk_ids:
                 VectorEmbedding.query.filter(VectorEmbedding.chunk_id.in_(chunk_ids)).delete(synchronize_session=False)
+                removed_chunk_ids.extend(chunk_ids)
             
             # Delete text chunks
             TextChunk.query.filter_by(document_id=document.id).delete()
@@ -513,6 +569,7 @@ def batch_delete_documents():
             db.session.delete(document)
             deleted_count += 1
             
+        record_embedding_changes(removed_chunk_ids=removed_chunk_ids)
         db.session.commit()
         
         return jsonify({
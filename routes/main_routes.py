@@ -9,6 +9,7 @@ from app import db
 from models import Document, QueryHistory, ProcessingQueue, Collection
 from utils.document_processor import process_document_job
 from utils.pdf_processor import save_uploaded_pdf
+from utils.document_dedup import compute_content_hash, find_duplicate_document, copy_processed_document
 from utils.embeddings import search_similar_chunks
 from utils.citation_generator import format_citation_for_response
 from utils.openai_utils import generate_answer_with_gpt
@@ -27,6 +28,10 @@ def index():
 def upload_documents():
     """
     Handle document uploads, save them, and queue for processing
+    
+    Files that were uploaded before (same SHA-256) are not processed again:
+    they resolve to the existing document, or to a copy of it with its chunks
+    and embeddings when it is uploaded into another collection.
     """
     if 'files[]' not in request.files:
         return jsonify({
@@ -50,6 +55,7 @@ def upload_documents():
     # Process each uploaded file
     success_count = 0
     errors = []
+    duplicates = []
     
     for file in files:
         if file.filename == '':
@@ -62,10 +68,7 @@ def upload_documents():
             continue
         
         try:
-            # Save the uploaded file
             filename = secure_filename(file.filename)
-            unique_filename = f"{str(uuid.uuid4())[:8]}_{filename}"
-            saved_path = save_uploaded_pdf(file, unique_filename)
             
             # Get collection_id if provided
             collection_id = request.form.get('collection_id')
@@ -82,12 +85,34 @@ def upload_documents():
             else:
                 collection_id = None
             
+            # Skip the ingestion pipeline for files that are already in the library
+            content_hash = compute_content_hash(file.stream)
+            duplicate = find_duplicate_document(content_hash)
+            if duplicate and (collection_id is None or duplicate.collection_id == collection_id):
+                logger.info(f"{file.filename} is a duplicate of document {duplicate.id}")
+                duplicates.append({'filename': file.filename, 'document_id': duplicate.id})
+                success_count += 1
+                continue
+            
+            # Save the uploaded file
+            unique_filename = f"{str(uuid.uuid4())[:8]}_{filename}"
+            saved_path = save_uploaded_pdf(file, unique_filename)
+            
+            if duplicate and duplicate.processed:
+                # Wanted in another collection: copy the processed document
+                document = copy_processed_document(duplicate, unique_filename, collection_id=collection_id)
+                db.session.commit()
+                duplicates.append({'filename': file.filename, 'document_id': document.id, 'copied_from': duplicate.id})
+                success_count += 1
+                continue
+            
             # Create document record in database
             document = Document(
                 filename=unique_filename,
                 title=os.path.splitext(filename)[0][:500],  # Use filename as initial title (will be updated during processing)
                 upload_date=datetime.utcnow(),
-                collection_id=collection_id
+                collection_id=collection_id,
+                content_hash=content_hash
             )
             db.session.add(document)
             db.session.flush()  # Get the document ID
@@ -111,6 +136,7 @@ def upload_documents():
         return jsonify({
             'success': True,
             'message': f'Successfully uploaded {success_count} document(s)',
+            'duplicates': duplicates,
             'errors': errors
         })
     else:
@@ -1,11 +1,19 @@
-from flask import Blueprint, render_template, jsonify, request, Response
+from flask import Blueprint, render_template, jsonify, request, Response, current_app
 from datetime import datetime, timedelta
 import sqlalchemy as sa
 import os
 
 from app import db
 from models import SystemMetrics, ProcessingQueue, Document, TextChunk, VectorEmbedding
-from utils.embeddings import regenerate_all_embeddings
+from utils.embeddings import get_embedding_cache_stats, get_embedding_reuse_stats
+from utils.doi_cache import get_doi_cache_stats
+from utils.http_client import get_http_client_stats
+from utils.embedding_rebuild import start_background_rebuild, get_rebuild_status
+from utils.embedding_versions import (
+    get_active_embedding_version,
+    list_embedding_versions,
+    activate_embedding_version
+)
 
 # Create blueprint
 monitoring_routes = Blueprint('monitoring', __name__, url_prefix='/monitoring')
@@ -157,7 +165,7 @@ def get_system_stats():
     
     # Count chunks and embeddings
     total_chunks = TextChunk.query.count()
-    total_embeddings = VectorEmbedding.query.count()
+    total_embeddings = VectorEmbedding.query.filter_by(model_version=get_active_embedding_version().id).count()
     embeddings_percentage = (total_embeddings / total_chunks * 100) if total_chunks > 0 else 0
     
     # Calculate average processing time
@@ -183,7 +191,12 @@ def get_system_stats():
         'total_chunks': total_chunks,
         'total_embeddings': total_embeddings,
         'embeddings_percentage': round(embeddings_percentage, 1),
-        'avg_processing_time_seconds': avg_processing_time
+        'avg_processing_time_seconds': avg_processing_time,
+        # Counters are per worker process
+        'embedding_cache': get_embedding_cache_stats(),
+        'embedding_reuse': get_embedding_reuse_stats(),
+        'doi_cache': get_doi_cache_stats(),
+        'http_connections': get_http_client_stats()
     })
     
 @monitoring_routes.route('/regenerate-embeddings', methods=['POST'])
@@ -192,22 +205,89 @@ def regenerate_embeddings():
     Admin endpoint to regenerate all embeddings using the improved algorithm
     
     This will:
-    1. Delete all existing embeddings
-    2. Regenerate embeddings for all text chunks using the improved algorithm
-    3. Return statistics about the process
+    1. Start (or resume) a rebuild job in the background; search keeps using
+       the current embeddings while it runs
+    2. Switch search to the new embeddings once every chunk is embedded
+    3. Return the job ID; poll /monitoring/regenerate-embeddings/status for progress
+    
+    Pass restart=true to abandon an unfinished job instead of resuming it.
     """
     try:
-        # Regenerate embeddings
-        results = regenerate_all_embeddings()
+        restart = request.args.get('restart', 'false').lower() == 'true'
+        results = start_background_rebuild(current_app._get_current_object(), resume=not restart)
+        if 'error' in results:
+            return jsonify({
+                'success': False,
+                'error': results['error'],
+                'job_id': results.get('job_id')
+            }), 409
         
         return jsonify({
             'success': True,
-            'message': f"Successfully regenerated {results.get('success', 0)} embeddings",
-            'results': results
+            'message': f"Embedding regeneration job {results['job_id']} started",
+            'status': get_rebuild_status(results['job_id'])
+        }), 202
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@monitoring_routes.route('/regenerate-embeddings/status')
+def regenerate_embeddings_status():
+    """
+    API endpoint to get the progress of an embedding regeneration job
+    
+    Returns the most recent job unless job_id is given.
+    """
+    job_id = request.args.get('job_id', type=int)
+    status = get_rebuild_status(job_id)
+    if status is None:
+        return jsonify({
+            'success': False,
+            'error': 'No embedding regeneration job found'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'status': status
+    })
+
+@monitoring_routes.route('/embedding-versions')
+def embedding_versions():
+    """
+    API endpoint to list the embedding versions and their embedding counts
+    """
+    try:
+        return jsonify({
+            'success': True,
+            'versions': list_embedding_versions()
         })
     
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+@monitoring_routes.route('/embedding-versions/<int:version_id>/activate', methods=['POST'])
+def activate_version(version_id):
+    """
+    Admin endpoint to switch searches to another embedding version
+    
+    The version must have an embedding for every chunk unless force=true is passed.
+    """
+    force = request.args.get('force', 'false').lower() == 'true'
+    results = activate_embedding_version(version_id, force=force)
+    if 'error' in results:
+        return jsonify({
+            'success': False,
+            'error': results['error']
+        }), 400
+    
+    return jsonify({
+        'success': True,
+        'message': f"Embedding version {results['activated']} is now active",
+        'results': results
+    })
@@ -6,6 +6,7 @@ from werkzeug.utils import secure_filename
 from app import db
 from models import Webpage, WebpageProcessingQueue, Collection
 from utils.webpage_processor import crawl_webpage, validate_url, process_webpage_job
+from utils.vector_index import record_embedding_changes
 
 logger = logging.getLogger(__name__)
 
@@ -204,15 +205,19 @@ def delete_webpage(webpage_id):
         # Delete any chunks and their embeddings
         from models import TextChunk, VectorEmbedding
         chunks = TextChunk.query.filter_by(webpage_id=webpage_id).all()
+        removed_chunk_ids = []
         for chunk in chunks:
-            # Delete embedding if exists
-            embedding = VectorEmbedding.query.filter_by(chunk_id=chunk.id).first()
-            if embedding:
-                db.session.delete(embedding)
+            # Delete the chunk's embeddings in every embedding version
+            deleted = VectorEmbedding.query.filter_by(chunk_id=chunk.id).delete(synchronize_session=False)
+            if deleted:
+                removed_chunk_ids.append(chunk.id)
             
             # Delete the chunk
             db.session.delete(chunk)
         
+        # Remove the embeddings from every process's in-memory index
+        record_embedding_changes(removed_chunk_ids=removed_chunk_ids)
+        
         # Delete the webpage
         db.session.delete(webpage)
         db.session.commit()
@@ -7,12 +7,20 @@ import numpy as np
 from celery import shared_task
 
 from app import db
-from models import Document, TextChunk, VectorEmbedding, ProcessingQueue
-from utils.pdf_processor import extract_text_from_pdf, chunk_text
-from utils.embeddings import generate_embeddings
+from models import Document, ProcessingQueue
+from utils.pdf_processor import extract_chunks_from_pdf
+from utils.embeddings import insert_text_chunks, insert_chunk_embeddings, prune_unused_embedding_vectors
+from utils.vector_index import record_embedding_changes, prune_embedding_change_log
 from utils.doi_validator import extract_and_validate_doi
 from utils.citation_generator import generate_apa_citation
 from utils.system_monitor import update_system_metrics
+from utils.job_queue import (
+    claim_queue_entry,
+    fail_abandoned_entries,
+    release_lease,
+    count_active_leases,
+    LeaseHeartbeat
+)
 
 logger = logging.getLogger(__name__)
 
@@ -21,20 +29,29 @@ def process_document(document_id):
     """Main task to process a document in the background"""
     logger.info(f"Starting to process document: {document_id}")
     
+    # Claim the queue entry so no other worker processes the document concurrently
+    lease = claim_queue_entry(ProcessingQueue, ProcessingQueue.document_id, key=document_id)
+    if not lease:
+        logger.info(f"Document {document_id} is not pending or is being processed by another worker")
+        return False
+    
     # Get the document and its queue entry
     document = Document.query.get(document_id)
-    queue_entry = ProcessingQueue.query.filter_by(document_id=document_id).first()
+    queue_entry = ProcessingQueue.query.get(lease.entry_id)
     
     if not document or not queue_entry:
         logger.error(f"Document or queue entry not found for ID: {document_id}")
+        if queue_entry:
+            # Give up the claim instead of holding it until the lease expires
+            queue_entry.status = 'failed'
+            queue_entry.error_message = "Document not found"
+            release_lease(queue_entry)
+            db.session.commit()
         return False
     
+    # Keep the claim alive while the document is processed
+    heartbeat = LeaseHeartbeat(ProcessingQueue, lease).start()
     try:
-        # Update queue status to processing
-        queue_entry.status = 'processing'
-        queue_entry.started_at = datetime.datetime.utcnow()
-        db.session.commit()
-        
         # Get the file path
         upload_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads")
         file_path = os.path.join(upload_folder, document.filename)
@@ -42,8 +59,9 @@ def process_document(document_id):
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"PDF file not found: {file_path}")
         
-        # Extract text from the PDF
-        text = extract_text_from_pdf(file_path)
+        # Extract text from the PDF, chunking each page as it is extracted and
+        # keeping the page each chunk starts on
+        text, page_chunks = extract_chunks_from_pdf(file_path, parallel=False)
         
         if not text:
             raise ValueError("Failed to extract text from PDF")
@@ -109,37 +127,31 @@ def process_document(document_id):
         # Generate tags based on content
         document.tags = generate_tags_from_content(text)
         
-        # Split text into chunks
-        chunks = chunk_text(text)
-        
-        # Process each chunk
-        for i, chunk_text in enumerate(chunks):
-            # Create text chunk record
-            chunk = TextChunk(
-                document_id=document.id,
-                text=chunk_text,
-                chunk_index=i
-            )
-            db.session.add(chunk)
-            db.session.flush()  # Get the chunk ID
-            
-            # Generate embeddings
-            embedding = generate_embeddings(chunk_text)
-            
-            if embedding:
-                # Create embedding record
-                vector_embedding = VectorEmbedding(
-                    chunk_id=chunk.id,
-                    embedding=embedding
-                )
-                db.session.add(vector_embedding)
+        chunks = [chunk.text for chunk in page_chunks]
+        
+        # Insert the chunks, then their embeddings for the active embedding version,
+        # with one bulk statement each
+        chunk_ids = insert_text_chunks(
+            chunks,
+            document_id=document.id,
+            page_nums=[chunk.page_num for chunk in page_chunks]
+        )
+        embedded_chunk_ids = insert_chunk_embeddings(chunk_ids, chunks)
+        
+        # Let every process's in-memory index pick up the new embeddings
+        record_embedding_changes(added_chunk_ids=embedded_chunk_ids)
         
         # Mark document as processed
         document.processed = True
         
+        # Another worker has taken over the document; let it write the results
+        if heartbeat.lost:
+            raise RuntimeError(f"Lost the claim on document {document_id} while processing it")
+        
         # Update queue entry
         queue_entry.status = 'completed'
         queue_entry.completed_at = datetime.datetime.utcnow()
+        release_lease(queue_entry)
         
         # Commit all changes
         db.session.commit()
@@ -152,26 +164,32 @@ def process_document(document_id):
         # Log the error
         logger.exception(f"Error processing document {document_id}: {str(e)}")
         
-        # Update queue entry
-        queue_entry.status = 'failed'
-        queue_entry.error_message = str(e)
-        
         # Rollback and try to save the error
         db.session.rollback()
+        if heartbeat.lost:
+            return False
         try:
-            db.session.add(queue_entry)
+            queue_entry = ProcessingQueue.query.get(lease.entry_id)
+            queue_entry.status = 'failed'
+            queue_entry.error_message = str(e)
+            release_lease(queue_entry)
             db.session.commit()
         except:
             logger.exception("Failed to update queue entry with error status")
+            db.session.rollback()
         
         return False
+    
+    finally:
+        heartbeat.stop()
 
 @shared_task
 def process_next_document():
     """Check for pending documents and process the next one in queue"""
     try:
-        # Find the oldest pending document
-        queue_entry = ProcessingQueue.query.filter_by(status='pending').order_by(ProcessingQueue.queued_at).first()
+        # Find the oldest pending document; process_document claims it, so if a
+        # web worker gets to it first the task returns without doing anything
+        queue_entry = ProcessingQueue.query.filter_by(status='pending').order_by(ProcessingQueue.id).first()
         
         if queue_entry:
             # Process this document
@@ -188,9 +206,12 @@ def process_next_document():
 def check_processing_queue():
     """Periodic task to check processing queue and keep the processing going"""
     try:
-        # Count documents by status
+        # Give up on documents whose workers keep disappearing
+        fail_abandoned_entries(ProcessingQueue)
+        
+        # Count documents by status; entries with expired leases are not being worked on
         pending_count = ProcessingQueue.query.filter_by(status='pending').count()
-        processing_count = ProcessingQueue.query.filter_by(status='processing').count()
+        processing_count = count_active_leases(ProcessingQueue)
         
         logger.info(f"Queue status: {pending_count} pending, {processing_count} processing")
         
@@ -204,6 +225,24 @@ def check_processing_queue():
         logger.exception(f"Error in check_processing_queue: {str(e)}")
         return False
 
+@shared_task
+def prune_embedding_change_log_task():
+    """Task to drop embedding change log entries older than 24 hours; indexes behind them rebuild"""
+    try:
+        return prune_embedding_change_log()
+    except Exception as e:
+        logger.exception(f"Error in prune_embedding_change_log_task: {str(e)}")
+        return 0
+
+@shared_task
+def prune_embedding_vectors_task():
+    """Task to delete shared embedding vectors that no chunk uses any more"""
+    try:
+        return prune_unused_embedding_vectors()
+    except Exception as e:
+        logger.exception(f"Error in prune_embedding_vectors_task: {str(e)}")
+        return 0
+
 @shared_task
 def update_system_metrics_task():
     """Task to update system metrics"""
@@ -225,7 +264,7 @@ def generate_tags_from_content(text):
         list: List of standardized tags from our predefined lists
     """
     # Import the centralized tag matching function
-    from utils.document_processor import match_to_predefined_tags
+    from utils.tagging import match_to_predefined_tags
     
     # Use our standardized tag matching function
     tags = match_to_predefined_tags(text_content=text)
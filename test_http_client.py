@@ -0,0 +1,66 @@
+"""
+Test script to verify the shared HTTP sessions cap Retry-After waits.
+
+Builds sessions with the installed urllib3 (uv.lock pins 2.3.0) without
+sending any request, and checks that a long Retry-After is cut down to
+HTTP_RETRY_AFTER_MAX.
+
+Usage:
+    python test_http_client.py
+    python -m pytest test_http_client.py
+"""
+import logging
+from unittest import mock
+
+import urllib3
+from urllib3.response import HTTPResponse
+
+from utils import http_client
+from utils.http_client import CappedRetry, HTTP_RETRY_AFTER_MAX
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+logger = logging.getLogger(__name__)
+
+def _session_retry(retries=2):
+    """Get the Retry of a new session's HTTPS adapter"""
+    session = http_client._create_session(retries)
+    return session.get_adapter('https://doi.org/').max_retries
+
+def _response(retry_after):
+    """Build a 503 response with a Retry-After header"""
+    return HTTPResponse(body=b'', status=503, headers={'Retry-After': retry_after}, preload_content=False)
+
+def test_session_uses_capped_retry():
+    """Test that sessions build and retry with CappedRetry"""
+    retry = _session_retry()
+    assert isinstance(retry, CappedRetry)
+    assert retry.total == 2
+
+    # Each retry is a new Retry object; it must keep the cap
+    retry = retry.increment(method='GET', url='/', response=_response('3600'))
+    assert isinstance(retry, CappedRetry)
+
+def test_long_retry_after_is_capped():
+    """Test that a long Retry-After waits HTTP_RETRY_AFTER_MAX seconds"""
+    retry = _session_retry()
+    assert retry.get_retry_after(_response('3600')) == HTTP_RETRY_AFTER_MAX
+
+    with mock.patch('urllib3.util.retry.time.sleep') as sleep:
+        retry.sleep_for_retry(_response('3600'))
+    waits = [call.args[0] for call in sleep.call_args_list]
+    assert all(wait <= HTTP_RETRY_AFTER_MAX for wait in waits), waits
+
+def test_short_retry_after_is_kept():
+    """Test that a Retry-After within the cap is honoured as sent"""
+    retry = _session_retry()
+    seconds = min(1, HTTP_RETRY_AFTER_MAX)
+    assert retry.get_retry_after(_response(str(seconds))) == seconds
+    assert retry.get_retry_after(HTTPResponse(body=b'', status=503, preload_content=False)) is None
+
+if __name__ == "__main__":
+    logger.info(f"urllib3 {urllib3.__version__}, HTTP_RETRY_AFTER_MAX={HTTP_RETRY_AFTER_MAX}")
+    test_session_uses_capped_retry()
+    test_long_retry_after_is_capped()
+    test_short_retry_after_is_kept()
+    logger.info("All HTTP client tests passed")
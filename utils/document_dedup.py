@@ -0,0 +1,149 @@
+"""
+Document Deduplication Module
+
+Uploaded PDFs are identified by the SHA-256 hash of their bytes
+(Document.content_hash), so uploading a file that is already in the library
+does not run it through the ingestion pipeline again:
+
+- If the existing document is in the requested collection (or no collection
+  was requested), the upload resolves to the existing document.
+- If it is wanted in another collection and has been processed, a new document
+  is created for that collection with copies of its metadata, chunks and
+  embeddings.
+- Otherwise the file is processed as usual.
+"""
+
+import hashlib
+import logging
+
+import sqlalchemy as sa
+
+from app import db
+from models import Document, TextChunk, VectorEmbedding, ProcessingQueue
+
+logger = logging.getLogger(__name__)
+
+# Bytes hashed at a time, so large PDFs are never read into memory at once
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Metadata copied to a duplicate document. The DOI is unique, so it stays
+# with the original; the copied citation still includes it
+COPIED_FIELDS = (
+    'title', 'authors', 'journal', 'publication_date', 'citation_apa', 'tags', 'full_text'
+)
+
+
+def compute_content_hash(file_obj):
+    """
+    Hash the contents of a file object and rewind it
+
+    Args:
+        file_obj: Binary file object, e.g. an uploaded file's stream
+
+    Returns:
+        str: Hex-encoded SHA-256 digest
+    """
+    digest = hashlib.sha256()
+    for block in iter(lambda: file_obj.read(HASH_BLOCK_SIZE), b''):
+        digest.update(block)
+    file_obj.seek(0)
+    return digest.hexdigest()
+
+
+def find_duplicate_document(content_hash):
+    """
+    Find a document with the same content that is processed or still on its way
+
+    Documents whose processing failed are ignored, so uploading the file again
+    retries it.
+
+    Args:
+        content_hash (str): SHA-256 hex digest of the PDF
+
+    Returns:
+        Document: The oldest matching document, preferring processed ones, or None
+    """
+    if not content_hash:
+        return None
+
+    return (
+        Document.query
+        .outerjoin(ProcessingQueue, ProcessingQueue.document_id == Document.id)
+        .filter(Document.content_hash == content_hash)
+        .filter(sa.or_(Document.processed.is_(True), ProcessingQueue.status != 'failed'))
+        .order_by(Document.processed.desc(), Document.id)
+        .first()
+    )
+
+
+def copy_processed_document(source, filename, collection_id=None):
+    """
+    Create a processed copy of a document, reusing its chunks and embeddings
+
+    Chunks are copied with one bulk insert, and the active embedding version's
+    vectors are copied as stored instead of being encoded again. The caller
+    commits.
+
+    Args:
+        source (Document): Processed document with the same content
+        filename (str): Saved file of the new document
+        collection_id (int, optional): Collection of the new document
+
+    Returns:
+        Document: The new document
+    """
+    from utils.embeddings import get_embedding_model, insert_text_chunks
+    from utils.vector_index import record_embedding_changes
+
+    document = Document(
+        filename=filename,
+        content_hash=source.content_hash,
+        collection_id=collection_id,
+        processed=True,
+        **{field: getattr(source, field) for field in COPIED_FIELDS}
+    )
+    db.session.add(document)
+    db.session.flush()  # Get the document ID
+
+    source_chunks = db.session.execute(
+        sa.select(TextChunk.id, TextChunk.text, TextChunk.page_num)
+        .where(TextChunk.document_id == source.id)
+        .order_by(TextChunk.chunk_index, TextChunk.id)
+    ).all()
+    chunk_ids = insert_text_chunks(
+        [chunk.text for chunk in source_chunks],
+        document_id=document.id,
+        page_nums=[chunk.page_num for chunk in source_chunks]
+    )
+    new_chunk_ids = {chunk.id: chunk_id for chunk, chunk_id in zip(source_chunks, chunk_ids)}
+
+    # Only the searched version: a regeneration in progress embeds the new chunks itself
+    model_version = get_embedding_model().model_version
+    rows = [
+        {
+            'chunk_id': new_chunk_ids[embedding.chunk_id],
+            'model_version': embedding.model_version,
+            'vector_id': embedding.vector_id,
+            'embedding': embedding.embedding,
+            'embedding_blob': embedding.embedding_blob
+        }
+        for embedding in db.session.execute(
+            sa.select(
+                VectorEmbedding.chunk_id,
+                VectorEmbedding.model_version,
+                VectorEmbedding.vector_id,
+                VectorEmbedding.embedding,
+                VectorEmbedding.embedding_blob
+            )
+            .where(VectorEmbedding.chunk_id.in_(list(new_chunk_ids)))
+            .where(VectorEmbedding.model_version == model_version)
+        )
+    ]
+    if rows:
+        db.session.execute(sa.insert(VectorEmbedding), rows)
+
+    # Let every process's in-memory index pick up the copied embeddings
+    record_embedding_changes(added_chunk_ids=[row['chunk_id'] for row in rows])
+
+    logger.info(f"Copied document {source.id} as document {document.id} with {len(chunk_ids)} chunks")
+    return document
@@ -0,0 +1,247 @@
+"""
+DOI Cache Module
+
+Persistent cache of DOI lookups in the doi_cache table, shared by every
+process, so that reprocessing a document or running fix_dois.py and
+regenerate_citations.py does not ask doi.org and Crossref again:
+
+- whether a DOI resolves at doi.org (check_doi_exists)
+- a DOI's Crossref metadata (validate_doi_with_crossref)
+
+Negative answers (a DOI doi.org answers 404 for, or that Crossref does not
+have) are cached too, for a shorter time since they are more likely to
+change. Lookups that failed without an answer (timeouts, connection errors,
+server errors, rate limiting) are not cached.
+
+Configuration:
+- DOI_CACHE_TTL_DAYS: how long DOIs that resolve and Crossref metadata are
+  reused; 0 disables the cache
+- DOI_NEGATIVE_CACHE_TTL_DAYS: how long negative answers are reused; 0
+  disables caching them
+
+The cache needs an app context; without one every lookup goes to the network.
+Reads and writes use their own connection, so the caller's session is
+neither flushed nor committed.
+"""
+
+import os
+import logging
+import datetime
+import threading
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from flask import has_app_context
+
+logger = logging.getLogger(__name__)
+
+# Days answers are reused; fractions are allowed
+DOI_CACHE_TTL_DAYS = float(os.environ.get("DOI_CACHE_TTL_DAYS", 30))
+DOI_NEGATIVE_CACHE_TTL_DAYS = float(os.environ.get("DOI_NEGATIVE_CACHE_TTL_DAYS", 7))
+
+# Longer candidates are extraction noise, not DOIs, and are not cached
+DOI_CACHE_MAX_LENGTH = 255
+
+# Lookup counters of this process
+_stats = {'hits': 0, 'misses': 0, 'stores': 0, 'errors': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(counter):
+    with _stats_lock:
+        _stats[counter] += 1
+
+
+def doi_cache_key(doi):
+    """
+    Normalize a DOI for the cache; DOIs are case-insensitive
+
+    Args:
+        doi (str): The DOI
+
+    Returns:
+        str: The cache key, or None if the DOI can't be cached
+    """
+    if not doi:
+        return None
+    key = doi.strip().lower()
+    if not key or len(key) > DOI_CACHE_MAX_LENGTH:
+        return None
+    return key
+
+
+def is_definitive_status(status_code):
+    """
+    Whether an HTTP status answers a lookup, as opposed to a failure worth retrying
+
+    Args:
+        status_code (int): HTTP status code
+
+    Returns:
+        bool: True for success and client errors other than timeouts and rate limiting
+    """
+    return status_code < 500 and status_code not in (408, 429)
+
+
+def _is_fresh(checked_at, positive):
+    """Whether an answer recorded at checked_at may still be used"""
+    ttl_days = DOI_CACHE_TTL_DAYS if positive else DOI_NEGATIVE_CACHE_TTL_DAYS
+    if checked_at is None or ttl_days <= 0:
+        return False
+    return datetime.datetime.utcnow() - checked_at < datetime.timedelta(days=ttl_days)
+
+
+def _cache_enabled():
+    return DOI_CACHE_TTL_DAYS > 0 and has_app_context()
+
+
+def _load_entry(key):
+    """Read a DOI's cache row, or None"""
+    from app import db
+    from models import DoiCache
+
+    with db.engine.connect() as connection:
+        return connection.execute(
+            sa.select(
+                DoiCache.resolves,
+                DoiCache.checked_at,
+                DoiCache.crossref_status,
+                DoiCache.crossref_metadata,
+                DoiCache.crossref_checked_at
+            ).where(DoiCache.doi == key)
+        ).first()
+
+
+def _store_entry(key, **values):
+    """Insert or update a DOI's cache row"""
+    from app import db
+    from models import DoiCache
+
+    with db.engine.begin() as connection:
+        connection.execute(
+            pg_insert(DoiCache)
+            .values(doi=key, **values)
+            .on_conflict_do_update(index_elements=['doi'], set_=values)
+        )
+
+
+def get_cached_doi_resolves(doi):
+    """
+    Look up whether a DOI resolved at doi.org
+
+    Args:
+        doi (str): The DOI
+
+    Returns:
+        bool: The cached answer, or None if there is no fresh one
+    """
+    key = doi_cache_key(doi)
+    if key is None or not _cache_enabled():
+        return None
+
+    try:
+        entry = _load_entry(key)
+    except Exception:
+        logger.exception(f"Error reading DOI cache for {doi}")
+        _count('errors')
+        return None
+
+    if entry is None or entry.resolves is None or not _is_fresh(entry.checked_at, entry.resolves):
+        _count('misses')
+        return None
+    _count('hits')
+    return entry.resolves
+
+
+def cache_doi_resolves(doi, resolves):
+    """
+    Record whether a DOI resolved at doi.org
+
+    Args:
+        doi (str): The DOI
+        resolves (bool): Whether doi.org answered with the DOI's landing page
+    """
+    key = doi_cache_key(doi)
+    if key is None or not _cache_enabled() or (not resolves and DOI_NEGATIVE_CACHE_TTL_DAYS <= 0):
+        return
+
+    try:
+        _store_entry(key, resolves=resolves, checked_at=datetime.datetime.utcnow())
+        _count('stores')
+    except Exception:
+        logger.exception(f"Error writing DOI cache for {doi}")
+        _count('errors')
+
+
+def get_cached_crossref_lookup(doi):
+    """
+    Look up the result of a DOI's Crossref lookup
+
+    Args:
+        doi (str): The DOI
+
+    Returns:
+        tuple: (status_code, metadata), with metadata None unless status_code
+            is 200, or None if there is no fresh result
+    """
+    key = doi_cache_key(doi)
+    if key is None or not _cache_enabled():
+        return None
+
+    try:
+        entry = _load_entry(key)
+    except Exception:
+        logger.exception(f"Error reading DOI cache for {doi}")
+        _count('errors')
+        return None
+
+    if (entry is None or entry.crossref_status is None
+            or not _is_fresh(entry.crossref_checked_at, entry.crossref_status == 200)):
+        _count('misses')
+        return None
+    _count('hits')
+    return entry.crossref_status, entry.crossref_metadata
+
+
+def cache_crossref_lookup(doi, status_code, metadata=None):
+    """
+    Record the result of a DOI's Crossref lookup, unless it should be retried
+
+    Args:
+        doi (str): The DOI
+        status_code (int): HTTP status of the Crossref response
+        metadata (dict, optional): The work's metadata, for status 200
+    """
+    key = doi_cache_key(doi)
+    if key is None or not _cache_enabled() or not is_definitive_status(status_code):
+        return
+    if status_code != 200 and DOI_NEGATIVE_CACHE_TTL_DAYS <= 0:
+        return
+
+    try:
+        _store_entry(
+            key,
+            crossref_status=status_code,
+            crossref_metadata=metadata if status_code == 200 else None,
+            crossref_checked_at=datetime.datetime.utcnow()
+        )
+        _count('stores')
+    except Exception:
+        logger.exception(f"Error writing DOI cache for {doi}")
+        _count('errors')
+
+
+def get_doi_cache_stats():
+    """
+    Get this process's DOI cache counters
+
+    Returns:
+        dict: hits, misses, stores, errors, hit_rate and the TTLs in days
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else None
+    stats['ttl_days'] = DOI_CACHE_TTL_DAYS
+    stats['negative_ttl_days'] = DOI_NEGATIVE_CACHE_TTL_DAYS
+    return stats
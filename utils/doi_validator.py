@@ -1,9 +1,27 @@
+import os
 import re
 import logging
-import requests
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import has_app_context, current_app
+
+from utils import http_client
+from utils.doi_cache import (
+    get_cached_doi_resolves,
+    cache_doi_resolves,
+    get_cached_crossref_lookup,
+    cache_crossref_lookup
+)
 
 logger = logging.getLogger(__name__)
 
+# Candidate DOIs checked at doi.org at once by find_first_valid_doi
+DOI_VALIDATION_WORKERS = max(1, int(os.environ.get("DOI_VALIDATION_WORKERS", 4)))
+
+# doi.org answers a registered DOI with a redirect to its target
+DOI_RESOLVED_STATUSES = (200, 301, 302, 303, 307, 308)
+
 # Regular expression for DOI pattern
 # Format: 10.NNNN/any_characters_here
 # Using a simpler approach to ensure we capture DOIs correctly
@@ -204,6 +222,212 @@ JOURNAL_DOI_PATTERNS = {
     )
 }
 
+# ARD DOI as printed (10.1136/annrheumdis-YYYY-XXXXXX)
+ARD_DOI_REGEX = r'(10\.\d{4}/annrheumdis-\d{4}-\d+)'
+
+# "doi:" label that may precede a DOI
+DOI_LABEL_REGEX = r'(?:doi|DOI):?\s*'
+
+# Compiled patterns
+# Extraction runs on every ingested document and tries the same patterns on
+# every candidate, so they are compiled once here rather than looked up in
+# re's internal cache on each call.
+
+# Start of every DOI the extraction patterns can match. The combined scan finds
+# these once and only tries each pattern at them.
+DOI_START_PATTERN = re.compile(r'10\.\d{4,9}/')
+
+# Registrant prefix of each DOI in a text (the "10.NNNN" before the slash)
+DOI_REGISTRANT_PATTERN = re.compile(r'(10\.\d{4,9})/')
+
+# Labels in front of a DOI, matched against the text that ends at the DOI
+DOI_LABEL_PATTERN = re.compile(DOI_LABEL_REGEX + r'$', re.IGNORECASE)
+DOI_URL_LABEL_PATTERN = re.compile(r'https?://(?:dx\.)?doi\.org/$', re.IGNORECASE)
+
+# Characters before a DOI searched for its label, not counting the whitespace
+# between them
+DOI_LABEL_WINDOW = 32
+
+# Cleaning of extracted candidates
+TRAILING_PUNCTUATION_PATTERN = re.compile(r'[,;.)\]"\'\s]+$')
+CAMEL_CASE_BOUNDARY_PATTERN = re.compile(r'(?<=[a-z0-9])(?=[A-Z][a-z])')
+ARD_DOI_PATTERN = re.compile(ARD_DOI_REGEX)
+ARD_DOI_WITH_SUFFIX_PATTERN = re.compile(ARD_DOI_REGEX + r'[A-Za-z]')
+ART_DOI_WITH_SUFFIX_PATTERN = re.compile(r'(10\.1002/art\.\d+)[A-Za-z]')
+
+# Journal of Rheumatology DOIs (10.3899/jrheum.XXXXXX), the most common problem case
+JRHEUM_DOI_PATTERN = re.compile(r'(10\.3899/jrheum\.\d{6})')
+JRHEUM_CLEAN_DOI_PATTERN = re.compile(r'^10\.3899/jrheum\.\d{6}$')
+JRHEUM_DOI_WITH_SUFFIX_PATTERN = re.compile(r'(10\.3899/jrheum\.\d{6})[A-Za-z]')
+JRHEUM_ANY_DOI_PATTERN = re.compile(r'(10\.3899/jrheum\.\d+)')
+JRHEUM_ANY_DOI_WITH_SUFFIX_PATTERN = re.compile(r'(10\.3899/jrheum\.\d+)[A-Za-z]')
+JRHEUM_PLAIN_DOI_PATTERN = re.compile(r'(10\.3899/jrheum\.\d{6})[A-Za-z]*')
+JRHEUM_LABELLED_DOI_STRICT_PATTERN = re.compile(r'(?:doi:?\s*|DOI:?\s*)(10\.3899/jrheum\.\d{6})(?:\b|\s|$|\.|\n|\\n)')
+JRHEUM_LABELLED_DOI_PATTERN = re.compile(r'(?:doi:?\s*|DOI:?\s*)(10\.3899/jrheum\.\d{6})')
+
+# Journal of Rheumatology patterns tried by preprocess_jrheum_doi, in order
+JRHEUM_PREPROCESS_PATTERNS = [
+    # Pattern 1: With doi: prefix and clean boundaries
+    re.compile(r'doi:?\s*(10\.3899/jrheum\.\d{6})(?:\s|\n|$|\.)', re.IGNORECASE),
+
+    # Pattern 2: Without boundaries (for cases where formatting is lost)
+    re.compile(r'doi:?\s*(10\.3899/jrheum\.\d{6})', re.IGNORECASE),
+
+    # Pattern 3: Direct DOI without prefix
+    re.compile(r'(?:^|\s)(10\.3899/jrheum\.\d{6})(?:\s|\n|$|\.)', re.IGNORECASE),
+
+    # Pattern 4: Looking for DOI in the specific context from our problematic document
+    re.compile(r'doi:?\s*(10\.3899/jrheum\.\d{6})(?:First|$|\s|\n)', re.IGNORECASE),
+
+    # Pattern 5: Extremely specific pattern for our problem case
+    re.compile(r'doi:?\s*(10\.3899/jrheum\.220209)(?:First|$|\s|\n)', re.IGNORECASE),
+]
+
+# A pattern of the combined DOI scan:
+# - name: reported as the source of the candidates it finds
+# - regex: compiled pattern, matched where a DOI (or its label) starts
+# - label: compiled pattern for the label the match starts with (e.g. "doi:"),
+#   or None if the match starts with the DOI itself
+# - journal: the journal of a journal-specific pattern, None for generic ones
+# - registrant: the DOI prefix every match has (e.g. "10.3899"), or None
+DoiPattern = namedtuple('DoiPattern', ['name', 'regex', 'label', 'journal', 'registrant'])
+
+# A DOI found by the combined scan, before cleaning, with the DoiPattern that
+# found it and where its match starts
+DoiCandidate = namedtuple('DoiCandidate', ['doi', 'pattern', 'start'])
+
+# Generic patterns, in the order extract_dois ranks their candidates
+DOI_PATTERN = re.compile(DOI_REGEX, re.IGNORECASE)
+DOI_WITH_PREFIX_PATTERN = re.compile(DOI_WITH_PREFIX_REGEX, re.IGNORECASE)
+DOI_URL_PATTERN = re.compile(DOI_URL_REGEX, re.IGNORECASE)
+
+DOI_PATTERNS = [
+    DoiPattern('doi', DOI_PATTERN, None, None, None),
+    DoiPattern('doi_prefix', DOI_WITH_PREFIX_PATTERN, DOI_LABEL_PATTERN, None, None),
+    DoiPattern('doi_url', DOI_URL_PATTERN, DOI_URL_LABEL_PATTERN, None, None),
+    DoiPattern('ard', re.compile(ARD_DOI_REGEX, re.IGNORECASE), None, None, None),
+    # More permissive pattern as fallback
+    DoiPattern('permissive', re.compile(r'(?:10\.\d{4,9}/\S{4,})', re.IGNORECASE), None, None, None),
+]
+
+def _compile_journal_patterns(journal_name, patterns):
+    """
+    Compile a journal's JOURNAL_DOI_PATTERNS for the combined scan
+
+    Args:
+        journal_name (str): Name of the journal
+        patterns (list): The journal's DOI pattern strings
+
+    Returns:
+        list: DoiPattern for each pattern, bounded at the end of the DOI
+    """
+    compiled = []
+    for index, pattern in enumerate(patterns):
+        # Add strict word boundary or whitespace at the end of the pattern
+        if not pattern.endswith(r'\b') and not pattern.endswith('$'):
+            bounded_pattern = pattern + r'(?:\b|$|\s|\.)'
+        else:
+            bounded_pattern = pattern
+
+        # The scan only tries patterns where a DOI or its label starts
+        if pattern.startswith(DOI_LABEL_REGEX):
+            label = DOI_LABEL_PATTERN
+            doi_pattern = pattern[len(DOI_LABEL_REGEX):]
+        elif pattern.startswith(r'10\.'):
+            label = None
+            doi_pattern = pattern
+        else:
+            raise ValueError(f"DOI pattern for {journal_name} must start with 10. or a doi: label: {pattern}")
+
+        registrant_match = re.match(r'10\\\.(\d+)/', doi_pattern)
+        compiled.append(DoiPattern(
+            f"{journal_name} #{index + 1}",
+            re.compile(bounded_pattern, re.IGNORECASE),
+            label,
+            journal_name,
+            f"10.{registrant_match.group(1)}" if registrant_match else None
+        ))
+    return compiled
+
+# Journal-specific patterns for the combined scan, by journal
+JOURNAL_SCAN_PATTERNS = {
+    journal_name: _compile_journal_patterns(journal_name, patterns)
+    for journal_name, (patterns, _) in JOURNAL_DOI_PATTERNS.items()
+}
+
+# Lowercased identifiers that show a text is from a journal
+JOURNAL_IDENTIFIERS = {
+    journal_name: [identifier.lower() for identifier in identifiers]
+    for journal_name, (_, identifiers) in JOURNAL_DOI_PATTERNS.items()
+}
+
+# Journal patterns anchored at the start of a DOI, for cleaning off attached text
+JOURNAL_LEADING_PATTERNS = [
+    re.compile(f'({pattern})')
+    for patterns, _ in JOURNAL_DOI_PATTERNS.values()
+    for pattern in patterns
+]
+
+# Journal patterns searched anywhere in a text, as a last resort
+JOURNAL_SEARCH_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE)
+    for patterns, _ in JOURNAL_DOI_PATTERNS.values()
+    for pattern in patterns
+]
+
+def scan_doi_candidates(text, patterns=DOI_PATTERNS):
+    """
+    Find every DOI candidate in a text in one scan, with the pattern that found it
+
+    All patterns match where a DOI starts (or at its label, e.g. "doi:"), so
+    the text is scanned once for DOI starts and each pattern is only tried
+    there. The candidates are the same as running re.finditer with each
+    pattern in turn.
+
+    Args:
+        text (str): The text to search, already limited in length by the caller
+        patterns (list): DoiPattern to apply, in order of priority
+
+    Returns:
+        list: DoiCandidate for each match, ordered by pattern, then position
+    """
+    if not text:
+        return []
+
+    starts = [match.start() for match in DOI_START_PATTERN.finditer(text)]
+    if not starts:
+        return []
+
+    # Where the text before each DOI start ends, ignoring whitespace
+    label_ends = []
+    for start in starts:
+        label_end = start
+        while label_end > 0 and text[label_end - 1].isspace():
+            label_end -= 1
+        label_ends.append(label_end)
+
+    candidates = []
+    for pattern in patterns:
+        # Like re.finditer, a pattern's matches don't overlap
+        resume_at = 0
+        for start, label_end in zip(starts, label_ends):
+            if pattern.label is not None:
+                label = pattern.label.search(text, max(0, label_end - DOI_LABEL_WINDOW), start)
+                if not label:
+                    continue
+                start = label.start()
+            if start < resume_at:
+                continue
+
+            match = pattern.regex.match(text, start)
+            if match:
+                # Get the DOI from the first capturing group or the entire match
+                doi = match.group(1) if match.lastindex else match.group(0)
+                candidates.append(DoiCandidate(doi, pattern, match.start()))
+                resume_at = match.end()
+
+    return candidates
+
 def clean_known_journal_doi(doi):
     """
     Clean a DOI based on known journal patterns
@@ -219,33 +443,32 @@ def clean_known_journal_doi(doi):
         return None
         
     # Journal of Rheumatology pattern (10.3899/jrheum.XXXXXX)
-    j_rheum_match = re.match(r'(10\.3899/jrheum\.\d{6})[A-Za-z]', doi)
+    j_rheum_match = JRHEUM_DOI_WITH_SUFFIX_PATTERN.match(doi)
     if j_rheum_match:
         return j_rheum_match.group(1)
     
     # Check if it's already a clean J Rheum DOI
-    if re.match(r'^10\.3899/jrheum\.\d{6}$', doi):
+    if JRHEUM_CLEAN_DOI_PATTERN.match(doi):
         return doi
         
     # ARD journal pattern (10.1136/annrheumdis-YYYY-XXXXXX)
-    ard_match = re.match(r'(10\.\d{4}/annrheumdis-\d{4}-\d+)[A-Za-z]', doi)
+    ard_match = ARD_DOI_WITH_SUFFIX_PATTERN.match(doi)
     if ard_match:
         return ard_match.group(1)
         
     # Arthritis & Rheumatology (10.1002/art.XXXXX)
-    art_rheum_match = re.match(r'(10\.1002/art\.\d+)[A-Za-z]', doi)
+    art_rheum_match = ART_DOI_WITH_SUFFIX_PATTERN.match(doi)
     if art_rheum_match:
         return art_rheum_match.group(1)
         
     # For other journal patterns, remove any non-standard characters at the end
     # First try to find a valid format from our known patterns
-    for journal_name, (patterns, _) in JOURNAL_DOI_PATTERNS.items():
-        for pattern in patterns:
-            # Convert the simple pattern to a regex that captures just the DOI part
-            # This handles the case where extra text is attached to a valid DOI
-            exact_match = re.match(f'({pattern})', doi)
-            if exact_match:
-                return exact_match.group(1)
+    for pattern in JOURNAL_LEADING_PATTERNS:
+        # The pattern captures just the DOI part
+        # This handles the case where extra text is attached to a valid DOI
+        exact_match = pattern.match(doi)
+        if exact_match:
+            return exact_match.group(1)
     
     # If no specific journal pattern matched, apply general cleaning
     # Remove common suffixes that might be attached
@@ -275,31 +498,25 @@ def extract_doi_from_text(text):
     # Look for Journal of Rheumatology DOIs specifically (most problematic case)
     if "journal of rheumatology" in text.lower() or "j rheumatol" in text.lower():
         # Specific pattern with careful boundary handling
-        j_rheum_match = re.search(r'(?:doi:?\s*|DOI:?\s*)(10\.3899/jrheum\.\d{6})(?:\b|\s|$|\.|\n|\\n)', text)
+        j_rheum_match = JRHEUM_LABELLED_DOI_STRICT_PATTERN.search(text)
         if j_rheum_match:
             doi = j_rheum_match.group(1)
             return clean_known_journal_doi(doi)
             
         # Try a more permissive pattern if the strict one fails
-        j_rheum_match = re.search(r'(?:doi:?\s*|DOI:?\s*)(10\.3899/jrheum\.\d{6})', text)
+        j_rheum_match = JRHEUM_LABELLED_DOI_PATTERN.search(text)
         if j_rheum_match:
             doi = j_rheum_match.group(1)
             return clean_known_journal_doi(doi)
     
     # Try to find DOI with 'doi:' prefix first (common in academic papers)
-    match = re.search(DOI_WITH_PREFIX_REGEX, text, re.IGNORECASE)
-    if match:
-        doi = match.group(1)
-        return clean_known_journal_doi(doi)
-    
-    # Try to find DOI with exact case (more strict)
-    match = re.search(DOI_REGEX, text, re.IGNORECASE)
+    match = DOI_WITH_PREFIX_PATTERN.search(text)
     if match:
         doi = match.group(1)
         return clean_known_journal_doi(doi)
     
-    # Try with a more permissive pattern
-    match = re.search(DOI_REGEX_CASE_INSENSITIVE, text, re.IGNORECASE)
+    # Try to find a bare DOI (DOI_REGEX_CASE_INSENSITIVE is the same pattern)
+    match = DOI_PATTERN.search(text)
     if match:
         doi = match.group(1)
         return clean_known_journal_doi(doi)
@@ -310,6 +527,11 @@ def check_doi_exists(doi):
     """
     Check if a DOI exists by attempting to resolve it through the DOI.org system
     
+    The answer is doi.org's own: a redirect means the DOI is registered, 404
+    means it is not. The redirect is not followed, because the publisher's
+    landing page may refuse bots or HEAD requests for a DOI that exists.
+    Answers are cached, including DOIs that don't exist (see utils/doi_cache.py).
+    
     Args:
         doi (str): The DOI to check
     
@@ -319,32 +541,102 @@ def check_doi_exists(doi):
     if not doi:
         return False
         
-    try:
-        # Clean the DOI to ensure no invalid characters
-        doi = doi.strip()
+    # Clean the DOI to ensure no invalid characters
+    doi = doi.strip()
+    
+    cached = get_cached_doi_resolves(doi)
+    if cached is not None:
+        return cached
         
-        # Try to resolve the DOI through the central DOI resolver
+    try:
+        # Try to resolve the DOI through the central DOI resolver, on a kept-alive
+        # connection (see utils/http_client.py for timeouts and retries)
         headers = {
             'Accept': 'application/json',
             'User-Agent': 'ROXI/0.1 (mailto:rheum.reviews@gmail.com)'
         }
-        response = requests.head(f"https://doi.org/{doi}", 
-                               headers=headers, 
-                               timeout=10,
-                               allow_redirects=True)
+        response = http_client.head(f"https://doi.org/{doi}", 
+                                    headers=headers, 
+                                    allow_redirects=False)
         
         # If we get a 200 or a redirect, the DOI exists
-        return response.status_code in (200, 302, 301)
+        exists = response.status_code in DOI_RESOLVED_STATUSES
+        # Only doi.org's "not found" is cached as an answer; other errors may pass
+        if exists or response.status_code == 404:
+            cache_doi_resolves(doi, exists)
+        return exists
             
     except Exception as e:
         logger.exception(f"Error checking DOI existence: {doi}")
         return False
 
+def find_first_valid_doi(dois, check=None):
+    """
+    Find the first DOI, in priority order, that exists, checking several at once
+    
+    Up to DOI_VALIDATION_WORKERS DOIs are checked concurrently, starting with
+    the highest-priority ones. Once a DOI exists, the checks of lower-priority
+    DOIs that haven't started are cancelled; it is the answer as soon as every
+    DOI before it has failed. Checks still running are left to finish unobserved.
+    
+    Args:
+        dois (list): Candidate DOIs, highest priority first; empty entries are skipped
+        check (callable, optional): Function that tells whether a DOI exists,
+            check_doi_exists by default
+        
+    Returns:
+        str: The first DOI that exists, or None
+    """
+    check = check or check_doi_exists
+    
+    # Checking the same DOI again can't change the answer
+    dois = list(dict.fromkeys(doi for doi in dois if doi))
+    if not dois:
+        return None
+    
+    if DOI_VALIDATION_WORKERS == 1 or len(dois) == 1:
+        return next((doi for doi in dois if check(doi)), None)
+    
+    # The checks use the DOI cache, which needs the caller's app context
+    if has_app_context():
+        app = current_app._get_current_object()
+        
+        def probe(doi):
+            with app.app_context():
+                return check(doi)
+    else:
+        probe = check
+    
+    executor = ThreadPoolExecutor(max_workers=min(DOI_VALIDATION_WORKERS, len(dois)), thread_name_prefix="doi-check")
+    try:
+        # Submitted in priority order, so the executor starts the best candidates first
+        futures = [executor.submit(probe, doi) for doi in dois]
+        
+        def cancel_lower_priority(index):
+            def callback(future):
+                if not future.cancelled() and future.exception() is None and future.result():
+                    for later in futures[index + 1:]:
+                        later.cancel()
+            return callback
+        
+        for index, future in enumerate(futures):
+            future.add_done_callback(cancel_lower_priority(index))
+        
+        for doi, future in zip(dois, futures):
+            if future.result():
+                return doi
+        return None
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
 def validate_doi_with_crossref(doi):
     """
     Validate a DOI against the Crossref API and retrieve metadata
     First checks if the DOI exists using the DOI.org resolution service
     
+    Crossref results are cached, including DOIs Crossref doesn't have
+    (see utils/doi_cache.py).
+    
     Args:
         doi (str): The DOI to validate
         
@@ -361,25 +653,30 @@ def validate_doi_with_crossref(doi):
             return None
             
         # If DOI exists, proceed with metadata retrieval from Crossref
-        # API endpoint for DOI metadata
-        url = f"https://api.crossref.org/works/{doi}"
-        
-        # Send request to Crossref API
-        response = requests.get(url, timeout=10, headers={
-            'User-Agent': 'ROXI/0.1 (mailto:rheum.reviews@gmail.com)'
-        })
+        cached = get_cached_crossref_lookup(doi)
+        if cached is not None:
+            status_code, metadata = cached
+        else:
+            # API endpoint for DOI metadata
+            url = f"https://api.crossref.org/works/{doi}"
+            
+            # Send request to Crossref API
+            response = http_client.get(url, headers={
+                'User-Agent': 'ROXI/0.1 (mailto:rheum.reviews@gmail.com)'
+            })
+            
+            status_code = response.status_code
+            metadata = response.json().get('message', {}) if status_code == 200 else None
+            cache_crossref_lookup(doi, status_code, metadata)
         
         # Check if request was successful
-        if response.status_code == 200:
-            data = response.json()
-            return data.get('message', {})
+        if status_code == 200:
+            return metadata
         else:
-            logger.warning(f"DOI validation failed with status code {response.status_code}: {doi}")
-            # The DOI exists but isn't in Crossref - it might be registered with another agency
-            # Return a minimal metadata dictionary so we know it's a valid DOI
-            if check_doi_exists(doi):
-                return {"DOI": doi, "valid": True, "source": "doi.org"}
-            return None
+            logger.warning(f"DOI validation failed with status code {status_code}: {doi}")
+            # The DOI exists (checked above) but isn't in Crossref - it might be registered
+            # with another agency. Return a minimal metadata dictionary so we know it's a valid DOI
+            return {"DOI": doi, "valid": True, "source": "doi.org"}
             
     except Exception as e:
         logger.exception(f"Error validating DOI: {doi}")
@@ -406,60 +703,60 @@ def extract_journal_specific_doi(text, max_chars=5000):
     # List to store found DOIs
     journal_specific_dois = []
     
-    # Check if we can identify any known journals in the text
+    # Only journals whose DOI prefix is in the text can have DOIs in it
+    registrants = set(DOI_REGISTRANT_PATTERN.findall(text_sample))
+    if not registrants:
+        return []
+    
+    # Check if we can identify any of those journals in the text
     detected_journals = []
-    for journal_name, (patterns, identifiers) in JOURNAL_DOI_PATTERNS.items():
+    for journal_name, patterns in JOURNAL_SCAN_PATTERNS.items():
+        if not any(pattern.registrant is None or pattern.registrant in registrants for pattern in patterns):
+            continue
         # Check if any of the journal identifiers are in the text
-        for identifier in identifiers:
-            if identifier.lower() in text_sample:
+        for identifier in JOURNAL_IDENTIFIERS[journal_name]:
+            if identifier in text_sample:
                 detected_journals.append(journal_name)
                 break
     
-    # If we found known journals, apply their specific patterns
-    for journal_name in detected_journals:
-        patterns, _ = JOURNAL_DOI_PATTERNS[journal_name]
-        for pattern in patterns:
-            # Add strict word boundary or whitespace at the end of the pattern
-            if not pattern.endswith(r'\b') and not pattern.endswith('$'):
-                bounded_pattern = pattern + r'(?:\b|$|\s|\.)'
-            else:
-                bounded_pattern = pattern
-                
-            matches = re.finditer(bounded_pattern, text_sample, re.IGNORECASE)
-            for match in matches:
-                # Get just the DOI part, not any boundary characters
-                doi = match.group(0)
-                if doi.endswith(' ') or doi.endswith('.') or doi.endswith('\n'):
-                    doi = doi[:-1]
-                
-                # Clean the DOI
-                doi = doi.strip()
-                
-                # Remove any trailing punctuation or words
-                doi = re.sub(r'[,;.)\]"\'\s]+$', '', doi)
-                
-                # Check for common journal patterns and apply specific cleaning
-                if journal_name == 'Journal of Rheumatology':
-                    # Specific cleaning for J Rheumatology DOIs (format: 10.3899/jrheum.220209)
-                    j_rheum_match = re.match(r'(10\.3899/jrheum\.\d+)', doi)
-                    if j_rheum_match:
-                        doi = j_rheum_match.group(1)
-                elif journal_name == 'Annals of the Rheumatic Diseases':
-                    # Specific cleaning for ARD DOIs (format: 10.1136/annrheumdis-2022-222486)
-                    ard_match = re.match(r'(10\.\d{4}/annrheumdis-\d{4}-\d+)', doi)
-                    if ard_match:
-                        doi = ard_match.group(1)
-                else:
-                    # General pattern-based cleaning for other journals
-                    # Remove any non-DOI text attached (e.g., "First", "Clinical", etc.)
-                    doi_parts = re.split(r'(?<=[a-z0-9])(?=[A-Z][a-z])', doi)
-                    if doi_parts:
-                        doi = doi_parts[0]
-                
-                # Add to candidates
-                if doi and doi not in journal_specific_dois and doi.startswith('10.'):
-                    journal_specific_dois.append(doi)
-                    logger.info(f"Found journal-specific DOI ({journal_name}): {doi}")
+    # If we found known journals, apply their specific patterns in one scan
+    patterns = [pattern for journal_name in detected_journals for pattern in JOURNAL_SCAN_PATTERNS[journal_name]]
+    for candidate in scan_doi_candidates(text_sample, patterns):
+        journal_name = candidate.pattern.journal
+
+        # Get just the DOI part, not any boundary characters
+        doi = candidate.doi
+        if doi.endswith(' ') or doi.endswith('.') or doi.endswith('\n'):
+            doi = doi[:-1]
+        
+        # Clean the DOI
+        doi = doi.strip()
+        
+        # Remove any trailing punctuation or words
+        doi = TRAILING_PUNCTUATION_PATTERN.sub('', doi)
+        
+        # Check for common journal patterns and apply specific cleaning
+        if journal_name == 'Journal of Rheumatology':
+            # Specific cleaning for J Rheumatology DOIs (format: 10.3899/jrheum.220209)
+            j_rheum_match = JRHEUM_ANY_DOI_PATTERN.match(doi)
+            if j_rheum_match:
+                doi = j_rheum_match.group(1)
+        elif journal_name == 'Annals of the Rheumatic Diseases':
+            # Specific cleaning for ARD DOIs (format: 10.1136/annrheumdis-2022-222486)
+            ard_match = ARD_DOI_PATTERN.match(doi)
+            if ard_match:
+                doi = ard_match.group(1)
+        else:
+            # General pattern-based cleaning for other journals
+            # Remove any non-DOI text attached (e.g., "First", "Clinical", etc.)
+            doi_parts = CAMEL_CASE_BOUNDARY_PATTERN.split(doi)
+            if doi_parts:
+                doi = doi_parts[0]
+        
+        # Add to candidates
+        if doi and doi not in journal_specific_dois and doi.startswith('10.'):
+            journal_specific_dois.append(doi)
+            logger.info(f"Found journal-specific DOI ({journal_name}): {doi}")
     
     return journal_specific_dois
 
@@ -487,43 +784,29 @@ def extract_dois(text, max_chars=5000):
     journal_specific_dois = extract_journal_specific_doi(text, max_chars)
     doi_candidates.extend(journal_specific_dois)
     
-    # Then try generic patterns
-    patterns = [
-        DOI_REGEX,                   # Base DOI pattern
-        DOI_WITH_PREFIX_REGEX,       # DOI with prefix (doi:)
-        DOI_URL_REGEX,               # DOI in URL form
-        # Use the ARD pattern directly
-        r'(10\.\d{4}/annrheumdis-\d{4}-\d+)',  # ARD journal pattern
-        r'(?:10\.\d{4,9}/\S{4,})'    # More permissive pattern as fallback
-    ]
-    
-    for pattern in patterns:
-        matches = re.finditer(pattern, text_sample, re.IGNORECASE)
-        for match in matches:
-            # Get the DOI from the first capturing group or the entire match
-            doi = match.group(1) if match.lastindex else match.group(0)
-            
-            # Clean the DOI
-            doi = doi.strip()
-            
-            # Remove any trailing punctuation
-            doi = re.sub(r'[,;.)\]"\'\s]+$', '', doi)
-            
-            # Some DOIs might have words attached at the end
-            # Split at any capital letter followed by lowercase (CamelCase boundary)
-            doi_parts = re.split(r'(?<=[a-z0-9])(?=[A-Z][a-z])', doi)
-            if doi_parts:
-                doi = doi_parts[0]
-            
-            # Remove common word suffixes that might be attached to DOIs
-            common_suffixes = ['First', 'Article', 'Clinical', 'Full', 'Paper', 'Published']
-            for suffix in common_suffixes:
-                if suffix in doi and not suffix.lower() in doi.lower()[:15]:  # Only if suffix is not part of actual DOI
-                    doi = doi.split(suffix)[0]
-            
-            # Add to candidates if not already there
-            if doi and doi not in doi_candidates and doi.startswith('10.'):
-                doi_candidates.append(doi)
+    # Then try generic patterns (base, doi: prefix, URL, ARD, permissive fallback)
+    for candidate in scan_doi_candidates(text_sample):
+        # Clean the DOI
+        doi = candidate.doi.strip()
+        
+        # Remove any trailing punctuation
+        doi = TRAILING_PUNCTUATION_PATTERN.sub('', doi)
+        
+        # Some DOIs might have words attached at the end
+        # Split at any capital letter followed by lowercase (CamelCase boundary)
+        doi_parts = CAMEL_CASE_BOUNDARY_PATTERN.split(doi)
+        if doi_parts:
+            doi = doi_parts[0]
+        
+        # Remove common word suffixes that might be attached to DOIs
+        common_suffixes = ['First', 'Article', 'Clinical', 'Full', 'Paper', 'Published']
+        for suffix in common_suffixes:
+            if suffix in doi and not suffix.lower() in doi.lower()[:15]:  # Only if suffix is not part of actual DOI
+                doi = doi.split(suffix)[0]
+        
+        # Add to candidates if not already there
+        if doi and doi not in doi_candidates and doi.startswith('10.'):
+            doi_candidates.append(doi)
     
     return doi_candidates
 
@@ -542,37 +825,20 @@ def preprocess_jrheum_doi(text):
         return None
     
     # Try various patterns with explicit boundary handling
-    patterns = [
-        # Pattern 1: With doi: prefix and clean boundaries
-        r'doi:?\s*(10\.3899/jrheum\.\d{6})(?:\s|\n|$|\.)',  
-        
-        # Pattern 2: Without boundaries (for cases where formatting is lost)
-        r'doi:?\s*(10\.3899/jrheum\.\d{6})',
-        
-        # Pattern 3: Direct DOI without prefix
-        r'(?:^|\s)(10\.3899/jrheum\.\d{6})(?:\s|\n|$|\.)',
-        
-        # Pattern 4: Looking for DOI in the specific context from our problematic document
-        r'doi:?\s*(10\.3899/jrheum\.\d{6})(?:First|$|\s|\n)',
-        
-        # Pattern 5: Extremely specific pattern for our problem case
-        r'doi:?\s*(10\.3899/jrheum\.220209)(?:First|$|\s|\n)',
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+    for pattern in JRHEUM_PREPROCESS_PATTERNS:
+        match = pattern.search(text)
         if match:
             doi = match.group(1)
             logger.info(f"Extracted J Rheumatology DOI with special pattern: {doi}")
             return doi
     
     # Try harder with a plain pattern and post-processing
-    plain_match = re.search(r'(10\.3899/jrheum\.\d{6})[A-Za-z]*', text)
+    plain_match = JRHEUM_PLAIN_DOI_PATTERN.search(text)
     if plain_match and plain_match.group(0):
         # Just take the numerical part to avoid any suffixes
         plain_doi = plain_match.group(0)
         # Extract only the DOI pattern we know is valid
-        doi_match = re.match(r'(10\.3899/jrheum\.\d{6})', plain_doi)
+        doi_match = JRHEUM_DOI_PATTERN.match(plain_doi)
         if doi_match and doi_match.group(1):
             doi = doi_match.group(1)
             logger.info(f"Extracted J Rheumatology DOI with fallback pattern: {doi}")
@@ -607,7 +873,7 @@ def extract_and_validate_doi(text):
                 return {"DOI": jrheum_doi, "valid": True, "source": "doi.org"}
                 
         # Try to find the specific format for J Rheumatology DOIs (fallback)
-        jrheum_match = re.search(r'doi:?\s*(10\.3899/jrheum\.\d{6})', text, re.IGNORECASE)
+        jrheum_match = JRHEUM_PREPROCESS_PATTERNS[1].search(text)
         if jrheum_match:
             doi = jrheum_match.group(1)
             logger.info(f"Direct extraction of Journal of Rheumatology DOI: {doi}")
@@ -642,84 +908,64 @@ def extract_and_validate_doi(text):
     # Extremely specific handling for known problematic case
     # Look for the exact pattern that causes the issue
     if "Journal of Rheumatology" in text or "J Rheumatol" in text:
-        for doi in dois:
-            if "10.3899/jrheum" in doi:
-                # Match only the valid part of the DOI
-                jrheum_fixed = re.match(r'(10\.3899/jrheum\.\d{6})', doi)
-                if jrheum_fixed:
-                    clean_doi = jrheum_fixed.group(1)
-                    logger.info(f"Using exact J Rheumatology DOI pattern: {clean_doi}")
-                    if check_doi_exists(clean_doi):
-                        metadata = validate_doi_with_crossref(clean_doi)
-                        if metadata:
-                            return metadata
-                        return {"DOI": clean_doi, "valid": True, "source": "doi.org"}
-    
-    # Try each candidate DOI until we find a valid one
-    for doi in dois:
-        # First apply the specific journal cleaning for better results
-        clean_doi = clean_known_journal_doi(doi)
-        
-        # Standard validation check with the cleaned DOI
-        if check_doi_exists(clean_doi):
+        # Match only the valid part of the DOI
+        jrheum_dois = [
+            jrheum_fixed.group(1)
+            for jrheum_fixed in (JRHEUM_DOI_PATTERN.match(doi) for doi in dois if "10.3899/jrheum" in doi)
+            if jrheum_fixed
+        ]
+        clean_doi = find_first_valid_doi(jrheum_dois)
+        if clean_doi:
+            logger.info(f"Using exact J Rheumatology DOI pattern: {clean_doi}")
             metadata = validate_doi_with_crossref(clean_doi)
             if metadata:
                 return metadata
             return {"DOI": clean_doi, "valid": True, "source": "doi.org"}
+    
+    # Each candidate DOI and its cleaned variants, in the order they are tried
+    dois_to_try = []
+    for doi in dois:
+        # First apply the specific journal cleaning for better results
+        dois_to_try.append(clean_known_journal_doi(doi))
         
         # Special handling for DOIs with "First" suffix (exact problem case)
         if "First" in doi:
-            first_split = doi.split("First")[0]
-            if check_doi_exists(first_split):
-                metadata = validate_doi_with_crossref(first_split)
-                if metadata:
-                    return metadata
-                return {"DOI": first_split, "valid": True, "source": "doi.org"}
+            dois_to_try.append(doi.split("First")[0])
         
         # Case 1: Look for known journal DOI patterns with suffixes
-        j_rheum_match = re.match(r'(10\.3899/jrheum\.\d+)[A-Za-z]', doi)
+        j_rheum_match = JRHEUM_ANY_DOI_WITH_SUFFIX_PATTERN.match(doi)
         if j_rheum_match:
-            clean_doi = j_rheum_match.group(1)
-            logger.info(f"Trying cleaned J Rheumatology DOI: {clean_doi} (original: {doi})")
-            if check_doi_exists(clean_doi):
-                metadata = validate_doi_with_crossref(clean_doi)
-                if metadata:
-                    return metadata
-                return {"DOI": clean_doi, "valid": True, "source": "doi.org"}
+            dois_to_try.append(j_rheum_match.group(1))
         
         # Case 2: Common ARD journal DOI pattern with suffixes
-        ard_match = re.match(r'(10\.\d{4}/annrheumdis-\d{4}-\d+)[A-Za-z]', doi)
+        ard_match = ARD_DOI_WITH_SUFFIX_PATTERN.match(doi)
         if ard_match:
-            clean_doi = ard_match.group(1)
-            logger.info(f"Trying cleaned ARD DOI: {clean_doi} (original: {doi})")
-            if check_doi_exists(clean_doi):
-                metadata = validate_doi_with_crossref(clean_doi)
-                if metadata:
-                    return metadata
-                return {"DOI": clean_doi, "valid": True, "source": "doi.org"}
+            dois_to_try.append(ard_match.group(1))
         
         # Case 3: Try removing common suffixes that might be attached
         for suffix in ['First', 'Published', 'Article', 'Clinical', 'Full', 'Paper', 'Release', 'Online']:
             if suffix in doi and not suffix.lower() in doi.lower()[:15]:
-                clean_doi = doi.split(suffix)[0]
-                logger.info(f"Trying DOI without suffix: {clean_doi} (removed: {suffix})")
-                if check_doi_exists(clean_doi):
-                    metadata = validate_doi_with_crossref(clean_doi)
-                    if metadata:
-                        return metadata
-                    return {"DOI": clean_doi, "valid": True, "source": "doi.org"}
+                dois_to_try.append(doi.split(suffix)[0])
+    
+    # Use the first one that is valid
+    clean_doi = find_first_valid_doi(dois_to_try)
+    if clean_doi:
+        logger.info(f"Using DOI {clean_doi} from candidates {dois}")
+        metadata = validate_doi_with_crossref(clean_doi)
+        if metadata:
+            return metadata
+        return {"DOI": clean_doi, "valid": True, "source": "doi.org"}
     
     # Last-resort direct pattern matching for common journal patterns
-    for journal_name, (patterns, _) in JOURNAL_DOI_PATTERNS.items():
-        for pattern in patterns:
-            direct_match = re.search(pattern, text, re.IGNORECASE)
-            if direct_match:
-                potential_doi = direct_match.group(0)
-                if check_doi_exists(potential_doi):
-                    metadata = validate_doi_with_crossref(potential_doi)
-                    if metadata:
-                        return metadata
-                    return {"DOI": potential_doi, "valid": True, "source": "doi.org"}
+    for pattern in JOURNAL_SEARCH_PATTERNS:
+        direct_match = pattern.search(text)
+        if direct_match:
+            potential_doi = direct_match.group(0)
+            if check_doi_exists(potential_doi):
+                metadata = validate_doi_with_crossref(potential_doi)
+                if metadata:
+                    return metadata
+                return {"DOI": potential_doi, "valid": True, "source": "doi.org"}
     
     # If we get here, we couldn't find a valid DOI even with special handling
     logger.warning(f"Failed to validate any DOI candidates: {dois}")
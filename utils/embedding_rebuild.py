@@ -0,0 +1,380 @@
+"""
+Embedding Rebuild Module
+
+This module regenerates every chunk embedding without taking search offline.
+Instead of deleting the existing embeddings first, a rebuild job writes into a
+shadow embedding version (see utils/embedding_versions.py) with the active
+version's configuration:
+
+1. Chunks are read in ID order one page at a time (keyset pagination), so
+   memory use does not grow with the corpus
+2. Each page is embedded with insert_chunk_embeddings (one encode_batch call
+   for the texts without a shared vector, one bulk INSERT), and the job's
+   cursor and counters are updated in the same transaction, so an interrupted
+   job resumes exactly where it stopped
+3. Once every chunk is embedded the shadow version is activated, which swaps
+   search over atomically, and the previous version's rows are deleted
+
+While a job runs, a RebuildHeartbeat thread refreshes its updated_at on its
+own connection, so the long steps without per-batch progress (the final
+populate pass, activation and deleting the previous version) do not make it
+look abandoned.
+
+Progress is stored in the embedding_rebuild_job table and exposed through
+/monitoring/regenerate-embeddings/status.
+"""
+
+import os
+import logging
+import datetime
+import threading
+
+import sqlalchemy as sa
+
+from app import db
+from models import TextChunk, EmbeddingRebuildJob
+
+logger = logging.getLogger(__name__)
+
+# A running job that has not recorded progress for this many seconds is
+# assumed to have died with its process and may be resumed by another one
+REBUILD_STALE_SECONDS = int(os.environ.get("EMBEDDING_REBUILD_STALE_SECONDS", 600))
+
+# How often a running job's updated_at is refreshed
+REBUILD_HEARTBEAT_SECONDS = int(os.environ.get("EMBEDDING_REBUILD_HEARTBEAT_SECONDS",
+                                               max(1, REBUILD_STALE_SECONDS // 5)))
+
+# Guards the background rebuild thread of this process
+_rebuild_thread = None
+_rebuild_thread_lock = threading.Lock()
+
+
+def job_to_dict(job):
+    """
+    Describe a rebuild job for the monitoring API
+
+    Args:
+        job (EmbeddingRebuildJob): The job
+
+    Returns:
+        dict: Job state and progress
+    """
+    total = job.total_chunks or 0
+    return {
+        'job_id': job.id,
+        'model_version': job.model_version,
+        'previous_version': job.previous_version,
+        'status': job.status,
+        'total_chunks': total,
+        'processed_chunks': job.processed_chunks,
+        'embedded_chunks': job.embedded_chunks,
+        'errors': job.error_count,
+        'last_chunk_id': job.last_chunk_id,
+        'deleted_embeddings': job.deleted_embeddings,
+        'progress_percentage': round(min(job.processed_chunks / total * 100, 100), 1) if total else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'updated_at': job.updated_at.isoformat() if job.updated_at else None,
+        'completed_at': job.completed_at.isoformat() if job.completed_at else None,
+        'error_message': job.error_message
+    }
+
+
+def get_rebuild_status(job_id=None):
+    """
+    Get the state of a rebuild job
+
+    Args:
+        job_id (int): ID of the job; defaults to the most recent one
+
+    Returns:
+        dict: Job state and progress, or None if there is no such job
+    """
+    if job_id is None:
+        job = EmbeddingRebuildJob.query.order_by(EmbeddingRebuildJob.id.desc()).first()
+    else:
+        job = EmbeddingRebuildJob.query.get(job_id)
+    return job_to_dict(job) if job else None
+
+
+def _stale_cutoff():
+    """Time before which a running job's last update means its process has died"""
+    return datetime.datetime.utcnow() - datetime.timedelta(seconds=REBUILD_STALE_SECONDS)
+
+
+def create_rebuild_job(resume=True):
+    """
+    Start a rebuild job, or pick up an unfinished one
+
+    A new job gets a fresh shadow version with the active version's vector
+    size and hashing scheme.
+
+    Args:
+        resume (bool): Continue the most recent unfinished job instead of starting over
+
+    Returns:
+        dict: {'job_id': ...}, or {'error': ..., 'job_id': ...} if a job is
+              already running in another process
+    """
+    from utils.embedding_versions import get_active_embedding_version, create_embedding_version
+
+    unfinished = (
+        EmbeddingRebuildJob.query
+        .filter(EmbeddingRebuildJob.status.in_(('pending', 'running', 'failed')))
+        .order_by(EmbeddingRebuildJob.id.desc())
+        .first()
+    )
+    if unfinished and unfinished.status == 'running' and unfinished.updated_at >= _stale_cutoff():
+        return {'error': f"Embedding rebuild job {unfinished.id} is already running", 'job_id': unfinished.id}
+
+    if unfinished and resume:
+        return {'job_id': unfinished.id}
+
+    if unfinished:
+        # Abandon the old job; its shadow rows are removed with its version
+        from utils.embedding_versions import delete_embedding_version
+        unfinished.status = 'failed'
+        unfinished.error_message = 'Superseded by a new rebuild job'
+        db.session.commit()
+        delete_embedding_version(unfinished.model_version)
+
+    active = get_active_embedding_version()
+    shadow = create_embedding_version(active.vector_size, hashing=active.hashing, name=active.name)
+    job = EmbeddingRebuildJob(
+        model_version=shadow.id,
+        previous_version=active.id,
+        status='pending',
+        total_chunks=db.session.execute(sa.select(sa.func.count(TextChunk.id))).scalar() or 0
+    )
+    db.session.add(job)
+    db.session.commit()
+    logger.info(f"Created embedding rebuild job {job.id} into shadow version {shadow.id} "
+                f"(replacing version {active.id})")
+    return {'job_id': job.id}
+
+
+def _claim_job(job_id):
+    """
+    Mark a job as running in this process unless another live process owns it
+
+    Returns:
+        bool: True if the job was claimed
+    """
+    claimed = db.session.execute(
+        sa.update(EmbeddingRebuildJob)
+        .where(EmbeddingRebuildJob.id == job_id)
+        .where(sa.or_(EmbeddingRebuildJob.status.in_(('pending', 'failed')),
+                      sa.and_(EmbeddingRebuildJob.status == 'running',
+                              EmbeddingRebuildJob.updated_at < _stale_cutoff())))
+        .values(status='running', updated_at=datetime.datetime.utcnow(), error_message=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return bool(claimed)
+
+
+class RebuildHeartbeat:
+    """
+    Context manager that keeps a running job from looking stale
+
+    Usage:
+        with RebuildHeartbeat(job.id):
+            ... run the job ...
+    """
+
+    def __init__(self, job_id, interval=None):
+        self.job_id = job_id
+        self.interval = interval or REBUILD_HEARTBEAT_SECONDS
+        # Resolved here because the heartbeat thread has no app context
+        self._engine = db.engine
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                with self._engine.begin() as connection:
+                    connection.execute(
+                        sa.update(EmbeddingRebuildJob)
+                        .where(EmbeddingRebuildJob.id == self.job_id)
+                        .where(EmbeddingRebuildJob.status == 'running')
+                        .values(updated_at=datetime.datetime.utcnow())
+                    )
+            except Exception as e:
+                # Keep trying; the job only looks stale after REBUILD_STALE_SECONDS without an update
+                logger.warning(f"Heartbeat for embedding rebuild job {self.job_id} failed: {str(e)}")
+
+    def start(self):
+        """Start refreshing the job in a background thread"""
+        self._thread = threading.Thread(target=self._run, name=f"rebuild-heartbeat-{self.job_id}")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop refreshing the job"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+
+def _process_batch(job, model, batch):
+    """
+    Embed and insert one page of chunks and advance the job's cursor
+
+    Args:
+        job (EmbeddingRebuildJob): The job
+        model (SimpleEmbedder): Model for the shadow version
+        batch (list): (chunk_id, text) rows in ID order
+    """
+    from utils.embeddings import insert_chunk_embeddings
+    from utils.pgvector_search import sync_pgvector_embeddings
+
+    embedded_chunk_ids = insert_chunk_embeddings(
+        [chunk_id for chunk_id, _ in batch],
+        [chunk_text for _, chunk_text in batch],
+        model=model
+    )
+    for chunk_id in set(chunk_id for chunk_id, _ in batch) - set(embedded_chunk_ids):
+        logger.warning(f"Failed to generate embedding for chunk {chunk_id}")
+
+    if embedded_chunk_ids:
+        sync_pgvector_embeddings(embedded_chunk_ids, model_version=job.model_version)
+
+    job.last_chunk_id = batch[-1][0]
+    job.processed_chunks += len(batch)
+    job.embedded_chunks += len(embedded_chunk_ids)
+    job.error_count += len(batch) - len(embedded_chunk_ids)
+    job.updated_at = datetime.datetime.utcnow()
+    db.session.commit()
+
+
+def run_rebuild_job(job_id, batch_size=500, keep_previous=False):
+    """
+    Fill a job's shadow version, then swap it in
+
+    Args:
+        job_id (int): ID of the job
+        batch_size (int): Chunks encoded and inserted per transaction
+        keep_previous (bool): Keep the replaced version's embeddings instead of deleting them
+
+    Returns:
+        dict: Statistics about the regenerated embeddings, or an error
+    """
+    from utils.embeddings import get_embedding_model
+    from utils.embedding_versions import (
+        get_embedding_version,
+        populate_embedding_version,
+        activate_embedding_version,
+        delete_embedding_version
+    )
+
+    if not _claim_job(job_id):
+        return {'error': f"Embedding rebuild job {job_id} cannot be started", 'job_id': job_id}
+
+    job = EmbeddingRebuildJob.query.get(job_id)
+    heartbeat = RebuildHeartbeat(job_id).start()
+    try:
+        model = get_embedding_model(get_embedding_version(job.model_version))
+        logger.info(f"Running embedding rebuild job {job.id} from chunk {job.last_chunk_id} "
+                    f"({job.processed_chunks}/{job.total_chunks} done)")
+
+        while True:
+            batch = db.session.execute(
+                sa.select(TextChunk.id, TextChunk.text)
+                .where(TextChunk.id > job.last_chunk_id)
+                .order_by(TextChunk.id)
+                .limit(batch_size)
+            ).all()
+            if not batch:
+                break
+
+            _process_batch(job, model, batch)
+            if job.processed_chunks % (batch_size * 20) < len(batch):
+                logger.info(f"Embedding rebuild job {job.id}: {job.processed_chunks}/{job.total_chunks} chunks")
+
+        # Chunks committed behind the cursor by transactions that were still open
+        populate_embedding_version(job.model_version, batch_size=batch_size)
+
+        results = activate_embedding_version(job.model_version)
+        if 'error' in results:
+            raise RuntimeError(results['error'])
+
+        # Also reached when resuming a job that failed after the swap
+        if not keep_previous and job.previous_version is not None and get_embedding_version(job.previous_version):
+            deleted = delete_embedding_version(job.previous_version)
+            if 'error' in deleted:
+                logger.warning(f"Could not delete embedding version {job.previous_version}: {deleted['error']}")
+            job.deleted_embeddings = deleted.get('deleted')
+
+        job.status = 'completed'
+        job.completed_at = job.updated_at = datetime.datetime.utcnow()
+        db.session.commit()
+        logger.info(f"Embedding rebuild job {job.id} completed: {job.embedded_chunks} embeddings "
+                    f"with {job.error_count} errors")
+
+        return {
+            "job_id": job.id,
+            "model_version": job.model_version,
+            "deleted": job.deleted_embeddings or 0,
+            "total_chunks": job.processed_chunks,
+            "success": job.embedded_chunks,
+            "errors": job.error_count
+        }
+
+    except Exception as e:
+        logger.exception(f"Embedding rebuild job {job_id} failed: {str(e)}")
+        db.session.rollback()
+        try:
+            job = EmbeddingRebuildJob.query.get(job_id)
+            job.status = 'failed'
+            job.error_message = str(e)
+            job.updated_at = datetime.datetime.utcnow()
+            db.session.commit()
+        except Exception:
+            logger.exception(f"Failed to record the error for embedding rebuild job {job_id}")
+            db.session.rollback()
+        return {'error': str(e), 'job_id': job_id}
+
+    finally:
+        heartbeat.stop()
+
+
+def start_background_rebuild(app, resume=True, keep_previous=False):
+    """
+    Create or resume a rebuild job and run it in a background thread
+
+    Args:
+        app (Flask): The application, for the thread's app context
+        resume (bool): Continue the most recent unfinished job instead of starting over
+        keep_previous (bool): Keep the replaced version's embeddings
+
+    Returns:
+        dict: {'job_id': ...}, or an error if a job is already running
+    """
+    global _rebuild_thread
+
+    with _rebuild_thread_lock:
+        if _rebuild_thread is not None and _rebuild_thread.is_alive():
+            return {'error': 'An embedding rebuild is already running in this process'}
+
+        created = create_rebuild_job(resume=resume)
+        if 'error' in created:
+            return created
+
+        from utils.embeddings import REGENERATE_BATCH_SIZE
+
+        def run():
+            with app.app_context():
+                run_rebuild_job(created['job_id'], batch_size=REGENERATE_BATCH_SIZE, keep_previous=keep_previous)
+
+        _rebuild_thread = threading.Thread(target=run, name='embedding-rebuild')
+        _rebuild_thread.daemon = True
+        _rebuild_thread.start()
+        return created
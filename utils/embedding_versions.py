@@ -0,0 +1,398 @@
+"""
+Embedding Versions Module
+
+Every VectorEmbedding row belongs to an EmbeddingModelVersion, which records
+the embedder configuration (vector size and hashing scheme) that produced it.
+Exactly one version is active: queries are encoded with its embedder and only
+its rows are searched, so several embedding sets can coexist in one table.
+
+A new configuration is rolled out without interrupting search:
+1. create_embedding_version() registers it with status "building"
+2. populate_embedding_version() embeds every chunk into the new set in
+   committed batches, while searches keep using the active version
+3. activate_embedding_version() retires the old version and activates the new
+   one in a single transaction that also records an index reset, so every
+   process switches to the new vectors and query encoder together
+4. delete_embedding_version() removes a retired set once it is no longer
+   needed; until then the old version can simply be re-activated
+
+See build_embedding_version.py for the command line entry point.
+"""
+
+import os
+import logging
+import datetime
+from collections import namedtuple
+
+import sqlalchemy as sa
+
+from app import db
+from models import TextChunk, VectorEmbedding, EmbeddingVector, EmbeddingModelVersion
+
+logger = logging.getLogger(__name__)
+
+# Configuration of the version created automatically on first use
+DEFAULT_VECTOR_SIZE = int(os.environ.get("EMBEDDING_VECTOR_SIZE", 128))
+DEFAULT_HASHING = os.environ.get("EMBEDDING_HASHING", "md5").lower()
+
+# Number of chunks encoded and committed per batch by populate_embedding_version
+POPULATE_BATCH_SIZE = 500
+
+# Number of rows deleted per statement by delete_embedding_version
+DELETE_BATCH_SIZE = 5000
+
+# Serializes creation of the default version across processes
+DEFAULT_VERSION_LOCK_KEY = 7310512
+
+EmbeddingVersionInfo = namedtuple('EmbeddingVersionInfo', ['id', 'name', 'vector_size', 'hashing', 'status'])
+
+_VERSION_COLUMNS = (
+    EmbeddingModelVersion.id,
+    EmbeddingModelVersion.name,
+    EmbeddingModelVersion.vector_size,
+    EmbeddingModelVersion.hashing,
+    EmbeddingModelVersion.status
+)
+
+
+def version_name(vector_size, hashing):
+    """
+    Build the descriptive name for an embedder configuration
+
+    Args:
+        vector_size (int): Embedding dimensionality
+        hashing (str): Hashing scheme
+
+    Returns:
+        str: Name such as "simple-md5-128"
+    """
+    return f"simple-{hashing}-{vector_size}"
+
+
+def _ensure_default_version():
+    """
+    Create and activate a version from the configured defaults if none is active
+
+    Uses its own connection and transaction so the caller's session is not committed.
+
+    Returns:
+        EmbeddingVersionInfo: The active version
+    """
+    with db.engine.begin() as connection:
+        connection.execute(sa.select(sa.func.pg_advisory_xact_lock(DEFAULT_VERSION_LOCK_KEY)))
+        row = connection.execute(
+            sa.select(*_VERSION_COLUMNS).where(EmbeddingModelVersion.status == 'active')
+        ).first()
+        if row is None:
+            now = datetime.datetime.utcnow()
+            row = connection.execute(
+                sa.insert(EmbeddingModelVersion)
+                .values(name=version_name(DEFAULT_VECTOR_SIZE, DEFAULT_HASHING), vector_size=DEFAULT_VECTOR_SIZE,
+                        hashing=DEFAULT_HASHING, status='active', created_at=now, activated_at=now)
+                .returning(*_VERSION_COLUMNS)
+            ).first()
+            logger.info(f"Created embedding version {row.id} ({row.name})")
+    return EmbeddingVersionInfo(*row)
+
+
+def get_active_embedding_version():
+    """
+    Get the embedding version that searches use
+
+    Returns:
+        EmbeddingVersionInfo: The active version, created from EMBEDDING_VECTOR_SIZE
+                              and EMBEDDING_HASHING if there is none yet
+    """
+    row = db.session.execute(
+        sa.select(*_VERSION_COLUMNS).where(EmbeddingModelVersion.status == 'active')
+    ).first()
+    if row is None:
+        return _ensure_default_version()
+    return EmbeddingVersionInfo(*row)
+
+
+def get_embedding_version(version_id):
+    """
+    Look up an embedding version by ID
+
+    Args:
+        version_id (int): ID of the version
+
+    Returns:
+        EmbeddingVersionInfo: The version, or None if it does not exist
+    """
+    row = db.session.execute(
+        sa.select(*_VERSION_COLUMNS).where(EmbeddingModelVersion.id == version_id)
+    ).first()
+    return EmbeddingVersionInfo(*row) if row else None
+
+
+def list_embedding_versions():
+    """
+    Describe every embedding version with its row count
+
+    Returns:
+        list: One dict per version, newest first
+    """
+    counts = dict(db.session.execute(
+        sa.select(VectorEmbedding.model_version, sa.func.count(VectorEmbedding.id))
+        .group_by(VectorEmbedding.model_version)
+    ).all())
+    versions = EmbeddingModelVersion.query.order_by(EmbeddingModelVersion.id.desc()).all()
+    return [{
+        'id': version.id,
+        'name': version.name,
+        'vector_size': version.vector_size,
+        'hashing': version.hashing,
+        'status': version.status,
+        'created_at': version.created_at.isoformat() if version.created_at else None,
+        'activated_at': version.activated_at.isoformat() if version.activated_at else None,
+        'embeddings': counts.get(version.id, 0)
+    } for version in versions]
+
+
+def create_embedding_version(vector_size, hashing="md5", name=None):
+    """
+    Register a new embedder configuration to be built alongside the active one
+
+    Args:
+        vector_size (int): Embedding dimensionality
+        hashing (str): Hashing scheme (see utils.embeddings.HASH_FUNCTIONS)
+        name (str): Descriptive name; defaults to version_name(vector_size, hashing)
+
+    Returns:
+        EmbeddingVersionInfo: The new version, with status "building"
+    """
+    from utils.embeddings import SimpleEmbedder
+
+    # Fail early on a configuration the embedder cannot use
+    SimpleEmbedder(vector_size=vector_size, hashing=hashing)
+
+    version = EmbeddingModelVersion(
+        name=name or version_name(vector_size, hashing),
+        vector_size=vector_size,
+        hashing=hashing,
+        status='building'
+    )
+    db.session.add(version)
+    db.session.commit()
+    logger.info(f"Created embedding version {version.id} ({version.name})")
+    return get_embedding_version(version.id)
+
+
+def missing_chunk_count(version_id):
+    """
+    Count the non-empty chunks that have no embedding in a version
+
+    Args:
+        version_id (int): ID of the version
+
+    Returns:
+        int: Number of chunks still to embed
+    """
+    has_embedding = (
+        sa.select(VectorEmbedding.id)
+        .where(VectorEmbedding.chunk_id == TextChunk.id)
+        .where(VectorEmbedding.model_version == version_id)
+        .exists()
+    )
+    return db.session.execute(
+        sa.select(sa.func.count(TextChunk.id)).where(TextChunk.text != '').where(~has_embedding)
+    ).scalar() or 0
+
+
+def populate_embedding_version(version_id, batch_size=POPULATE_BATCH_SIZE):
+    """
+    Embed every non-empty chunk that has no embedding in a version yet
+
+    Chunks are read in ID order, one page at a time, and each page is
+    committed on its own, so an interrupted run simply continues where it
+    stopped when called again. Embeddings added to the active version are
+    recorded in the change log; those for a building version are not searched
+    until it is activated.
+
+    Args:
+        version_id (int): ID of the version to fill
+        batch_size (int): Chunks encoded and committed per batch
+
+    Returns:
+        dict: Statistics about the embedded chunks
+    """
+    from utils.embeddings import get_embedding_model, insert_chunk_embeddings
+    from utils.vector_index import record_embedding_changes
+    from utils.pgvector_search import sync_pgvector_embeddings
+
+    version = get_embedding_version(version_id)
+    if version is None:
+        return {"error": f"Embedding version {version_id} not found"}
+    if version.status == 'retired':
+        return {"error": f"Embedding version {version_id} is retired"}
+
+    model = get_embedding_model(version)
+    success_count = 0
+    error_count = 0
+    last_id = 0
+
+    while True:
+        has_embedding = (
+            sa.select(VectorEmbedding.id)
+            .where(VectorEmbedding.chunk_id == TextChunk.id)
+            .where(VectorEmbedding.model_version == version.id)
+            .exists()
+        )
+        batch = db.session.execute(
+            sa.select(TextChunk.id, TextChunk.text)
+            .where(TextChunk.id > last_id)
+            .where(TextChunk.text != '')
+            .where(~has_embedding)
+            .order_by(TextChunk.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            break
+        last_id = batch[-1][0]
+
+        try:
+            added_chunk_ids = insert_chunk_embeddings(
+                [chunk_id for chunk_id, _ in batch],
+                [chunk_text for _, chunk_text in batch],
+                model=model
+            )
+
+            # Only the active set is indexed. The row lock makes a concurrent
+            # activation wait for this batch, so no batch misses the switch.
+            status = db.session.execute(
+                sa.select(EmbeddingModelVersion.status)
+                .where(EmbeddingModelVersion.id == version.id)
+                .with_for_update()
+            ).scalar()
+            if status == 'active':
+                record_embedding_changes(added_chunk_ids=added_chunk_ids)
+            else:
+                sync_pgvector_embeddings(added_chunk_ids, model_version=version.id)
+
+            db.session.commit()
+            success_count += len(added_chunk_ids)
+            error_count += len(batch) - len(added_chunk_ids)
+            logger.info(f"Embedded {success_count} chunks into version {version.id} (through chunk {last_id})")
+
+        except Exception as e:
+            db.session.rollback()
+            error_count += len(batch)
+            logger.exception(f"Error embedding chunks {batch[0][0]}-{batch[-1][0]} "
+                             f"into version {version.id}: {str(e)}")
+
+    return {
+        "version": version.id,
+        "success": success_count,
+        "errors": error_count
+    }
+
+
+def activate_embedding_version(version_id, force=False):
+    """
+    Make a version the one that searches use
+
+    The previously active version is retired and an index reset is recorded
+    in the same transaction, so every process moves to the new vectors and
+    query encoder together on its next search. Retired rows are kept, which
+    makes switching back just another activation.
+
+    Args:
+        version_id (int): ID of the version to activate
+        force (bool): Activate even if some chunks have no embedding in the version
+
+    Returns:
+        dict: The activated and retired version IDs, or an error
+    """
+    from utils.vector_index import record_embedding_changes
+
+    try:
+        version = get_embedding_version(version_id)
+        if version is None:
+            return {"error": f"Embedding version {version_id} not found"}
+        if version.status == 'active':
+            return {"activated": version.id, "retired": None}
+
+        missing = missing_chunk_count(version.id)
+        if missing and not force:
+            return {"error": f"Embedding version {version.id} is incomplete: {missing} chunks have no embedding"}
+
+        previous = db.session.execute(
+            sa.select(EmbeddingModelVersion.id).where(EmbeddingModelVersion.status == 'active').with_for_update()
+        ).scalar()
+        if previous is not None:
+            # Retire first so the unique index on the active status never sees two rows
+            db.session.execute(
+                sa.update(EmbeddingModelVersion)
+                .where(EmbeddingModelVersion.id == previous)
+                .values(status='retired')
+            )
+        db.session.execute(
+            sa.update(EmbeddingModelVersion)
+            .where(EmbeddingModelVersion.id == version.id)
+            .values(status='active', activated_at=datetime.datetime.utcnow())
+        )
+        record_embedding_changes(reset=True)
+        db.session.commit()
+        logger.info(f"Activated embedding version {version.id} ({version.name}), retired {previous}")
+
+    except Exception as e:
+        logger.exception(f"Error activating embedding version {version_id}: {str(e)}")
+        db.session.rollback()
+        return {"error": str(e)}
+
+    # Embed chunks committed meanwhile by writers that were still encoding for the old version
+    populate_embedding_version(version.id)
+    return {"activated": version.id, "retired": previous}
+
+
+def delete_embedding_version(version_id, batch_size=DELETE_BATCH_SIZE):
+    """
+    Delete a retired version and all of its embeddings and shared vectors
+
+    Args:
+        version_id (int): ID of the version to delete
+        batch_size (int): Rows deleted per statement
+
+    Returns:
+        dict: Number of embeddings deleted, or an error
+    """
+    try:
+        version = get_embedding_version(version_id)
+        if version is None:
+            return {"error": f"Embedding version {version_id} not found"}
+        if version.status == 'active':
+            return {"error": f"Embedding version {version_id} is active and cannot be deleted"}
+
+        # Embeddings first: they reference the shared vectors
+        deleted = {}
+        for model in (VectorEmbedding, EmbeddingVector):
+            deleted[model] = 0
+            while True:
+                batch = (
+                    sa.select(model.id)
+                    .where(model.model_version == version.id)
+                    .limit(batch_size)
+                    .scalar_subquery()
+                )
+                count = db.session.execute(
+                    sa.delete(model)
+                    .where(model.id.in_(batch))
+                    .execution_options(synchronize_session=False)
+                ).rowcount
+                db.session.commit()
+                deleted[model] += count
+                if count < batch_size:
+                    break
+
+        db.session.execute(sa.delete(EmbeddingModelVersion).where(EmbeddingModelVersion.id == version.id))
+        db.session.commit()
+        logger.info(f"Deleted embedding version {version.id} ({version.name}) with {deleted[VectorEmbedding]} "
+                    f"embeddings and {deleted[EmbeddingVector]} shared vectors")
+        return {"deleted": deleted[VectorEmbedding]}
+
+    except Exception as e:
+        logger.exception(f"Error deleting embedding version {version_id}: {str(e)}")
+        db.session.rollback()
+        return {"error": str(e)}
@@ -1,39 +1,214 @@
+import os
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
 import numpy as np
 from flask import current_app
+import sqlalchemy as sa
 from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from app import db
-from models import TextChunk, VectorEmbedding
+from models import TextChunk, VectorEmbedding, EmbeddingVector
+from utils.sparse_vectors import to_sparse, to_dense
 
 logger = logging.getLogger(__name__)
 
-# Global embedding model instance
+# Embedding model instances, one per embedding version; _embedding_model is
+# the one for the active version most recently used
 _embedding_model = None
+_embedding_models = {}
+_embedding_models_lock = threading.Lock()
 
-def get_embedding_model():
+# How new embeddings are stored on VectorEmbedding:
+#   binary - float32 bytes in embedding_blob (compact, decoded with np.frombuffer)
+#   sparse - (index, value) pairs in embedding_blob when that is smaller than
+#            the dense bytes, which it is for short chunks or a large vector_size
+#   array  - legacy float8[] in embedding
+#   both   - write both columns, for deployments that have not migrated every reader
+EMBEDDING_STORAGE_FORMAT = os.environ.get("EMBEDDING_STORAGE_FORMAT", "binary").lower()
+
+# On-disk dtype of embedding_blob: little-endian float32
+EMBEDDING_BLOB_DTYPE = np.dtype('<f4')
+
+# Sparse blobs start with this marker, then the vector size as a little-endian
+# uint32, the int32 indices and the float32 values. A dense blob cannot start
+# with it: as a float32 the marker is ~3e-9, far below any stored component.
+SPARSE_BLOB_MAGIC = b'SPV1'
+SPARSE_INDEX_DTYPE = np.dtype('<i4')
+
+# Number of chunks encoded and inserted per transaction by regenerate_all_embeddings
+REGENERATE_BATCH_SIZE = int(os.environ.get("EMBEDDING_REBUILD_BATCH_SIZE", 500))
+
+# Maximum entries in the embedder's word -> position and bigram -> position caches
+TOKEN_CACHE_SIZE = int(os.environ.get("EMBEDDING_TOKEN_CACHE_SIZE", 50000))
+BIGRAM_CACHE_SIZE = int(os.environ.get("EMBEDDING_BIGRAM_CACHE_SIZE", 100000))
+
+# Unused shared vectors deleted per statement by prune_unused_embedding_vectors
+VECTOR_PRUNE_BATCH_SIZE = 1000
+
+# Collapse search results whose chunks have identical text, fetching this many
+# times top_k candidates so that distinct results can fill the freed places
+SEARCH_COLLAPSE_DUPLICATES = os.environ.get("SEARCH_COLLAPSE_DUPLICATES", "true").lower() == "true"
+SEARCH_DUPLICATE_OVERFETCH = max(1, int(os.environ.get("SEARCH_DUPLICATE_OVERFETCH", 3)))
+
+def get_embedding_model(version=None):
     """
-    Get or initialize the embedding model
+    Get or initialize the embedding model for an embedding version
+    
+    Args:
+        version (EmbeddingVersionInfo): Version to encode for; defaults to the
+            active version (see utils/embedding_versions.py)
     
     Returns:
-        object: The embedding model
+        object: The embedding model, with model_version set to the version's ID
     """
     # Since we can't install sentence-transformers in this environment, 
     # we'll use a simple numpy-based solution for demonstration purposes
     global _embedding_model
     
-    if _embedding_model is None:
-        _embedding_model = SimpleEmbedder()
+    if version is None:
+        from utils.embedding_versions import get_active_embedding_version
+        version = get_active_embedding_version()
     
-    return _embedding_model
+    with _embedding_models_lock:
+        model = _embedding_models.get(version.id)
+        if model is None:
+            model = SimpleEmbedder(vector_size=version.vector_size, hashing=version.hashing)
+            model.model_version = version.id
+            _embedding_models[version.id] = model
+        if version.status == 'active':
+            _embedding_model = model
+    
+    return model
+
+# Fixed vector positions for common medical terms; hashed words and bigrams
+# fill the remaining positions
+MEDICAL_TERMS = {
+    # Common rheumatology terms
+    'arthritis': 0, 'rheumatoid': 1, 'autoimmune': 2, 'pain': 3, 
+    'inflammation': 4, 'joint': 5, 'swelling': 6, 'stiffness': 7,
+    'lupus': 8, 'scleroderma': 9, 'vasculitis': 10, 'gout': 11,
+    'fibromyalgia': 12, 'osteoarthritis': 13, 'ankylosing': 14, 'spondylitis': 15,
+    'psoriatic': 16, 'methotrexate': 17, 'prednisone': 18, 'biologics': 19,
+    
+    # ILD-specific terms
+    'ild': 20, 'interstitial': 21, 'lung': 22, 'disease': 23, 
+    'fibrosis': 24, 'pulmonary': 25, 'respiratory': 26, 'dyspnea': 27,
+    'cough': 28, 'hrct': 29, 'pft': 30, 'fvc': 31, 
+    'dlco': 32, 'screening': 33, 'diagnosis': 34, 'treatment': 35,
+    'subclinical': 36, 'clinical': 37, 'progressive': 38, 'severe': 39
+}
+
+# Bigrams are hashed into the positions after the medical terms
+BIGRAM_OFFSET = 40
+
+# Weights added for each occurrence of a word or bigram
+WORD_WEIGHT = 1.0
+BIGRAM_WEIGHT = 0.5  # Lower weight than individual words
+
+# Marks a cache miss, since None is a valid cached position (stopwords)
+_MISSING = object()
+
+# Hash functions an embedding version can use to place words and bigrams
+HASH_FUNCTIONS = {
+    'md5': hashlib.md5,
+    'sha1': hashlib.sha1,
+    'blake2b': hashlib.blake2b
+}
+
+class LRUCache:
+    """
+    Bounded, thread-safe least-recently-used mapping with hit/miss counters
+    """
+    
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def __len__(self):
+        return len(self._data)
+    
+    def get(self, key, default=None):
+        """
+        Look up a key, marking it as recently used
+        
+        Args:
+            key: The key to look up
+            default: Value returned when the key is not cached
+            
+        Returns:
+            The cached value, or default
+        """
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key, value):
+        """
+        Store a value, evicting the least recently used entry when full
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        """Remove every entry and reset the counters"""
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+    
+    def stats(self):
+        """
+        Get usage counters for sizing the cache
+        
+        Returns:
+            dict: size, max_size, hits, misses, evictions and hit_rate
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None
+            }
 
 class SimpleEmbedder:
     """
     Improved semantic embedder using word-level features for better semantic matching
     """
     
-    def __init__(self, vector_size=128):
+    def __init__(self, vector_size=128, hashing='md5'):
+        if vector_size <= BIGRAM_OFFSET:
+            raise ValueError(f"vector_size must be larger than {BIGRAM_OFFSET}, got {vector_size}")
+        if hashing not in HASH_FUNCTIONS:
+            raise ValueError(f"Unknown hashing scheme {hashing!r}, expected one of {sorted(HASH_FUNCTIONS)}")
         self.vector_size = vector_size
+        self.hashing = hashing
+        self._hash_function = HASH_FUNCTIONS[hashing]
+        # ID of the embedding version this model encodes for, set by get_embedding_model
+        self.model_version = None
         # Common words to ignore (stopwords)
         self.stopwords = {
             'a', 'an', 'the', 'and', 'or', 'but', 'if', 'because', 'as', 'what', 
@@ -42,6 +217,10 @@ class SimpleEmbedder:
             'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'having',
             'do', 'does', 'did', 'doing'
         }
+        # Word and bigram positions are pure functions of the string, so they
+        # are cached across calls; the same vocabulary recurs in every chunk
+        self.token_cache = LRUCache(TOKEN_CACHE_SIZE)
+        self.bigram_cache = LRUCache(BIGRAM_CACHE_SIZE)
     
     def _tokenize(self, text):
         """
@@ -50,42 +229,65 @@ class SimpleEmbedder:
         # Convert to lowercase and split by whitespace
         return text.lower().split()
     
+    def _hash(self, value):
+        """
+        Hash a string to a large integer
+        
+        With md5 this equals int(hashlib.md5(value.encode()).hexdigest(), 16)
+        without the round trip through a hex string, so stored embeddings stay valid.
+        """
+        return int.from_bytes(self._hash_function(value.encode()).digest(), 'big')
+    
     def _get_word_features(self, word):
         """
         Get features for a word (simple but better than character-level encoding)
         """
-        import hashlib
-        
+        position = self.token_cache.get(word, _MISSING)
+        if position is _MISSING:
+            position = self._compute_word_features(word)
+            self.token_cache.put(word, position)
+        return position
+    
+    def _compute_word_features(self, word):
+        """
+        Compute the vector position for a word without consulting the cache
+        """
         # Skip stopwords
         if word in self.stopwords:
             return None
-            
-        # Simple hash to distribute words across the vector
-        hash_val = int(hashlib.md5(word.encode()).hexdigest(), 16)
-        position = hash_val % self.vector_size
         
         # For common medical terms, use specific positions
-        medical_terms = {
-            # Common rheumatology terms
-            'arthritis': 0, 'rheumatoid': 1, 'autoimmune': 2, 'pain': 3, 
-            'inflammation': 4, 'joint': 5, 'swelling': 6, 'stiffness': 7,
-            'lupus': 8, 'scleroderma': 9, 'vasculitis': 10, 'gout': 11,
-            'fibromyalgia': 12, 'osteoarthritis': 13, 'ankylosing': 14, 'spondylitis': 15,
-            'psoriatic': 16, 'methotrexate': 17, 'prednisone': 18, 'biologics': 19,
-            
-            # ILD-specific terms
-            'ild': 20, 'interstitial': 21, 'lung': 22, 'disease': 23, 
-            'fibrosis': 24, 'pulmonary': 25, 'respiratory': 26, 'dyspnea': 27,
-            'cough': 28, 'hrct': 29, 'pft': 30, 'fvc': 31, 
-            'dlco': 32, 'screening': 33, 'diagnosis': 34, 'treatment': 35,
-            'subclinical': 36, 'clinical': 37, 'progressive': 38, 'severe': 39
-        }
+        position = MEDICAL_TERMS.get(word)
+        if position is not None:
+            return position
         
-        if word in medical_terms:
-            position = medical_terms[word]
-            
+        # Simple hash to distribute words across the vector
+        return self._hash(word) % self.vector_size
+    
+    def _get_bigram_position(self, bigram):
+        """
+        Get the vector position for a bigram such as "lung_disease"
+        """
+        position = self.bigram_cache.get(bigram)
+        if position is None:
+            position = (self._hash(bigram) % (self.vector_size - BIGRAM_OFFSET)) + BIGRAM_OFFSET
+            self.bigram_cache.put(bigram, position)
         return position
     
+    def cache_stats(self):
+        """
+        Get hit-rate counters for the word and bigram caches
+        
+        Lookups are counted once per distinct word or bigram in each batch.
+        
+        Returns:
+            dict: {'tokens': {...}, 'bigrams': {...}}
+        """
+        return {
+            'tokens': self.token_cache.stats(),
+            'bigrams': self.bigram_cache.stats()
+        }
+    
     def encode(self, text, normalize=True):
         """
         Convert text to a vector using word-level features
@@ -100,37 +302,89 @@ class SimpleEmbedder:
         if not text:
             return np.zeros(self.vector_size)
         
-        # Initialize a vector
-        vector = np.zeros(self.vector_size, dtype=np.float32)
+        return self.encode_batch([text], normalize=normalize)[0]
+    
+    def encode_batch(self, texts, normalize=True):
+        """
+        Convert several texts to vectors in one pass
+        
+        Each distinct word and bigram is looked up once per batch in the
+        embedder's caches (and hashed only on a miss), and all counts are
+        accumulated with a single scatter-add. The result is identical,
+        bit for bit, to calling encode() on each text.
+        
+        Args:
+            texts (list): Texts to encode
+            normalize (bool): Whether to normalize each vector
+            
+        Returns:
+            np.ndarray: float32 matrix with one row per text (all zeros for empty texts)
+        """
+        vector_size = self.vector_size
+        word_positions = {}
+        bigram_positions = {}
+        flat_positions = []
+        weights = []
         
-        # Process each word
-        tokens = self._tokenize(text)
-        for token in tokens:
-            feature_pos = self._get_word_features(token)
-            if feature_pos is not None:
-                vector[feature_pos] += 1.0
+        for row, text in enumerate(texts):
+            if not text:
+                continue
+            offset = row * vector_size
+            tokens = self._tokenize(text)
+            
+            # Process each word
+            for token in tokens:
+                if token in word_positions:
+                    feature_pos = word_positions[token]
+                else:
+                    feature_pos = word_positions[token] = self._get_word_features(token)
+                if feature_pos is not None:
+                    flat_positions.append(offset + feature_pos)
+                    weights.append(WORD_WEIGHT)
+            
+            # Add bigram features for important phrase patterns
+            for first, second in zip(tokens, tokens[1:]):
+                bigram = f"{first}_{second}"
+                bigram_pos = bigram_positions.get(bigram)
+                if bigram_pos is None:
+                    bigram_pos = bigram_positions[bigram] = self._get_bigram_position(bigram)
+                flat_positions.append(offset + bigram_pos)
+                weights.append(BIGRAM_WEIGHT)
         
-        # Add bigram features for important phrase patterns
-        for i in range(len(tokens) - 1):
-            bigram = f"{tokens[i]}_{tokens[i+1]}"
-            # Hash the bigram to get a position
-            import hashlib
-            bigram_hash = int(hashlib.md5(bigram.encode()).hexdigest(), 16)
-            bigram_pos = (bigram_hash % (self.vector_size - 40)) + 40  # Use positions after medical terms
-            vector[bigram_pos] += 0.5  # Lower weight than individual words
+        # Scatter-add every occurrence at once. Counts are multiples of 0.5, so
+        # the float64 sums are exact and match incremental float32 addition.
+        counts = np.bincount(
+            np.asarray(flat_positions, dtype=np.int64),
+            weights=np.asarray(weights, dtype=np.float64),
+            minlength=len(texts) * vector_size
+        )
+        matrix = counts.astype(np.float32).reshape(len(texts), vector_size)
         
-        # Normalize the vector
-        if normalize and np.sum(np.abs(vector)) > 0:
-            vector = vector / np.linalg.norm(vector)
+        # Normalize each row exactly as encode() always has
+        if normalize:
+            for row in np.flatnonzero(np.any(matrix != 0, axis=1)):
+                matrix[row] = matrix[row] / np.linalg.norm(matrix[row])
         
-        return vector
+        return matrix
+
+def get_embedding_cache_stats():
+    """
+    Get the embedder's cache counters for this process
+    
+    Returns:
+        dict: Cache statistics, or None if the embedder has not been created yet
+    """
+    if _embedding_model is None or not hasattr(_embedding_model, 'cache_stats'):
+        return None
+    return _embedding_model.cache_stats()
 
-def generate_embeddings(text):
+def generate_embeddings(text, model=None):
     """
     Generate vector embeddings for a text chunk
     
     Args:
         text (str): The text to generate embeddings for
+        model (SimpleEmbedder): Model to encode with; defaults to the active version's
         
     Returns:
         list: Vector embedding as a list of floats, or None if generation failed
@@ -140,10 +394,10 @@ def generate_embeddings(text):
             return None
         
         # Get the embedding model
-        model = get_embedding_model()
+        model = model or get_embedding_model()
         
         # Generate embeddings
-        embedding = model.encode(text)
+        embedding = model.encode_batch([text])[0]
         
         # Convert to Python list for database storage
         return embedding.tolist()
@@ -152,7 +406,437 @@ def generate_embeddings(text):
         logger.exception(f"Error generating embeddings: {str(e)}")
         return None
 
-def search_similar_chunks(query_text, top_k=5, similarity_threshold=0.5):
+def generate_embeddings_batch(texts, model=None):
+    """
+    Generate vector embeddings for several text chunks at once
+    
+    Args:
+        texts (list): The texts to generate embeddings for
+        model (SimpleEmbedder): Model to encode with; defaults to the active version's
+        
+    Returns:
+        list: One entry per text: a list of floats, or None for empty texts
+              (all None if generation failed)
+    """
+    try:
+        if not texts:
+            return []
+        
+        model = model or get_embedding_model()
+        matrix = model.encode_batch(texts)
+        
+        return [row.tolist() if text else None for text, row in zip(texts, matrix)]
+    
+    except Exception as e:
+        logger.exception(f"Error generating embeddings: {str(e)}")
+        return [None] * len(texts)
+
+def embedding_to_blob(embedding):
+    """
+    Serialize an embedding to the compact binary storage format
+    
+    Args:
+        embedding (list or np.ndarray): Embedding vector
+        
+    Returns:
+        bytes: Little-endian float32 bytes
+    """
+    return np.asarray(embedding, dtype=EMBEDDING_BLOB_DTYPE).tobytes()
+
+def embedding_to_sparse_blob(embedding):
+    """
+    Serialize an embedding as its non-zero (index, value) pairs
+    
+    Args:
+        embedding (list or np.ndarray): Embedding vector
+        
+    Returns:
+        bytes: Sparse blob (see SPARSE_BLOB_MAGIC)
+    """
+    vector = np.asarray(embedding, dtype=EMBEDDING_BLOB_DTYPE)
+    indices, values = to_sparse(vector)
+    return (SPARSE_BLOB_MAGIC
+            + np.array([len(vector)], dtype='<u4').tobytes()
+            + indices.astype(SPARSE_INDEX_DTYPE).tobytes()
+            + values.astype(EMBEDDING_BLOB_DTYPE).tobytes())
+
+def is_sparse_blob(blob):
+    """Check whether an embedding blob uses the sparse format"""
+    return bytes(blob[:len(SPARSE_BLOB_MAGIC)]) == SPARSE_BLOB_MAGIC
+
+def blob_to_sparse(blob):
+    """
+    Deserialize a blob in either format into its non-zero entries
+    
+    Args:
+        blob (bytes): Dense or sparse embedding blob
+        
+    Returns:
+        tuple: (indices, values, vector_size)
+    """
+    if not is_sparse_blob(blob):
+        vector = np.frombuffer(blob, dtype=EMBEDDING_BLOB_DTYPE)
+        indices, values = to_sparse(vector)
+        return indices, values, len(vector)
+    
+    header = len(SPARSE_BLOB_MAGIC)
+    vector_size = int(np.frombuffer(blob, dtype='<u4', count=1, offset=header)[0])
+    nnz = (len(blob) - header - 4) // 8
+    indices = np.frombuffer(blob, dtype=SPARSE_INDEX_DTYPE, count=nnz, offset=header + 4)
+    values = np.frombuffer(blob, dtype=EMBEDDING_BLOB_DTYPE, count=nnz, offset=header + 4 + 4 * nnz)
+    return indices, values, vector_size
+
+def blob_to_embedding(blob):
+    """
+    Deserialize an embedding stored in the compact binary format
+    
+    Args:
+        blob (bytes): Little-endian float32 bytes, or a sparse blob
+        
+    Returns:
+        np.ndarray: float32 vector (read-only and backed by the blob when dense)
+    """
+    if is_sparse_blob(blob):
+        indices, values, vector_size = blob_to_sparse(blob)
+        return to_dense(indices, values, vector_size)
+    return np.frombuffer(blob, dtype=EMBEDDING_BLOB_DTYPE)
+
+def stored_embedding_vector(embedding_blob, embedding_array):
+    """
+    Get the vector for a stored embedding row, whichever column holds it
+    
+    Args:
+        embedding_blob (bytes): Value of VectorEmbedding.embedding_blob
+        embedding_array (list): Value of VectorEmbedding.embedding
+        
+    Returns:
+        np.ndarray: float32 vector, or None if the row has no embedding
+    """
+    if embedding_blob:
+        return blob_to_embedding(embedding_blob)
+    if embedding_array:
+        return np.asarray(embedding_array, dtype=np.float32)
+    return None
+
+def stored_embedding_sparse(embedding_blob, embedding_array):
+    """
+    Get the non-zero entries of a stored embedding row without densifying sparse blobs
+    
+    Args:
+        embedding_blob (bytes): Value of VectorEmbedding.embedding_blob
+        embedding_array (list): Value of VectorEmbedding.embedding
+        
+    Returns:
+        tuple: (indices, values, vector_size), or None if the row has no embedding
+    """
+    if embedding_blob:
+        return blob_to_sparse(embedding_blob)
+    if embedding_array:
+        indices, values = to_sparse(embedding_array)
+        return indices, values, len(embedding_array)
+    return None
+
+def vector_embedding_values(chunk_id, embedding, model_version):
+    """
+    Build the column values of a VectorEmbedding row using the configured storage format
+    
+    Every column is always present, so lists of these dicts can be passed to a
+    single bulk INSERT.
+    
+    Args:
+        chunk_id (int): ID of the chunk the embedding belongs to
+        embedding (list or np.ndarray): Embedding vector
+        model_version (int): Embedding version that produced the vector
+        
+    Returns:
+        dict: Values for chunk_id, model_version, embedding_blob and embedding
+    """
+    values = {'chunk_id': chunk_id, 'model_version': model_version, 'embedding_blob': None, 'embedding': None}
+    if EMBEDDING_STORAGE_FORMAT == "sparse":
+        dense_blob = embedding_to_blob(embedding)
+        sparse_blob = embedding_to_sparse_blob(embedding)
+        values['embedding_blob'] = sparse_blob if len(sparse_blob) < len(dense_blob) else dense_blob
+    if EMBEDDING_STORAGE_FORMAT in ("binary", "both"):
+        values['embedding_blob'] = embedding_to_blob(embedding)
+    if EMBEDDING_STORAGE_FORMAT in ("array", "both"):
+        values['embedding'] = [float(value) for value in embedding]
+    return values
+
+def build_vector_embedding(chunk_id, embedding, model_version=None):
+    """
+    Create a VectorEmbedding record using the configured storage format
+    
+    Args:
+        chunk_id (int): ID of the chunk the embedding belongs to
+        embedding (list or np.ndarray): Embedding vector
+        model_version (int): Embedding version that produced the vector; pass
+            model.model_version of the model used to encode it (defaults to
+            the active version)
+        
+    Returns:
+        VectorEmbedding: The unsaved embedding record
+    """
+    if model_version is None:
+        model_version = get_embedding_model().model_version
+    return VectorEmbedding(**vector_embedding_values(chunk_id, embedding, model_version))
+
+def normalize_chunk_text(chunk_text):
+    """
+    Normalize chunk text the way the embedder sees it: lowercase words separated by single spaces
+    
+    Args:
+        chunk_text (str): Chunk text
+        
+    Returns:
+        str: Normalized text
+    """
+    return ' '.join(chunk_text.lower().split())
+
+def chunk_text_hash(chunk_text):
+    """
+    Hash a chunk's normalized text
+    
+    Chunks with the same hash get the same vector from every embedding
+    version, so their embeddings can be shared and their search results
+    collapsed.
+    
+    Args:
+        chunk_text (str): Chunk text
+        
+    Returns:
+        str: Hex-encoded SHA-256 of the normalized text, or None for empty text
+    """
+    if not chunk_text:
+        return None
+    return hashlib.sha256(normalize_chunk_text(chunk_text).encode('utf-8')).hexdigest()
+
+def select_stored_embeddings(*columns):
+    """
+    Select VectorEmbedding columns along with each row's vector, wherever it is stored
+    
+    Rows with a vector_id share an EmbeddingVector and hold no vector of their
+    own; older rows store theirs inline. Either way the last two columns are
+    the vector's embedding_blob and embedding, for stored_embedding_vector().
+    
+    Args:
+        *columns: Columns to select first, e.g. VectorEmbedding.chunk_id
+        
+    Returns:
+        sa.Select: Query over VectorEmbedding joined to its shared vector
+    """
+    return (
+        sa.select(
+            *columns,
+            sa.func.coalesce(VectorEmbedding.embedding_blob, EmbeddingVector.embedding_blob).label('embedding_blob'),
+            sa.func.coalesce(VectorEmbedding.embedding, EmbeddingVector.embedding).label('embedding')
+        )
+        .select_from(VectorEmbedding)
+        .outerjoin(EmbeddingVector, EmbeddingVector.id == VectorEmbedding.vector_id)
+    )
+
+# Shared vectors found for chunks and vectors newly stored, in this process
+_reuse_stats = {'reused': 0, 'stored': 0}
+_reuse_stats_lock = threading.Lock()
+
+def acquire_embedding_vectors(texts_by_hash, model):
+    """
+    Get the shared vector of each chunk text, storing the missing ones
+    
+    Existing vectors are locked FOR KEY SHARE until the caller commits, so
+    prune_unused_embedding_vectors() cannot delete them before the caller's
+    rows reference them. Texts without a vector are encoded in one batch and
+    inserted with a single statement; a concurrent insert of the same text
+    resolves to the same row.
+    
+    Args:
+        texts_by_hash (dict): A chunk text for each distinct text hash
+        model (SimpleEmbedder): Model of the embedding version
+        
+    Returns:
+        dict: EmbeddingVector ID by text hash, for the texts that could be embedded
+    """
+    if not texts_by_hash:
+        return {}
+    
+    # Lock in ID order so that concurrent writers sharing texts cannot deadlock
+    vector_ids = dict(db.session.execute(
+        sa.select(EmbeddingVector.text_hash, EmbeddingVector.id)
+        .where(EmbeddingVector.model_version == model.model_version)
+        .where(EmbeddingVector.text_hash.in_(list(texts_by_hash)))
+        .order_by(EmbeddingVector.id)
+        .with_for_update(read=True, key_share=True)
+    ).all())
+    reused = len(vector_ids)
+    
+    # Encode each text without a stored vector once
+    unseen = sorted(text_hash for text_hash in texts_by_hash if text_hash not in vector_ids)
+    embeddings = generate_embeddings_batch([texts_by_hash[text_hash] for text_hash in unseen], model=model)
+    rows = []
+    for text_hash, embedding in zip(unseen, embeddings):
+        if embedding:
+            values = vector_embedding_values(None, embedding, model.model_version)
+            rows.append({
+                'text_hash': text_hash,
+                'model_version': model.model_version,
+                'embedding_blob': values['embedding_blob'],
+                'embedding': values['embedding']
+            })
+    
+    if rows:
+        # The no-op update makes RETURNING include rows another writer inserted first
+        statement = pg_insert(EmbeddingVector)
+        statement = statement.on_conflict_do_update(
+            index_elements=['text_hash', 'model_version'],
+            set_={'text_hash': statement.excluded.text_hash}
+        ).returning(EmbeddingVector.text_hash, EmbeddingVector.id)
+        vector_ids.update(db.session.execute(statement, rows).all())
+    
+    with _reuse_stats_lock:
+        _reuse_stats['reused'] += reused
+        _reuse_stats['stored'] += len(rows)
+    if reused:
+        logger.info(f"Reused stored embeddings for {reused} of {len(texts_by_hash)} distinct chunk texts")
+    return vector_ids
+
+def get_embedding_reuse_stats():
+    """
+    Get this process's counters of shared vectors reused and stored
+    
+    Returns:
+        dict: reused, stored and the share of distinct texts that were reused
+    """
+    with _reuse_stats_lock:
+        stats = dict(_reuse_stats)
+    total = stats['reused'] + stats['stored']
+    stats['reuse_rate'] = round(stats['reused'] / total, 4) if total else None
+    return stats
+
+def prune_unused_embedding_vectors(batch_size=VECTOR_PRUNE_BATCH_SIZE):
+    """
+    Delete shared vectors that no chunk's embedding references any more
+    
+    Deleting documents, webpages or chunks leaves their vectors behind when
+    no other chunk has the same text. A vector that a writer takes while it is
+    being pruned makes that batch fail its foreign key check and roll back; it
+    is left for the next run.
+    
+    Args:
+        batch_size (int): Vectors deleted per transaction
+        
+    Returns:
+        int: Number of vectors deleted
+    """
+    deleted = 0
+    while True:
+        unused = (
+            sa.select(EmbeddingVector.id)
+            .where(~sa.select(VectorEmbedding.id).where(VectorEmbedding.vector_id == EmbeddingVector.id).exists())
+            .limit(batch_size)
+            .scalar_subquery()
+        )
+        try:
+            count = db.session.execute(
+                sa.delete(EmbeddingVector)
+                .where(EmbeddingVector.id.in_(unused))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+        except sa.exc.IntegrityError:
+            db.session.rollback()
+            logger.info("Stopped pruning shared embedding vectors: one was taken by a new chunk meanwhile")
+            break
+        deleted += count
+        if count < batch_size:
+            break
+    
+    if deleted:
+        logger.info(f"Pruned {deleted} unused shared embedding vectors")
+    return deleted
+
+def insert_text_chunks(chunk_texts, document_id=None, webpage_id=None, page_nums=None):
+    """
+    Insert the chunks of a document or webpage with a single bulk INSERT ... RETURNING
+    
+    Replaces one ORM add() per chunk followed by a flush, which costs a round
+    trip per chunk just to learn the new IDs.
+    
+    Args:
+        chunk_texts (list): Chunk texts in order; chunk_index is the position
+        document_id (int, optional): Document the chunks belong to
+        webpage_id (int, optional): Webpage the chunks belong to
+        page_nums (list, optional): Page each chunk starts on, in the same order
+        
+    Returns:
+        list: IDs of the inserted chunks, in the order of chunk_texts
+    """
+    if not chunk_texts:
+        return []
+    
+    if page_nums is None:
+        page_nums = [None] * len(chunk_texts)
+    
+    rows = [
+        {
+            'document_id': document_id,
+            'webpage_id': webpage_id,
+            'text': chunk_text,
+            'text_hash': chunk_text_hash(chunk_text),
+            'chunk_index': i,
+            'page_num': page_num
+        }
+        for i, (chunk_text, page_num) in enumerate(zip(chunk_texts, page_nums))
+    ]
+    return db.session.execute(
+        sa.insert(TextChunk).returning(TextChunk.id, sort_by_parameter_order=True),
+        rows
+    ).scalars().all()
+
+def insert_chunk_embeddings(chunk_ids, chunk_texts, model=None):
+    """
+    Give chunks embeddings of a version with a single bulk INSERT
+    
+    Each embedding row points at the shared vector of the chunk's normalized
+    text (see acquire_embedding_vectors), so chunks with the same text
+    (boilerplate, reference lists, re-crawled pages) store one vector between
+    them and texts that already have one are not encoded again. The caller
+    records the embedding changes and commits.
+    
+    Args:
+        chunk_ids (list): Chunk IDs
+        chunk_texts (list): Texts of the chunks, in the same order
+        model (SimpleEmbedder, optional): Model to encode with; defaults to the
+            active embedding version's
+        
+    Returns:
+        list: IDs of the chunks that got an embedding
+    """
+    if not chunk_ids:
+        return []
+    
+    model = model or get_embedding_model()
+    text_hashes = [chunk_text_hash(chunk_text) for chunk_text in chunk_texts]
+    texts_by_hash = {}
+    for text_hash, chunk_text in zip(text_hashes, chunk_texts):
+        if text_hash:
+            texts_by_hash.setdefault(text_hash, chunk_text)
+    vector_ids = acquire_embedding_vectors(texts_by_hash, model)
+    
+    rows = [
+        {
+            'chunk_id': chunk_id,
+            'model_version': model.model_version,
+            'vector_id': vector_ids[text_hash],
+            'embedding_blob': None,
+            'embedding': None
+        }
+        for chunk_id, text_hash in zip(chunk_ids, text_hashes)
+        if text_hash in vector_ids
+    ]
+    if rows:
+        db.session.execute(sa.insert(VectorEmbedding), rows)
+    return [row['chunk_id'] for row in rows]
+
+def search_similar_chunks(query_text, top_k=5, similarity_threshold=0.5, ef_search=None):
     """
     Search for text chunks similar to the query
     
@@ -160,48 +844,87 @@ def search_similar_chunks(query_text, top_k=5, similarity_threshold=0.5):
         query_text (str): The query text to find similar chunks for
         top_k (int): Number of top results to return
         similarity_threshold (float): Minimum similarity score to include result
+        ef_search (int): Candidate list size for approximate (HNSW) search; larger
+            values trade speed for recall. Ignored by the exact search.
         
     Returns:
         list: List of (chunk_id, similarity_score) tuples
     """
     try:
-        # Generate query embedding
+        # Encode the query for the active embedding version; only its vectors are searched
         model = get_embedding_model()
         query_embedding = model.encode(query_text)
         
-        # Get all embeddings from the database
-        # In a real application, this would be optimized with vector search extensions
-        embeddings = VectorEmbedding.query.all()
-        logger.debug(f"Found {len(embeddings)} total embeddings in the database")
-        
-        # Calculate cosine similarity for each embedding
-        similarities = []
-        for emb in embeddings:
-            if emb.embedding:
-                # Convert stored embedding back to numpy array
-                vector = np.array(emb.embedding)
-                
-                # Calculate similarity
-                similarity = cosine_similarity(query_embedding, vector)
-                
-                # Add to list if above threshold
-                if similarity >= similarity_threshold:
-                    similarities.append((emb.chunk_id, similarity))
-        
-        # Sort by similarity (highest first)
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        
-        logger.debug(f"Found {len(similarities)} similar chunks with similarity >= {similarity_threshold}")
+        # Fetch extra candidates to make up for duplicates collapsed below
+        requested_k = top_k
+        if SEARCH_COLLAPSE_DUPLICATES:
+            top_k = top_k * SEARCH_DUPLICATE_OVERFETCH
+        
+        # Prefer the database-side ANN index when pgvector is available
+        from utils.pgvector_search import search_with_pgvector, SEARCH_BACKEND
+        similarities = search_with_pgvector(query_embedding, top_k=top_k,
+                                            similarity_threshold=similarity_threshold, ef_search=ef_search,
+                                            model_version=model.model_version)
+        
+        if similarities is None and SEARCH_BACKEND == "hnsw":
+            # Approximate search over the in-process HNSW graph
+            from utils.hnsw_index import get_hnsw_index
+            index = get_hnsw_index(model.vector_size, model.model_version)
+            logger.debug(f"Searching {len(index)} total embeddings in the HNSW index")
+            
+            similarities = index.search(query_embedding, top_k=top_k,
+                                        similarity_threshold=similarity_threshold, ef_search=ef_search)
+        
+        if similarities is None:
+            # Score the query against the in-memory index with one matrix-vector product
+            from utils.vector_index import get_vector_index
+            index = get_vector_index(model.vector_size, model.model_version)
+            logger.debug(f"Searching {len(index)} total embeddings in the vector index")
+            
+            similarities = index.search(query_embedding, top_k=top_k, similarity_threshold=similarity_threshold)
+        
+        if similarities and SEARCH_COLLAPSE_DUPLICATES:
+            similarities = collapse_duplicate_chunks(similarities)
+        similarities = similarities[:requested_k]
+        
         if similarities:
             logger.debug(f"Top similarity scores: {[score for _, score in similarities[:3]]}")
         
-        # Return top-k results
-        return similarities[:top_k]
+        return similarities
     
     except Exception as e:
         logger.exception(f"Error searching for similar chunks: {str(e)}")
         return []
 
+def collapse_duplicate_chunks(similarities):
+    """
+    Keep only the best-scoring chunk of each group of chunks with identical text
+    
+    Args:
+        similarities (list): (chunk_id, similarity_score) tuples, best first
+        
+    Returns:
+        list: The tuples without exact duplicates, in the same order
+    """
+    text_hashes = dict(db.session.execute(
+        sa.select(TextChunk.id, TextChunk.text_hash)
+        .where(TextChunk.id.in_([chunk_id for chunk_id, _ in similarities]))
+    ).all())
+    
+    seen = set()
+    collapsed = []
+    for chunk_id, score in similarities:
+        text_hash = text_hashes.get(chunk_id)
+        if text_hash is not None:
+            if text_hash in seen:
+                continue
+            seen.add(text_hash)
+        collapsed.append((chunk_id, score))
+    
+    if len(collapsed) < len(similarities):
+        logger.debug(f"Collapsed {len(similarities) - len(collapsed)} duplicate search results")
+    return collapsed
+
 def cosine_similarity(a, b):
     """
     Calculate cosine similarity between two vectors
@@ -221,71 +944,36 @@ def cosine_similarity(a, b):
     
     return np.dot(a, b) / (norm_a * norm_b)
 
-def regenerate_all_embeddings():
+def regenerate_all_embeddings(resume=True, keep_previous=False):
     """
-    Regenerate all embeddings using the improved algorithm
+    Regenerate all embeddings using the improved algorithm, without interrupting search
     
     This function will:
-    1. Delete all existing embeddings
-    2. Regenerate embeddings for all text chunks
-    3. Return statistics on the process
+    1. Create a rebuild job with a shadow embedding version (or resume an unfinished job)
+    2. Stream every text chunk in ID order, encoding and bulk-inserting one batch at a time
+    3. Atomically switch search to the new embeddings and delete the old ones
+    4. Return statistics on the process
+    
+    Progress is recorded on the job after every batch; see utils/embedding_rebuild.py.
+    
+    Args:
+        resume (bool): Continue the most recent unfinished job instead of starting over
+        keep_previous (bool): Keep the replaced embeddings (as a retired version)
     
     Returns:
         dict: Statistics about regenerated embeddings
     """
     try:
-        from app import db
-        from models import TextChunk, VectorEmbedding
-        
-        # Delete all existing embeddings
-        existing_count = VectorEmbedding.query.count()
-        VectorEmbedding.query.delete()
-        db.session.commit()
-        logger.info(f"Deleted {existing_count} existing embeddings")
-        
-        # Get all text chunks
-        chunks = TextChunk.query.all()
-        chunk_count = len(chunks)
-        logger.info(f"Found {chunk_count} text chunks to process")
+        from utils.embedding_rebuild import create_rebuild_job, run_rebuild_job
         
-        # Process each chunk
-        success_count = 0
-        error_count = 0
+        created = create_rebuild_job(resume=resume)
+        if 'error' in created:
+            return created
         
-        for chunk in chunks:
-            try:
-                # Generate new embedding
-                embedding = generate_embeddings(chunk.text)
-                
-                if embedding:
-                    # Create embedding record
-                    vector_embedding = VectorEmbedding(
-                        chunk_id=chunk.id,
-                        embedding=embedding
-                    )
-                    db.session.add(vector_embedding)
-                    success_count += 1
-                else:
-                    error_count += 1
-                    logger.warning(f"Failed to generate embedding for chunk {chunk.id}")
-            
-            except Exception as e:
-                error_count += 1
-                logger.exception(f"Error processing chunk {chunk.id}: {str(e)}")
-        
-        # Commit changes
-        db.session.commit()
-        logger.info(f"Successfully regenerated {success_count} embeddings with {error_count} errors")
-        
-        return {
-            "deleted": existing_count,
-            "total_chunks": chunk_count,
-            "success": success_count,
-            "errors": error_count
-        }
+        return run_rebuild_job(created['job_id'], batch_size=REGENERATE_BATCH_SIZE, keep_previous=keep_previous)
     
     except Exception as e:
         logger.exception(f"Error regenerating embeddings: {str(e)}")
         return {
             "error": str(e)
-        }
\ No newline at end of file
+        }
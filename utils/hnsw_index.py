@@ -0,0 +1,593 @@
+"""
+HNSW Index Module
+
+This module provides an approximate nearest-neighbour index for deployments
+that cannot install database extensions such as pgvector. It implements a
+Hierarchical Navigable Small World graph (Malkov & Yashunin) in plain Python
+with NumPy for the distance computations, so it has no extra dependencies.
+
+Search cost grows roughly with log(N) instead of N, at the price of a small
+loss in recall that is controlled by three parameters:
+    M               - links per node (build time; more links = better recall, more memory)
+    ef_construction - candidate list size while inserting (build time)
+    ef_search       - candidate list size while searching (query time)
+
+The graph is kept in step with the database through the same generation
+counter and change log as the exact in-memory index, and is persisted to disk
+so that a restarted process does not have to rebuild it. Run
+benchmark_ann_recall.py to compare recall and latency against exact search.
+"""
+
+import os
+import math
+import heapq
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Graph parameters (see module docstring)
+HNSW_M = int(os.environ.get("HNSW_M", 16))
+HNSW_EF_CONSTRUCTION = int(os.environ.get("HNSW_EF_CONSTRUCTION", 100))
+HNSW_EF_SEARCH = int(os.environ.get("HNSW_EF_SEARCH", 64))
+
+# Where the graph is saved between restarts
+HNSW_INDEX_PATH = os.environ.get(
+    "HNSW_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "instance", "hnsw_index.npz")
+)
+
+# Save the graph after this many inserts/deletes have been applied since the last save
+HNSW_SAVE_EVERY = int(os.environ.get("HNSW_SAVE_EVERY", 500))
+
+# Rebuild the graph once this fraction of its nodes are deleted
+HNSW_REBUILD_DELETED_RATIO = float(os.environ.get("HNSW_REBUILD_DELETED_RATIO", 0.2))
+
+# Bumped whenever the on-disk layout changes
+FILE_FORMAT_VERSION = 1
+
+
+class HNSWIndex:
+    """
+    Hierarchical Navigable Small World graph over unit-length vectors
+
+    Nodes are addressed by their insertion order. Each node stores its vector,
+    the chunk ID it belongs to, its top layer and one neighbour list per
+    layer. Distances are cosine distances (1 - dot product) because every
+    vector is normalized on insert.
+
+    Deleting a chunk only marks its node; deleted nodes still route searches
+    but are never returned. Callers rebuild the graph once too many nodes are
+    deleted.
+    """
+
+    def __init__(self, vector_size, m=None, ef_construction=None, seed=None):
+        self.vector_size = vector_size
+        self.m = m or HNSW_M
+        self.max_links_0 = 2 * self.m  # Layer 0 is denser, as in the paper
+        self.ef_construction = max(ef_construction or HNSW_EF_CONSTRUCTION, self.m)
+        self.level_multiplier = 1 / math.log(max(self.m, 2))
+        self._rng = np.random.default_rng(seed)
+
+        self.vectors = np.zeros((0, vector_size), dtype=np.float32)
+        self.chunk_ids = []
+        self.levels = []
+        self.links = []  # links[node][layer] -> list of neighbour nodes
+        self.deleted = []
+        self.node_for_chunk = {}
+        self.deleted_count = 0
+        self.entry_point = None
+        self.max_level = -1
+
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.node_for_chunk)
+
+    @property
+    def node_count(self):
+        """Number of nodes in the graph, including deleted ones"""
+        return len(self.chunk_ids)
+
+    def _random_level(self):
+        """Draw the top layer for a new node from the exponentially decaying distribution"""
+        return int(-math.log(1.0 - self._rng.random()) * self.level_multiplier)
+
+    def _store_vector(self, vector):
+        """Append a normalized vector to the vector matrix, growing it when full"""
+        node = self.node_count
+        if node >= len(self.vectors):
+            capacity = max(1024, 2 * len(self.vectors))
+            grown = np.zeros((capacity, self.vector_size), dtype=np.float32)
+            grown[:node] = self.vectors[:node]
+            self.vectors = grown
+
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        self.vectors[node] = vector / norm if norm > 0 else vector
+        return node
+
+    def _distances(self, query, nodes):
+        """Cosine distances from a query to a list of nodes"""
+        return 1.0 - self.vectors[nodes] @ query
+
+    def _search_layer(self, query, entry_points, ef, layer):
+        """
+        Best-first search of one layer
+
+        Args:
+            query (np.ndarray): Normalized query vector
+            entry_points (list): (distance, node) pairs to start from
+            ef (int): Number of closest nodes to keep
+            layer (int): Graph layer to search
+
+        Returns:
+            list: Up to ef (distance, node) pairs, in no particular order
+        """
+        visited = {node for _, node in entry_points}
+        candidates = list(entry_points)
+        heapq.heapify(candidates)
+        results = [(-distance, node) for distance, node in entry_points]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            distance, node = heapq.heappop(candidates)
+            if distance > -results[0][0] and len(results) >= ef:
+                break
+
+            neighbours = [n for n in self.links[node][layer] if n not in visited]
+            if not neighbours:
+                continue
+            visited.update(neighbours)
+
+            # One matrix-vector product per expanded node instead of one per neighbour
+            for neighbour, neighbour_distance in zip(neighbours, self._distances(query, neighbours).tolist()):
+                if len(results) < ef or neighbour_distance < -results[0][0]:
+                    heapq.heappush(candidates, (neighbour_distance, neighbour))
+                    heapq.heappush(results, (-neighbour_distance, neighbour))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+
+        return [(-negative_distance, node) for negative_distance, node in results]
+
+    def _select_neighbours(self, candidates, max_links):
+        """
+        Choose links with the paper's diversity heuristic
+
+        A candidate is kept only if it is closer to the base node than to any
+        neighbour already kept, which spreads links across directions and keeps
+        the graph navigable on clustered data. Remaining slots are filled with
+        the closest rejected candidates.
+
+        Args:
+            candidates (list): (distance, node) pairs relative to the base node
+            max_links (int): Maximum number of neighbours to return
+
+        Returns:
+            list: Selected neighbour nodes
+        """
+        ordered = sorted(candidates)
+        if len(ordered) <= max_links:
+            return [node for _, node in ordered]
+
+        selected = []
+        rejected = []
+        for distance, node in ordered:
+            if len(selected) >= max_links:
+                break
+            if selected:
+                distances_to_selected = 1.0 - self.vectors[selected] @ self.vectors[node]
+                if np.any(distances_to_selected < distance):
+                    rejected.append(node)
+                    continue
+            selected.append(node)
+
+        for node in rejected:
+            if len(selected) >= max_links:
+                break
+            selected.append(node)
+
+        return selected
+
+    def _shrink_links(self, node, layer, max_links):
+        """Trim a node's neighbour list on one layer back down to max_links"""
+        neighbours = self.links[node][layer]
+        distances = self._distances(self.vectors[node], neighbours).tolist()
+        self.links[node][layer] = self._select_neighbours(list(zip(distances, neighbours)), max_links)
+
+    def add(self, chunk_id, vector):
+        """
+        Insert a vector, replacing any earlier vector for the same chunk
+
+        Args:
+            chunk_id (int): Chunk the vector belongs to
+            vector (np.ndarray): Embedding vector
+        """
+        with self._lock:
+            self.remove(chunk_id)
+
+            node = self._store_vector(vector)
+            level = self._random_level()
+            self.chunk_ids.append(int(chunk_id))
+            self.levels.append(level)
+            self.links.append([[] for _ in range(level + 1)])
+            self.deleted.append(False)
+            self.node_for_chunk[int(chunk_id)] = node
+
+            if self.entry_point is None:
+                self.entry_point = node
+                self.max_level = level
+                return
+
+            query = self.vectors[node]
+            entry = [(float(self._distances(query, [self.entry_point])[0]), self.entry_point)]
+
+            # Greedy descent through the layers above the new node's top layer
+            for layer in range(self.max_level, level, -1):
+                entry = [min(self._search_layer(query, entry, 1, layer))]
+
+            for layer in range(min(level, self.max_level), -1, -1):
+                candidates = self._search_layer(query, entry, self.ef_construction, layer)
+                max_links = self.max_links_0 if layer == 0 else self.m
+                neighbours = self._select_neighbours(candidates, self.m)
+                self.links[node][layer] = neighbours
+
+                for neighbour in neighbours:
+                    neighbour_links = self.links[neighbour][layer]
+                    neighbour_links.append(node)
+                    if len(neighbour_links) > max_links:
+                        self._shrink_links(neighbour, layer, max_links)
+
+                entry = candidates
+
+            if level > self.max_level:
+                self.max_level = level
+                self.entry_point = node
+
+    def remove(self, chunk_id):
+        """
+        Mark the node for a chunk as deleted, if there is one
+
+        Args:
+            chunk_id (int): Chunk whose vector should no longer be returned
+
+        Returns:
+            bool: True if a node was deleted
+        """
+        with self._lock:
+            node = self.node_for_chunk.pop(int(chunk_id), None)
+            if node is None:
+                return False
+            self.deleted[node] = True
+            self.deleted_count += 1
+            return True
+
+    def deleted_ratio(self):
+        """Fraction of graph nodes that are marked as deleted"""
+        return self.deleted_count / self.node_count if self.node_count else 0.0
+
+    def search(self, query_vector, top_k=5, similarity_threshold=0.5, ef_search=None):
+        """
+        Find the chunks whose vectors are approximately most similar to a query
+
+        Args:
+            query_vector (np.ndarray): The query embedding
+            top_k (int): Number of top results to return
+            similarity_threshold (float): Minimum similarity score to include result
+            ef_search (int): Candidate list size; larger is slower but more accurate
+
+        Returns:
+            list: List of (chunk_id, similarity_score) tuples, highest score first
+        """
+        if top_k <= 0:
+            return []
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        ef = max(ef_search or HNSW_EF_SEARCH, top_k)
+
+        with self._lock:
+            if self.entry_point is None or not self.node_for_chunk:
+                return []
+
+            entry = [(float(self._distances(query, [self.entry_point])[0]), self.entry_point)]
+            for layer in range(self.max_level, 0, -1):
+                entry = [min(self._search_layer(query, entry, 1, layer))]
+
+            # Ask for extra candidates when deleted nodes may crowd out live ones
+            if self.deleted_count:
+                ef = min(int(ef / (1.0 - min(self.deleted_ratio(), 0.9))) + 1, self.node_count)
+            candidates = sorted(self._search_layer(query, entry, ef, 0))
+
+            results = []
+            for distance, node in candidates:
+                if self.deleted[node]:
+                    continue
+                similarity = 1.0 - distance
+                if similarity < similarity_threshold:
+                    break
+                results.append((self.chunk_ids[node], float(similarity)))
+                if len(results) >= top_k:
+                    break
+
+        return results
+
+    def save(self, path):
+        """
+        Write the graph to disk atomically
+
+        The file is written next to its destination and renamed into place so
+        that readers never see a partial file.
+
+        Args:
+            path (str): Destination .npz file
+        """
+        with self._lock:
+            count = self.node_count
+            link_counts = []
+            link_targets = []
+            for node_links in self.links:
+                for layer_links in node_links:
+                    link_counts.append(len(layer_links))
+                    link_targets.extend(layer_links)
+
+            arrays = {
+                'format_version': np.array(FILE_FORMAT_VERSION),
+                'params': np.array([self.vector_size, self.m, self.ef_construction,
+                                    -1 if self.entry_point is None else self.entry_point, self.max_level]),
+                'vectors': self.vectors[:count],
+                'chunk_ids': np.array(self.chunk_ids, dtype=np.int64),
+                'levels': np.array(self.levels, dtype=np.int32),
+                'deleted': np.array(self.deleted, dtype=bool),
+                'link_counts': np.array(link_counts, dtype=np.int32),
+                'link_targets': np.array(link_targets, dtype=np.int32),
+            }
+            arrays.update(self._extra_arrays())
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temp_path, path)
+
+    def _extra_arrays(self):
+        """Additional arrays to persist; overridden by subclasses"""
+        return {}
+
+    @classmethod
+    def load(cls, file_path, **kwargs):
+        """
+        Read a graph written by save()
+
+        Args:
+            file_path (str): .npz file to read
+            **kwargs: Extra constructor arguments for subclasses
+
+        Returns:
+            tuple: (index, dict of all arrays in the file)
+        """
+        with np.load(file_path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+
+        if int(arrays['format_version']) != FILE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported HNSW index file version {int(arrays['format_version'])}")
+
+        vector_size, m, ef_construction, entry_point, max_level = arrays['params'].tolist()
+        index = cls(vector_size, m=m, ef_construction=ef_construction, **kwargs)
+
+        index.vectors = np.array(arrays['vectors'], dtype=np.float32)
+        index.chunk_ids = arrays['chunk_ids'].tolist()
+        index.levels = arrays['levels'].tolist()
+        index.deleted = arrays['deleted'].tolist()
+        index.entry_point = None if entry_point < 0 else entry_point
+        index.max_level = max_level
+
+        link_counts = arrays['link_counts'].tolist()
+        link_targets = arrays['link_targets'].tolist()
+        position = 0
+        layer_counts = iter(link_counts)
+        for level in index.levels:
+            node_links = []
+            for _ in range(level + 1):
+                count = next(layer_counts)
+                node_links.append(link_targets[position:position + count])
+                position += count
+            index.links.append(node_links)
+
+        for node, (chunk_id, deleted) in enumerate(zip(index.chunk_ids, index.deleted)):
+            if deleted:
+                index.deleted_count += 1
+            else:
+                index.node_for_chunk[chunk_id] = node
+
+        return index, arrays
+
+
+class ChunkHNSWIndex(HNSWIndex):
+    """
+    HNSW graph over the stored chunk embeddings, kept in step with the database
+
+    On first use the graph is loaded from HNSW_INDEX_PATH when that file is
+    present, otherwise it is built from the vector_embedding table. Changes
+    recorded in the embedding change log are then inserted incrementally, and
+    the graph is saved again every HNSW_SAVE_EVERY changes.
+    """
+
+    def __init__(self, vector_size, m=None, ef_construction=None, seed=None, path=None, model_version=None):
+        super().__init__(vector_size, m=m, ef_construction=ef_construction, seed=seed)
+        self.path = path or HNSW_INDEX_PATH
+        # Embedding version whose rows are indexed (None = every row)
+        self.model_version = model_version
+        self.generation = None
+        self.loaded = False
+        self.unsaved_changes = 0
+
+    def _extra_arrays(self):
+        return {
+            'generation': np.array(-1 if self.generation is None else self.generation, dtype=np.int64),
+            'model_version': np.array(-1 if self.model_version is None else self.model_version, dtype=np.int64)
+        }
+
+    @classmethod
+    def load(cls, file_path, **kwargs):
+        kwargs.setdefault('path', file_path)
+        index, arrays = super().load(file_path, **kwargs)
+        generation = int(arrays['generation'])
+        index.generation = None if generation < 0 else generation
+        model_version = int(arrays['model_version']) if 'model_version' in arrays else -1
+        index.model_version = None if model_version < 0 else model_version
+        return index, arrays
+
+    def _reset_graph(self):
+        """Discard every node"""
+        fresh = HNSWIndex(self.vector_size, m=self.m, ef_construction=self.ef_construction)
+        for attr in ('vectors', 'chunk_ids', 'levels', 'links', 'deleted', 'node_for_chunk',
+                     'deleted_count', 'entry_point', 'max_level'):
+            setattr(self, attr, getattr(fresh, attr))
+
+    def build(self):
+        """Insert every stored embedding into a fresh graph and save it"""
+        from utils.vector_index import read_index_state, iter_stored_embeddings
+
+        with self._lock:
+            generation, _ = read_index_state()
+            self._reset_graph()
+
+            for chunk_id, vector in iter_stored_embeddings(self.vector_size, self.model_version):
+                self.add(chunk_id, vector)
+                if self.node_count % 10000 == 0:
+                    logger.info(f"Inserted {self.node_count} embeddings into the HNSW index")
+
+            self.generation = generation
+            self.loaded = True
+            logger.info(f"Built HNSW index with {len(self)} embeddings at generation {generation} "
+                        f"(M={self.m}, ef_construction={self.ef_construction})")
+            self.save_quietly()
+
+    def apply_changes(self, target_generation):
+        """
+        Insert and delete the chunks recorded in the change log since the last update
+
+        Args:
+            target_generation (int): Generation currently stored in the database
+
+        Returns:
+            bool: False if a full rebuild is required instead
+        """
+        from utils.vector_index import fetch_embedding_changes
+
+        with self._lock:
+            changes = fetch_embedding_changes(self.generation, target_generation, self.vector_size,
+                                              self.model_version)
+            if changes is None:
+                return False
+            removed, added, vectors = changes
+
+            for chunk_id in removed:
+                self.remove(chunk_id)
+            for chunk_id in added:
+                if chunk_id in vectors:
+                    self.add(chunk_id, vectors[chunk_id])
+                else:
+                    self.remove(chunk_id)
+
+            self.generation = target_generation
+            self.unsaved_changes += len(added) + len(removed)
+            logger.debug(f"Applied {len(added)} additions and {len(removed)} removals to the HNSW index "
+                         f"(generation {target_generation})")
+            return True
+
+    def ensure_current(self):
+        """Load or build the graph on first use, then apply any new changes"""
+        from utils.vector_index import read_index_state
+
+        with self._lock:
+            if not self.loaded:
+                self.build()
+                return
+
+            generation, pruned_through = read_index_state()
+            if generation == self.generation:
+                return
+
+            if (self.generation is None or pruned_through > self.generation
+                    or not self.apply_changes(generation)
+                    or self.deleted_ratio() > HNSW_REBUILD_DELETED_RATIO):
+                self.build()
+                return
+
+            if self.unsaved_changes >= HNSW_SAVE_EVERY:
+                self.save_quietly()
+
+    def save_quietly(self):
+        """Save the graph to self.path, logging instead of raising on failure"""
+        try:
+            self.save(self.path)
+            self.unsaved_changes = 0
+            logger.info(f"Saved HNSW index to {self.path}")
+        except Exception as e:
+            logger.exception(f"Error saving HNSW index to {self.path}: {str(e)}")
+
+
+def load_chunk_hnsw_index(vector_size, path=None, model_version=None):
+    """
+    Load a saved chunk graph, or create an empty one if it cannot be used
+
+    Args:
+        vector_size (int): Dimensionality of the stored embeddings
+        path (str): Index file; defaults to HNSW_INDEX_PATH
+        model_version (int): Embedding version to index (None = every row)
+
+    Returns:
+        ChunkHNSWIndex: The index; call ensure_current() before searching
+    """
+    path = path or HNSW_INDEX_PATH
+    if os.path.exists(path):
+        try:
+            index, _ = ChunkHNSWIndex.load(path)
+            if (index.vector_size == vector_size and index.m == HNSW_M
+                    and index.model_version == model_version):
+                index.loaded = True
+                logger.info(f"Loaded HNSW index with {len(index)} embeddings from {path} "
+                            f"at generation {index.generation}")
+                return index
+            logger.info(f"Ignoring HNSW index at {path}: built with different parameters")
+        except Exception as e:
+            logger.exception(f"Error loading HNSW index from {path}: {str(e)}")
+
+    return ChunkHNSWIndex(vector_size, path=path, model_version=model_version)
+
+
+# Global graph instance, shared by all threads in this process
+_hnsw_index = None
+_hnsw_index_lock = threading.Lock()
+
+
+def get_hnsw_index(vector_size, model_version=None):
+    """
+    Get or initialize the process-wide HNSW index
+
+    Args:
+        vector_size (int): Dimensionality of the stored embeddings
+        model_version (int): Embedding version to index (None = every row)
+
+    Returns:
+        ChunkHNSWIndex: The shared index, loaded and up to date
+    """
+    global _hnsw_index
+
+    with _hnsw_index_lock:
+        if (_hnsw_index is None or _hnsw_index.vector_size != vector_size
+                or _hnsw_index.model_version != model_version):
+            _hnsw_index = load_chunk_hnsw_index(vector_size, model_version=model_version)
+
+    _hnsw_index.ensure_current()
+    return _hnsw_index
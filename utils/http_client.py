@@ -0,0 +1,259 @@
+"""
+HTTP Client Module
+
+Shared HTTP sessions for outbound requests: NCBI E-utilities, Crossref,
+doi.org and crawled webpages. Calling requests.get() opens a new TCP and TLS
+connection every time; requests made here reuse kept-alive connections from
+a pool per host, shared by every thread of the process.
+
+- Hosts in HOST_SETTINGS (the metadata APIs) get a session of their own, with
+  their own timeouts and retries; every other host shares a default session,
+  which still keeps a connection pool per host.
+- Failed connections and responses with a status in HTTP_RETRY_STATUSES are
+  retried with exponential backoff, honouring Retry-After up to
+  HTTP_RETRY_AFTER_MAX seconds so a crawled site cannot hold a worker for
+  hours. Once retries are exhausted the last response is returned, not raised.
+- Crawled webpages are not retried unless HTTP_CRAWL_RETRIES is set.
+- A timeout passed by the caller overrides the host's.
+
+Configuration:
+- HTTP_POOL_SIZE: kept-alive connections per host (default 10)
+- HTTP_POOL_HOSTS: hosts whose pools a session keeps (default 20)
+- HTTP_RETRIES: retries of Crossref and doi.org (default 2)
+- HTTP_CRAWL_RETRIES: retries of hosts not in HOST_SETTINGS (default 0)
+- HTTP_RETRY_BACKOFF: backoff factor in seconds (default 0.5)
+- HTTP_RETRY_AFTER_MAX: longest Retry-After wait honoured, in seconds
+  (default 5)
+- HTTP_CONNECT_TIMEOUT / HTTP_READ_TIMEOUT: timeouts in seconds of hosts not
+  in HOST_SETTINGS (default 5 and 10)
+- HTTP_HOST_TIMEOUTS: per-host overrides, e.g. "doi.org=5:20,api.crossref.org=10"
+"""
+
+import os
+import logging
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+HTTP_POOL_SIZE = max(1, int(os.environ.get("HTTP_POOL_SIZE", 10)))
+HTTP_POOL_HOSTS = max(1, int(os.environ.get("HTTP_POOL_HOSTS", 20)))
+HTTP_RETRIES = max(0, int(os.environ.get("HTTP_RETRIES", 2)))
+HTTP_CRAWL_RETRIES = max(0, int(os.environ.get("HTTP_CRAWL_RETRIES", 0)))
+HTTP_RETRY_BACKOFF = float(os.environ.get("HTTP_RETRY_BACKOFF", 0.5))
+HTTP_RETRY_AFTER_MAX = max(0, int(os.environ.get("HTTP_RETRY_AFTER_MAX", 5)))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 5))
+HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", 10))
+
+# Statuses that mean "try again later" rather than an answer
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Hosts with a session of their own: (connect, read) timeout and retries
+HOST_SETTINGS = {
+    # _make_request in utils/pubmed_integration.py retries with its own backoff
+    'eutils.ncbi.nlm.nih.gov': {'timeout': (5, 15), 'retries': 0},
+    'api.crossref.org': {'timeout': (5, 10), 'retries': HTTP_RETRIES},
+    'doi.org': {'timeout': (5, 10), 'retries': HTTP_RETRIES},
+}
+
+# Key of the session shared by hosts not in HOST_SETTINGS
+DEFAULT_SESSION_KEY = '*'
+
+
+def parse_host_timeouts(value):
+    """
+    Parse HTTP_HOST_TIMEOUTS
+
+    Args:
+        value (str): Comma-separated host=seconds or host=connect:read entries
+
+    Returns:
+        dict: (connect, read) timeout by host; malformed entries are skipped
+    """
+    timeouts = {}
+    for entry in (value or '').split(','):
+        host, _, seconds = entry.strip().partition('=')
+        if not host or not seconds:
+            continue
+        try:
+            connect, _, read = seconds.partition(':')
+            timeouts[host.strip().lower()] = (float(connect), float(read or connect))
+        except ValueError:
+            logger.warning(f"Ignoring malformed HTTP_HOST_TIMEOUTS entry: {entry}")
+    return timeouts
+
+
+HOST_TIMEOUTS = parse_host_timeouts(os.environ.get("HTTP_HOST_TIMEOUTS"))
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+# Calls and failed calls by host, on top of the connection pools' own counters
+_calls = {}
+_calls_lock = threading.Lock()
+
+
+class CappedRetry(Retry):
+    """Retry that waits at most HTTP_RETRY_AFTER_MAX seconds for a Retry-After"""
+
+    def get_retry_after(self, response):
+        seconds = super().get_retry_after(response)
+        if seconds is None:
+            return None
+        return min(seconds, HTTP_RETRY_AFTER_MAX)
+
+
+def _create_session(retries):
+    """Create a session that keeps connections alive and retries transient failures"""
+    retry = CappedRetry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        status_forcelist=HTTP_RETRY_STATUSES,
+        backoff_factor=HTTP_RETRY_BACKOFF,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+        # requests follows redirects itself
+        redirect=False
+    )
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def _host(url):
+    return (urlparse(url).hostname or '').lower()
+
+
+def get_session(url):
+    """
+    Get the shared session for a URL's host, creating it on first use
+
+    Args:
+        url (str): URL of the request
+
+    Returns:
+        requests.Session: The host's session, or the session shared by other hosts
+    """
+    host = _host(url)
+    key = host if host in HOST_SETTINGS else DEFAULT_SESSION_KEY
+
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            retries = HOST_SETTINGS[key]['retries'] if key in HOST_SETTINGS else HTTP_CRAWL_RETRIES
+            session = _sessions[key] = _create_session(retries)
+        return session
+
+
+def get_timeout(url):
+    """
+    Get the (connect, read) timeout for a URL's host
+
+    Args:
+        url (str): URL of the request
+
+    Returns:
+        tuple: Connect and read timeout in seconds
+    """
+    host = _host(url)
+    if host in HOST_TIMEOUTS:
+        return HOST_TIMEOUTS[host]
+    if host in HOST_SETTINGS:
+        return HOST_SETTINGS[host]['timeout']
+    return (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+
+def request(method, url, **kwargs):
+    """
+    Send a request through the host's pooled session
+
+    Takes the same arguments as requests.request; without a timeout the
+    host's is used.
+
+    Args:
+        method (str): HTTP method
+        url (str): URL of the request
+        **kwargs: Arguments for requests.Session.request
+
+    Returns:
+        requests.Response: The response; raises requests exceptions like requests.request
+    """
+    kwargs.setdefault('timeout', get_timeout(url))
+    failed = False
+    try:
+        return get_session(url).request(method, url, **kwargs)
+    except requests.exceptions.RequestException:
+        failed = True
+        raise
+    finally:
+        _count_call(_host(url), failed)
+
+
+def get(url, **kwargs):
+    """Send a GET request through the host's pooled session, see request()"""
+    return request('GET', url, **kwargs)
+
+
+def head(url, **kwargs):
+    """Send a HEAD request through the host's pooled session, see request()"""
+    return request('HEAD', url, **kwargs)
+
+
+def _count_call(host, failed):
+    with _calls_lock:
+        counts = _calls.setdefault(host, {'calls': 0, 'failed': 0})
+        counts['calls'] += 1
+        if failed:
+            counts['failed'] += 1
+
+
+def get_http_client_stats():
+    """
+    Get this process's connection reuse counters by host
+
+    Requests and connections come from the connection pools, so they include
+    retries and redirects (e.g. of a crawled page). A pool
+    dropped to make room for another host (see HTTP_POOL_HOSTS) starts over.
+
+    Returns:
+        dict: For each host: calls, failed calls, requests sent, connections
+            opened, requests on a reused connection and the reuse rate
+    """
+    hosts = {}
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+
+    for session in sessions:
+        for adapter in set(session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                counts = hosts.setdefault(pool.host, {'requests': 0, 'connections': 0})
+                counts['requests'] += pool.num_requests
+                counts['connections'] += pool.num_connections
+
+    with _calls_lock:
+        calls = {host: dict(counts) for host, counts in _calls.items()}
+
+    stats = {}
+    for host in set(hosts) | set(calls):
+        counts = hosts.get(host, {'requests': 0, 'connections': 0})
+        reused = max(0, counts['requests'] - counts['connections'])
+        stats[host] = {
+            **calls.get(host, {'calls': 0, 'failed': 0}),
+            'requests': counts['requests'],
+            'connections_opened': counts['connections'],
+            'reused': reused,
+            'reuse_rate': round(reused / counts['requests'], 4) if counts['requests'] else None
+        }
+    return stats
@@ -0,0 +1,239 @@
+"""
+Index Snapshot Module
+
+This module stores the vector index as plain .npy files that every gunicorn
+worker maps into memory with np.load(mmap_mode='r'). The operating system's
+page cache then holds a single copy of the matrix however many workers use
+it, and a restarted worker attaches to the file instead of re-reading the
+whole vector_embedding table.
+
+Layout of VECTOR_INDEX_SNAPSHOT_DIR:
+    snapshot-<generation>-dense/matrix.npy  normalized float32 rows, sorted by chunk_id
+    snapshot-<generation>-csr/indptr.npy    the same rows as a sparse CSR matrix
+                             indices.npy
+                             data.npy
+    snapshot-*/chunk_ids.npy                int64 chunk IDs, ascending
+    CURRENT                                 JSON pointer to the live snapshot
+    .lock                                   held by the single writer
+
+A snapshot directory is complete before it is renamed into place, and
+CURRENT is replaced atomically, so readers never see a partial snapshot. Old
+directories are removed once CURRENT points elsewhere; workers that still
+map them keep reading the unlinked files until they re-attach.
+"""
+
+import os
+import json
+import shutil
+import fcntl
+import logging
+
+import numpy as np
+
+from utils.sparse_vectors import CSRMatrix
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = os.environ.get(
+    "VECTOR_INDEX_SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "instance", "vector_index")
+)
+
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = ".lock"
+SNAPSHOT_PREFIX = "snapshot-"
+TEMP_PREFIX = ".tmp-"
+
+
+def _fsync_directory(path):
+    """Flush a directory entry so a rename survives a crash"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _save_array(path, array):
+    """Write an array as .npy and flush it to disk"""
+    with open(path, 'wb') as f:
+        np.save(f, array)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_current_snapshot(snapshot_dir=None):
+    """
+    Read the pointer to the live snapshot
+
+    Args:
+        snapshot_dir (str): Snapshot directory; defaults to SNAPSHOT_DIR
+
+    Returns:
+        dict: {'name', 'generation', 'vector_size', 'layout', 'model_version', 'count'},
+              or None if there is no snapshot
+    """
+    snapshot_dir = snapshot_dir or SNAPSHOT_DIR
+    try:
+        with open(os.path.join(snapshot_dir, CURRENT_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Could not read vector index snapshot pointer: {str(e)}")
+        return None
+
+
+def load_index_snapshot(vector_size, layout="dense", snapshot_dir=None, model_version=None):
+    """
+    Memory-map the live snapshot
+
+    Args:
+        vector_size (int): Expected dimensionality of the vectors
+        layout (str): Expected matrix layout, "dense" or "csr"
+        model_version (int): Expected embedding version of the rows
+        snapshot_dir (str): Snapshot directory; defaults to SNAPSHOT_DIR
+
+    Returns:
+        tuple: (matrix, chunk_ids, generation) with read-only memory-mapped
+               arrays, or None if no usable snapshot exists
+    """
+    snapshot_dir = snapshot_dir or SNAPSHOT_DIR
+
+    # The writer may remove the directory between reading CURRENT and opening
+    # the files, in which case CURRENT already points at a newer snapshot
+    for _ in range(2):
+        current = read_current_snapshot(snapshot_dir)
+        if not current:
+            return None
+        if current.get('vector_size') != vector_size or current.get('layout', 'dense') != layout:
+            logger.info(f"Ignoring vector index snapshot {current.get('name')}: "
+                        f"{current.get('layout', 'dense')} with vector size {current.get('vector_size')}, "
+                        f"expected {layout} with {vector_size}")
+            return None
+        if current.get('model_version') != model_version:
+            logger.info(f"Ignoring vector index snapshot {current.get('name')}: embedding version "
+                        f"{current.get('model_version')}, expected {model_version}")
+            return None
+
+        path = os.path.join(snapshot_dir, current['name'])
+        try:
+            chunk_ids = np.load(os.path.join(path, "chunk_ids.npy"), mmap_mode='r')
+            if layout == "csr":
+                matrix = CSRMatrix(np.load(os.path.join(path, "indptr.npy"), mmap_mode='r'),
+                                   np.load(os.path.join(path, "indices.npy"), mmap_mode='r'),
+                                   np.load(os.path.join(path, "data.npy"), mmap_mode='r'),
+                                   vector_size)
+            else:
+                matrix = np.load(os.path.join(path, "matrix.npy"), mmap_mode='r')
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            logger.exception(f"Error opening vector index snapshot {path}: {str(e)}")
+            return None
+
+        if layout == "csr":
+            valid = (len(matrix.indptr) == len(chunk_ids) + 1
+                     and len(matrix.indices) == len(matrix.data) == matrix.nnz)
+        else:
+            valid = matrix.shape == (len(chunk_ids), vector_size) and matrix.dtype == np.float32
+        if not valid:
+            logger.error(f"Vector index snapshot {path} is malformed: {current.get('count')} rows expected, "
+                         f"{len(chunk_ids)} chunk IDs")
+            return None
+
+        return matrix, chunk_ids, int(current['generation'])
+
+    return None
+
+
+def write_index_snapshot(matrix, chunk_ids, generation, snapshot_dir=None, model_version=None):
+    """
+    Write a snapshot and make it the live one
+
+    Args:
+        matrix (np.ndarray or CSRMatrix): Normalized float32 rows, sorted by chunk_id
+        chunk_ids (np.ndarray): Ascending int64 chunk IDs, one per row
+        generation (int): Embedding generation the rows correspond to
+        snapshot_dir (str): Snapshot directory; defaults to SNAPSHOT_DIR
+        model_version (int): Embedding version the rows belong to
+
+    Returns:
+        str: Path of the live snapshot directory
+    """
+    snapshot_dir = snapshot_dir or SNAPSHOT_DIR
+    os.makedirs(snapshot_dir, exist_ok=True)
+
+    layout = "csr" if isinstance(matrix, CSRMatrix) else "dense"
+    name = f"{SNAPSHOT_PREFIX}{generation:012d}-{layout}"
+    final_path = os.path.join(snapshot_dir, name)
+
+    if not os.path.isdir(final_path):
+        temp_path = os.path.join(snapshot_dir, f"{TEMP_PREFIX}{name}-{os.getpid()}")
+        shutil.rmtree(temp_path, ignore_errors=True)
+        os.makedirs(temp_path)
+        if isinstance(matrix, CSRMatrix):
+            _save_array(os.path.join(temp_path, "indptr.npy"), np.asarray(matrix.indptr, dtype=np.int64))
+            _save_array(os.path.join(temp_path, "indices.npy"), np.asarray(matrix.indices))
+            _save_array(os.path.join(temp_path, "data.npy"), np.asarray(matrix.data, dtype=np.float32))
+        else:
+            _save_array(os.path.join(temp_path, "matrix.npy"), np.ascontiguousarray(matrix, dtype=np.float32))
+        _save_array(os.path.join(temp_path, "chunk_ids.npy"), np.ascontiguousarray(chunk_ids, dtype=np.int64))
+        os.rename(temp_path, final_path)
+
+    pointer = {
+        'name': name,
+        'generation': int(generation),
+        'vector_size': int(matrix.shape[1]),
+        'layout': layout,
+        'model_version': model_version,
+        'count': int(len(chunk_ids)),
+    }
+    temp_pointer = os.path.join(snapshot_dir, f"{CURRENT_FILE}.{os.getpid()}.tmp")
+    with open(temp_pointer, 'w') as f:
+        json.dump(pointer, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_pointer, os.path.join(snapshot_dir, CURRENT_FILE))
+    _fsync_directory(snapshot_dir)
+
+    # Remove superseded snapshots and leftovers from interrupted writers
+    for entry in os.listdir(snapshot_dir):
+        if entry != name and entry.startswith((SNAPSHOT_PREFIX, TEMP_PREFIX)):
+            shutil.rmtree(os.path.join(snapshot_dir, entry), ignore_errors=True)
+
+    logger.info(f"Wrote vector index snapshot {name} with {len(chunk_ids)} embeddings")
+    return final_path
+
+
+class SnapshotWriterLock:
+    """
+    Non-blocking, cross-process lock that allows a single snapshot writer
+
+    Usage:
+        with SnapshotWriterLock() as acquired:
+            if acquired:
+                ...
+    """
+
+    def __init__(self, snapshot_dir=None):
+        self.snapshot_dir = snapshot_dir or SNAPSHOT_DIR
+        self._file = None
+
+    def __enter__(self):
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        self._file = open(os.path.join(self.snapshot_dir, LOCK_FILE), 'w')
+        try:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            self._file.close()
+            self._file = None
+            return False
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        return False
@@ -0,0 +1,253 @@
+"""
+Ingestion Pool Module
+
+This module provides the concurrency building blocks of document ingestion:
+
+- IngestionPipeline runs jobs through a sequence of stages. Each stage has its
+  own worker threads and is fed by a bounded queue, so a stage that is waiting
+  (e.g. on a slow PubMed response) only holds up its own workers, and a stage
+  that falls behind blocks its producers instead of letting work pile up.
+- A process pool for the CPU-bound steps. PDF text extraction and tag
+  matching hold the GIL for the whole document, so stage threads submit them
+  here with run_cpu_bound() (or iter_cpu_bound() to split one document
+  across several processes) and block on the result, while the network-bound
+  steps (DOI resolution, Crossref and PubMed lookups) run in the stage threads
+  themselves, where waiting on I/O releases the GIL.
+
+Sizing (threads per process unless noted):
+- DOCUMENT_CPU_WORKERS: worker processes for CPU-bound steps (defaults to the
+  number of cores); 0 runs them inline in the calling thread
+- DOCUMENT_EXTRACT_WORKERS / DOCUMENT_TAG_WORKERS: CPU stages, default to
+  DOCUMENT_CPU_WORKERS
+- DOCUMENT_WORKERS: metadata stage, i.e. concurrent DOI/Crossref/PubMed
+  lookups; size it to the APIs' rate limits
+- DOCUMENT_STORE_WORKERS: stage that chunks, embeds and writes documents
+- DOCUMENT_STAGE_QUEUE_SIZE: documents waiting in front of each stage
+
+Functions submitted to the process pool must be importable without the Flask
+app, since worker processes are spawned fresh (see utils/tagging.py).
+"""
+
+import os
+import queue
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+# Concurrent metadata lookups (DOI, Crossref, PubMed) per process
+DOCUMENT_WORKERS = max(1, int(os.environ.get("DOCUMENT_WORKERS", 4)))
+
+# Processes for CPU-bound ingestion steps; 0 disables the process pool
+DOCUMENT_CPU_WORKERS = int(os.environ.get("DOCUMENT_CPU_WORKERS", os.cpu_count() or 1))
+
+# Threads of the CPU-bound stages, matched to the process pool by default
+DOCUMENT_EXTRACT_WORKERS = max(1, int(os.environ.get("DOCUMENT_EXTRACT_WORKERS", DOCUMENT_CPU_WORKERS)))
+DOCUMENT_TAG_WORKERS = max(1, int(os.environ.get("DOCUMENT_TAG_WORKERS", DOCUMENT_CPU_WORKERS)))
+
+# Threads that chunk, embed and write documents; each holds a database connection
+DOCUMENT_STORE_WORKERS = max(1, int(os.environ.get("DOCUMENT_STORE_WORKERS", 2)))
+
+# Documents allowed to wait in front of each stage
+DOCUMENT_STAGE_QUEUE_SIZE = max(1, int(os.environ.get("DOCUMENT_STAGE_QUEUE_SIZE", 2)))
+
+# The process pool is created on first use, so processes that never ingest
+# documents do not start any worker processes
+_cpu_pool = None
+_cpu_pool_lock = threading.Lock()
+
+
+def get_cpu_pool():
+    """
+    Get the shared process pool, creating it on first use
+
+    Returns:
+        ProcessPoolExecutor: The pool, or None if the process pool is disabled
+    """
+    global _cpu_pool
+
+    if DOCUMENT_CPU_WORKERS <= 0:
+        return None
+
+    with _cpu_pool_lock:
+        if _cpu_pool is None:
+            # Forking a process that runs threads and holds database connections
+            # is unsafe, so workers start from a fresh interpreter
+            _cpu_pool = ProcessPoolExecutor(
+                max_workers=DOCUMENT_CPU_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            logger.info(f"Started ingestion process pool with {DOCUMENT_CPU_WORKERS} workers")
+        return _cpu_pool
+
+
+def _discard_cpu_pool(pool):
+    """Drop a broken pool so the next call starts a new one"""
+    global _cpu_pool
+
+    with _cpu_pool_lock:
+        if _cpu_pool is pool:
+            _cpu_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run_cpu_bound(func, *args, **kwargs):
+    """
+    Run a CPU-bound function in the process pool and wait for its result
+
+    Falls back to running the function in the calling thread when the pool is
+    disabled or a worker process has died (e.g. killed for using too much
+    memory on a large PDF).
+
+    Args:
+        func (callable): Module-level function, so that it can be pickled
+        *args: Positional arguments for func
+        **kwargs: Keyword arguments for func
+
+    Returns:
+        The function's return value
+    """
+    pool = get_cpu_pool()
+    if pool is None:
+        return func(*args, **kwargs)
+
+    try:
+        return pool.submit(func, *args, **kwargs).result()
+    except BrokenProcessPool:
+        logger.exception(f"Ingestion process pool failed while running {func.__name__}; running it inline")
+        _discard_cpu_pool(pool)
+        return func(*args, **kwargs)
+
+
+def iter_cpu_bound(func, arg_tuples):
+    """
+    Run a CPU-bound function on several sets of arguments in the process pool
+
+    All calls are submitted at once; results are yielded in the order of
+    arg_tuples as soon as each is ready, so the caller can consume the first
+    results while the rest are still running. Like run_cpu_bound(), falls back
+    to the calling thread when the pool is disabled or broken.
+
+    Args:
+        func (callable): Module-level function, so that it can be pickled
+        arg_tuples (list): Positional arguments for each call
+
+    Yields:
+        The return value of each call
+    """
+    pool = get_cpu_pool()
+    if pool is None:
+        for args in arg_tuples:
+            yield func(*args)
+        return
+
+    futures = []
+    try:
+        futures = [pool.submit(func, *args) for args in arg_tuples]
+        for index, future in enumerate(futures):
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                logger.exception(f"Ingestion process pool failed while running {func.__name__}; running it inline")
+                _discard_cpu_pool(pool)
+                for args in arg_tuples[index:]:
+                    yield func(*args)
+                return
+            yield result
+    finally:
+        # The caller stopped early or a call raised: don't leave the rest queued
+        for future in futures:
+            future.cancel()
+
+
+def shutdown_cpu_pool():
+    """Stop the process pool's workers"""
+    global _cpu_pool
+
+    with _cpu_pool_lock:
+        pool, _cpu_pool = _cpu_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+
+class IngestionPipeline:
+    """
+    Stages with their own worker threads, connected by bounded queues
+
+    A job is passed to each stage function in turn. If a stage raises, the
+    job leaves the pipeline and on_error(job, exception) is called instead.
+    Stage functions and on_error run inside an app context of their own.
+    """
+
+    def __init__(self, app, stages, on_error, queue_size=DOCUMENT_STAGE_QUEUE_SIZE):
+        """
+        Args:
+            app (Flask): The application, for the stage threads' app contexts
+            stages (list): (name, function, worker count) for each stage, in order
+            on_error (callable): Called with (job, exception) when a stage fails
+            queue_size (int): Jobs allowed to wait in front of each stage
+        """
+        self.app = app
+        self.stages = stages
+        self.on_error = on_error
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start each stage's worker threads, replacing any that have died"""
+        with self._lock:
+            self._threads = [(index, thread) for index, thread in self._threads if thread.is_alive()]
+            for index, (name, _, workers) in enumerate(self.stages):
+                running = sum(1 for stage_index, _ in self._threads if stage_index == index)
+                for _ in range(workers - running):
+                    thread = threading.Thread(target=self._work, args=(index,), name=f"ingest-{name}")
+                    thread.daemon = True
+                    thread.start()
+                    self._threads.append((index, thread))
+
+    def has_capacity(self):
+        """Whether the first stage can accept a job without blocking"""
+        return not self.queues[0].full()
+
+    def submit(self, job):
+        """Add a job to the first stage, waiting while it is full"""
+        self.queues[0].put(job)
+
+    def stats(self):
+        """
+        Describe the pipeline's stages
+
+        Returns:
+            dict: Worker count and number of waiting jobs for each stage
+        """
+        return {
+            name: {'workers': workers, 'queued': self.queues[index].qsize()}
+            for index, (name, _, workers) in enumerate(self.stages)
+        }
+
+    def _work(self, index):
+        """Worker loop for one stage"""
+        name, func, _ = self.stages[index]
+        while True:
+            job = self.queues[index].get()
+            try:
+                with self.app.app_context():
+                    func(job)
+            except Exception as e:
+                try:
+                    with self.app.app_context():
+                        self.on_error(job, e)
+                except Exception:
+                    logger.exception(f"Error handler of ingestion stage {name} failed")
+                continue
+            finally:
+                self.queues[index].task_done()
+
+            # Blocks while the next stage is saturated, which in turn fills
+            # this stage's queue and slows down claiming
+            if index + 1 < len(self.stages):
+                self.queues[index + 1].put(job)
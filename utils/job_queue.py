@@ -0,0 +1,285 @@
+"""
+Job Queue Module
+
+This module claims entries from the database-backed processing queues
+(ProcessingQueue for documents, WebpageProcessingQueue for webpages) so that
+any number of workers, in any number of processes or hosts, can drain them
+without processing an entry twice:
+
+1. Claiming is a single UPDATE over a sub-select that locks the oldest
+   claimable row with FOR UPDATE SKIP LOCKED. Concurrent claimers skip rows
+   another transaction has locked instead of waiting for it, so each one gets
+   a different entry (or none) in one round trip.
+2. A claimed entry carries a lease: the worker's ID and an expiry time. While
+   the worker processes the entry, a LeaseHeartbeat thread extends the lease
+   on its own connection.
+3. If a worker dies, its lease runs out and the entry becomes claimable again.
+   An entry whose lease has expired QUEUE_MAX_ATTEMPTS times is marked failed
+   instead, so a document that kills its worker cannot loop forever.
+
+Lease times come from the database clock, so hosts with skewed clocks agree on
+when a lease has expired.
+"""
+
+import os
+import socket
+import logging
+import datetime
+import threading
+from collections import namedtuple
+
+import sqlalchemy as sa
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# How long a claim stays valid without a heartbeat
+LEASE_SECONDS = int(os.environ.get("QUEUE_LEASE_SECONDS", 300))
+
+# How often a worker extends the lease of the entry it is processing
+HEARTBEAT_SECONDS = int(os.environ.get("QUEUE_HEARTBEAT_SECONDS", max(1, LEASE_SECONDS // 5)))
+
+# Expired leases after which an entry is marked failed instead of reclaimed
+MAX_ATTEMPTS = int(os.environ.get("QUEUE_MAX_ATTEMPTS", 3))
+
+# Claimed queue entry: the row ID, the document or webpage ID and the lease owner
+QueueLease = namedtuple('QueueLease', ['entry_id', 'key', 'owner'])
+
+_hostname = socket.gethostname()
+
+
+def worker_id():
+    """
+    Identify the calling thread across hosts and processes
+
+    Returns:
+        str: host:pid:thread
+    """
+    return f"{_hostname}:{os.getpid()}:{threading.get_ident()}"
+
+
+def _db_now():
+    """Current UTC time on the database server"""
+    return sa.func.timezone('utc', sa.func.now(), type_=sa.DateTime)
+
+
+def _lease_expired(model):
+    """Condition for a processing entry whose worker has stopped renewing its lease"""
+    lease = datetime.timedelta(seconds=LEASE_SECONDS)
+    return sa.and_(
+        model.status == 'processing',
+        sa.or_(
+            model.lease_expires_at < _db_now(),
+            # Claimed before leases existed
+            sa.and_(model.lease_expires_at.is_(None), model.started_at < _db_now() - lease)
+        )
+    )
+
+
+def claim_queue_entry(model, key_column, key=None, owner=None):
+    """
+    Claim the oldest claimable queue entry
+
+    Args:
+        model: ProcessingQueue or WebpageProcessingQueue
+        key_column: The column identifying the queued item, e.g. ProcessingQueue.document_id
+        key (int, optional): Only claim the entry for this document/webpage
+        owner (str, optional): Lease owner; defaults to the calling thread's worker_id()
+
+    Returns:
+        QueueLease: The claimed entry, or None if nothing is claimable
+    """
+    owner = owner or worker_id()
+
+    candidate = (
+        sa.select(model.id)
+        .where(sa.or_(
+            model.status == 'pending',
+            sa.and_(_lease_expired(model), sa.func.coalesce(model.attempts, 0) < MAX_ATTEMPTS)
+        ))
+        .order_by(model.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    if key is not None:
+        candidate = candidate.where(key_column == key)
+
+    try:
+        row = db.session.execute(
+            sa.update(model)
+            .where(model.id == candidate.scalar_subquery())
+            .values(
+                status='processing',
+                started_at=_db_now(),
+                completed_at=None,
+                error_message=None,
+                lease_owner=owner,
+                lease_expires_at=_db_now() + datetime.timedelta(seconds=LEASE_SECONDS),
+                heartbeat_at=_db_now(),
+                attempts=sa.func.coalesce(model.attempts, 0) + 1
+            )
+            .returning(model.id, key_column)
+            .execution_options(synchronize_session=False)
+        ).first()
+        db.session.commit()
+    except Exception as e:
+        logger.exception(f"Error claiming from {model.__tablename__}: {str(e)}")
+        db.session.rollback()
+        return None
+
+    if row is None:
+        return None
+    return QueueLease(entry_id=row[0], key=row[1], owner=owner)
+
+
+def renew_lease(model, lease, engine=None):
+    """
+    Extend a lease if the caller still owns it
+
+    Runs on its own connection, so it never commits the worker's open transaction.
+
+    Args:
+        model: ProcessingQueue or WebpageProcessingQueue
+        lease (QueueLease): The lease to extend
+        engine: Engine to connect with; defaults to db.engine
+
+    Returns:
+        bool: False if the entry was completed, failed or claimed by another worker
+    """
+    engine = engine or db.engine
+    with engine.begin() as connection:
+        renewed = connection.execute(
+            sa.update(model)
+            .where(model.id == lease.entry_id)
+            .where(model.status == 'processing')
+            .where(model.lease_owner == lease.owner)
+            .values(
+                heartbeat_at=_db_now(),
+                lease_expires_at=_db_now() + datetime.timedelta(seconds=LEASE_SECONDS)
+            )
+        ).rowcount
+    return bool(renewed)
+
+
+def release_lease(entry):
+    """
+    Clear the lease of a finished queue entry; the caller commits
+
+    The attempt counter only tracks claims that ended with the worker
+    disappearing, so it is reset as well.
+
+    Args:
+        entry: ProcessingQueue or WebpageProcessingQueue row
+    """
+    entry.lease_owner = None
+    entry.lease_expires_at = None
+    entry.attempts = 0
+
+
+def fail_abandoned_entries(model):
+    """
+    Mark entries failed once their lease has expired MAX_ATTEMPTS times
+
+    Args:
+        model: ProcessingQueue or WebpageProcessingQueue
+
+    Returns:
+        int: Number of entries marked failed
+    """
+    try:
+        failed = db.session.execute(
+            sa.update(model)
+            .where(_lease_expired(model))
+            .where(sa.func.coalesce(model.attempts, 0) >= MAX_ATTEMPTS)
+            .values(
+                status='failed',
+                completed_at=_db_now(),
+                error_message=f"Worker stopped responding {MAX_ATTEMPTS} times while processing this entry",
+                lease_owner=None,
+                lease_expires_at=None
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+    except Exception as e:
+        logger.exception(f"Error failing abandoned entries in {model.__tablename__}: {str(e)}")
+        db.session.rollback()
+        return 0
+
+    if failed:
+        logger.warning(f"Marked {failed} abandoned {model.__tablename__} entries as failed")
+    return failed
+
+
+def count_active_leases(model):
+    """
+    Count entries being processed under an unexpired lease
+
+    Args:
+        model: ProcessingQueue or WebpageProcessingQueue
+
+    Returns:
+        int: Number of entries
+    """
+    return db.session.execute(
+        sa.select(sa.func.count(model.id))
+        .where(model.status == 'processing')
+        .where(model.lease_expires_at >= _db_now())
+    ).scalar() or 0
+
+
+class LeaseHeartbeat:
+    """
+    Context manager that keeps a lease alive while its entry is processed
+
+    Usage:
+        with LeaseHeartbeat(ProcessingQueue, lease) as heartbeat:
+            ... process the entry ...
+            if heartbeat.lost:
+                raise RuntimeError("Lease lost")
+    """
+
+    def __init__(self, model, lease, interval=None):
+        self.model = model
+        self.lease = lease
+        self.interval = interval or HEARTBEAT_SECONDS
+        self.lost = False
+        # Resolved here because the heartbeat thread has no app context
+        self._engine = db.engine
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                if not renew_lease(self.model, self.lease, engine=self._engine):
+                    if self._stopped.is_set():
+                        # The entry was completed while renewing
+                        return
+                    logger.warning(f"Lost the lease on {self.model.__tablename__} entry {self.lease.entry_id}")
+                    self.lost = True
+                    return
+            except Exception as e:
+                # Keep trying; the lease only lapses after LEASE_SECONDS without a renewal
+                logger.warning(f"Heartbeat for {self.model.__tablename__} entry {self.lease.entry_id} failed: {str(e)}")
+
+    def start(self):
+        """Start renewing the lease in a background thread"""
+        self._thread = threading.Thread(target=self._run, name=f"lease-heartbeat-{self.lease.entry_id}")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop renewing the lease"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
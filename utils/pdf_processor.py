@@ -1,12 +1,27 @@
+import io
 import os
 import re
+import bisect
 import logging
+from collections import namedtuple
 from werkzeug.utils import secure_filename
 import PyPDF2
 from flask import current_app
 
 logger = logging.getLogger(__name__)
 
+# PDFs with at least this many pages are extracted by several worker processes at once
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get("PDF_PARALLEL_MIN_PAGES", 40))
+
+# Pages extracted by a worker process at a time
+PDF_PAGES_PER_TASK = max(1, int(os.environ.get("PDF_PAGES_PER_TASK", 16)))
+
+_WHITESPACE = re.compile(r'\s+')
+_SENTENCE_BOUNDARY = re.compile(r'[.!?]\s+[A-Z]')
+
+# A chunk of a document and the number of the page it starts on
+PageChunk = namedtuple('PageChunk', ['text', 'page_num'])
+
 def clean_text(text):
     """
     Clean extracted text by removing XML/HTML-like tags and other formatting artifacts
@@ -28,6 +43,69 @@ def clean_text(text):
     
     return text
 
+def iter_pdf_pages(pdf_path, start=0, stop=None):
+    """
+    Extract the text of a PDF's pages one at a time
+    
+    Args:
+        pdf_path (str): Path to the PDF file
+        start (int): Index of the first page
+        stop (int, optional): Index after the last page; defaults to the end of the PDF
+        
+    Yields:
+        str: Cleaned text of each page
+    """
+    with open(pdf_path, 'rb') as pdf_file:
+        pdf_reader = PyPDF2.PdfReader(pdf_file)
+        
+        if stop is None:
+            stop = len(pdf_reader.pages)
+        
+        for page_num in range(start, stop):
+            # Clean the text to remove formatting artifacts
+            yield clean_text(pdf_reader.pages[page_num].extract_text() or "")
+
+def extract_page_range(pdf_path, start, stop):
+    """
+    Extract the text of a range of pages; runs in the ingestion process pool
+    
+    Args:
+        pdf_path (str): Path to the PDF file
+        start (int): Index of the first page
+        stop (int): Index after the last page
+        
+    Returns:
+        list: Cleaned text of each page
+    """
+    return list(iter_pdf_pages(pdf_path, start, stop))
+
+def count_pdf_pages(pdf_path):
+    """
+    Count the pages of a PDF file without extracting their text
+    
+    Args:
+        pdf_path (str): Path to the PDF file
+        
+    Returns:
+        int: Number of pages
+    """
+    with open(pdf_path, 'rb') as pdf_file:
+        return len(PyPDF2.PdfReader(pdf_file).pages)
+
+def join_pages(pages):
+    """
+    Join page texts into a document's full text
+    
+    Args:
+        pages (iterable): Text of each page
+        
+    Returns:
+        str: The pages, each followed by a blank line
+    """
+    # Joining once is linear; appending to a string page by page copies the
+    # text extracted so far for every page
+    return "".join(page + "\n\n" for page in pages)
+
 def extract_text_from_pdf(pdf_path):
     """
     Extract text content from a PDF file
@@ -39,63 +117,208 @@ def extract_text_from_pdf(pdf_path):
         str: Extracted text from the PDF, or None if extraction failed
     """
     try:
-        text = ""
-        with open(pdf_path, 'rb') as pdf_file:
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            
-            # Extract text from each page
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                text += page.extract_text() + "\n\n"
+        return join_pages(iter_pdf_pages(pdf_path))
+    except Exception as e:
+        logger.exception(f"Error extracting text from PDF: {pdf_path}")
+        return None
+
+def iter_pdf_pages_parallel(pdf_path):
+    """
+    Extract the text of a PDF's pages in the ingestion process pool
+    
+    PDFs with at least PDF_PARALLEL_MIN_PAGES pages are split into ranges of
+    PDF_PAGES_PER_TASK pages that are extracted by several worker processes at
+    once; smaller PDFs are extracted by a single worker. Pages are yielded in
+    order as soon as their range is done, so a consumer such as chunk_pages()
+    can start on the first pages while the rest are still being extracted.
+    
+    Must not be called from inside the process pool.
+    
+    Args:
+        pdf_path (str): Path to the PDF file
         
-        # Clean the text to remove formatting artifacts
-        text = clean_text(text)
+    Yields:
+        str: Cleaned text of each page
+    """
+    from utils.ingestion_pool import iter_cpu_bound
+    
+    page_count = count_pdf_pages(pdf_path)
+    if page_count < PDF_PARALLEL_MIN_PAGES:
+        page_ranges = [(0, page_count)]
+    else:
+        page_ranges = [
+            (start, min(start + PDF_PAGES_PER_TASK, page_count))
+            for start in range(0, page_count, PDF_PAGES_PER_TASK)
+        ]
+    
+    for pages in iter_cpu_bound(extract_page_range, [(pdf_path, start, stop) for start, stop in page_ranges]):
+        yield from pages
+
+def extract_pages_from_pdf(pdf_path):
+    """
+    Extract the text of each page of a PDF file, using the ingestion process pool
+    
+    Args:
+        pdf_path (str): Path to the PDF file
         
-        return text
+    Returns:
+        list: Cleaned text of each page, or None if extraction failed
+    """
+    try:
+        return list(iter_pdf_pages_parallel(pdf_path))
     except Exception as e:
         logger.exception(f"Error extracting text from PDF: {pdf_path}")
         return None
 
-def chunk_text(text, chunk_size=1000, overlap=200):
+def extract_chunks_from_pdf(pdf_path, chunk_size=1000, overlap=200, parallel=True):
     """
-    Split text into overlapping chunks for processing
+    Extract a PDF's text and chunk its pages as they are extracted
+    
+    Each page is passed to chunk_pages() as soon as it is extracted, so
+    chunking overlaps extraction instead of waiting for the whole document.
+    The full text is written out page by page in the same pass; callers
+    hold on to the text and chunks, not to a list of pages.
     
     Args:
-        text (str): The text to split into chunks
+        pdf_path (str): Path to the PDF file
         chunk_size (int): Target size of each chunk in characters
         overlap (int): Number of characters to overlap between chunks
+        parallel (bool): Extract in the ingestion process pool (iter_pdf_pages_parallel);
+            must be False inside the pool
         
     Returns:
-        list: List of text chunks
+        tuple: (full text as join_pages() builds it, list of PageChunk), or
+            (None, None) if extraction failed
     """
-    if not text:
-        return []
+    # Same layout as join_pages(), without copying each page to append its separator
+    full_text = io.StringIO()
+    
+    def extracted_pages():
+        for page in (iter_pdf_pages_parallel(pdf_path) if parallel else iter_pdf_pages(pdf_path)):
+            full_text.write(page)
+            full_text.write("\n\n")
+            yield page
+    
+    try:
+        chunks = list(chunk_pages(extracted_pages(), chunk_size=chunk_size, overlap=overlap))
+        return full_text.getvalue(), chunks
+    except Exception as e:
+        logger.exception(f"Error extracting text from PDF: {pdf_path}")
+        return None, None
+
+def chunk_pages(pages, chunk_size=1000, overlap=200, first_page=1):
+    """
+    Split a document into overlapping chunks as its pages arrive
     
-    # Clean the text by removing excessive whitespace
-    text = re.sub(r'\s+', ' ', text).strip()
+    Produces the same chunks as chunk_text() on the joined pages, along with
+    the page each chunk starts on. Only the text around the current chunk is
+    kept in memory, so pages can be streamed in from extraction (e.g.
+    iter_pdf_pages()), and sentence boundaries are found by scanning each
+    character once as it is buffered instead of searching a window per chunk.
     
-    chunks = []
+    Args:
+        pages (iterable): Text of each page
+        chunk_size (int): Target size of each chunk in characters
+        overlap (int): Number of characters to overlap between chunks
+        first_page (int): Page number of the first page
+        
+    Yields:
+        PageChunk: Text chunks with the number of the page they start on
+    """
+    pages = iter(pages)
+    # Whitespace-normalized text that later chunks may still need. Positions
+    # below are offsets into the normalized document; the buffer holds it
+    # from buffer_offset on
+    buffer = ''
+    buffer_offset = 0
+    # Offsets where pages start, and their page numbers
+    page_offsets = []
+    page_numbers = []
+    # Start and end offsets of the sentence boundaries found so far
+    boundary_starts = []
+    boundary_ends = []
+    scanned = 0
+    page_num = first_page
+    exhausted = False
     start = 0
     
-    while start < len(text):
+    while True:
+        # Read pages until the chunk and the sentence boundary search after it are buffered
+        while not exhausted and buffer_offset + len(buffer) < start + chunk_size + 100:
+            page = next(pages, None)
+            if page is None:
+                exhausted = True
+                buffer = buffer.rstrip()
+                break
+            
+            # Clean the text by removing excessive whitespace; pages are
+            # separated by whitespace, which collapses into the page's trailing space
+            piece = _WHITESPACE.sub(' ', page + ' ')
+            if not buffer or buffer.endswith(' '):
+                piece = piece.lstrip()
+            page_offsets.append(buffer_offset + len(buffer))
+            page_numbers.append(page_num)
+            page_num += 1
+            buffer += piece
+            
+            # Find sentence boundaries (.!?) followed by a space and capital letter
+            # in the new text, including any that started at the end of the previous page
+            for match in _SENTENCE_BOUNDARY.finditer(buffer, scanned - buffer_offset):
+                boundary_starts.append(buffer_offset + match.start())
+                boundary_ends.append(buffer_offset + match.end())
+            # A boundary can begin in the last two characters and end in the next page
+            scanned = max(boundary_ends[-1] if boundary_ends else 0, buffer_offset + len(buffer) - 2, scanned)
+        
+        text_end = buffer_offset + len(buffer)
+        if start >= text_end:
+            return
+        
         # Calculate end position with potential overlap
-        end = min(start + chunk_size, len(text))
+        end = min(start + chunk_size, text_end)
         
         # If we're not at the end of the text, try to find a sentence boundary
-        if end < len(text):
-            # Look for sentence boundaries (.!?) followed by a space and capital letter
-            sentence_match = re.search(r'[.!?]\s+[A-Z]', text[end-100:end+100])
-            if sentence_match:
+        if end < text_end:
+            # The first boundary within 100 characters either side of the end
+            index = bisect.bisect_left(boundary_starts, end - 100)
+            if index < len(boundary_starts) and boundary_ends[index] <= end + 100:
                 # Adjust the end to the sentence boundary
-                end = end - 100 + sentence_match.start() + 1  # Include the punctuation
+                end = boundary_starts[index] + 1  # Include the punctuation
         
-        # Add the chunk to our list
-        chunks.append(text[start:end])
+        yield PageChunk(
+            buffer[start - buffer_offset:end - buffer_offset],
+            page_numbers[bisect.bisect_right(page_offsets, start) - 1]
+        )
         
         # Move start position for next chunk, considering overlap
-        start = end - overlap if end < len(text) else end
+        start = end - overlap if end < text_end else end
+        
+        # Drop text that no later chunk or boundary search can reach
+        consumed = start - 100 - buffer_offset
+        if consumed > chunk_size:
+            buffer = buffer[consumed:]
+            buffer_offset += consumed
+            # Keep the page the next chunk starts on
+            del page_offsets[:bisect.bisect_right(page_offsets, start) - 1]
+            del page_numbers[:len(page_numbers) - len(page_offsets)]
+            del boundary_ends[:bisect.bisect_left(boundary_starts, buffer_offset)]
+            del boundary_starts[:len(boundary_starts) - len(boundary_ends)]
+
+def chunk_text(text, chunk_size=1000, overlap=200):
+    """
+    Split text into overlapping chunks for processing
+    
+    Args:
+        text (str): The text to split into chunks
+        chunk_size (int): Target size of each chunk in characters
+        overlap (int): Number of characters to overlap between chunks
+        
+    Returns:
+        list: List of text chunks
+    """
+    if not text:
+        return []
     
-    return chunks
+    return [chunk.text for chunk in chunk_pages([text], chunk_size=chunk_size, overlap=overlap)]
 
 def save_uploaded_pdf(uploaded_file, filename=None):
     """
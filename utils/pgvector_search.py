@@ -0,0 +1,227 @@
+"""
+pgvector Search Module
+
+This module pushes nearest-neighbour search into PostgreSQL when the pgvector
+extension is installed and vector_embedding has an embedding_vec column (see
+enable_pgvector.py). The web process then never holds every vector in memory.
+
+When the extension or column is missing, the column's dimensions do not match
+the active embedding version, or a query fails, the helpers return None and
+callers fall back to the in-process NumPy index. Both backends return
+the same (chunk_id, similarity_score) tuples.
+"""
+
+import os
+import time
+import logging
+import threading
+
+import numpy as np
+import sqlalchemy as sa
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# Which backend search_similar_chunks uses:
+#   auto     - pgvector when available, otherwise the in-process index
+#   pgvector - same as auto, but log a warning when falling back
+#   hnsw     - approximate in-process HNSW graph (see utils/hnsw_index.py)
+#   numpy    - always use the exact in-process index
+SEARCH_BACKEND = os.environ.get("EMBEDDING_SEARCH_BACKEND", "auto").lower()
+
+# Optional per-query tuning for the database index (unset = server default)
+PGVECTOR_EF_SEARCH = os.environ.get("PGVECTOR_EF_SEARCH")  # HNSW candidate list size
+PGVECTOR_PROBES = os.environ.get("PGVECTOR_PROBES")  # IVFFlat lists to probe
+
+# Seconds before re-checking whether the extension and column exist
+AVAILABILITY_TTL = 300
+
+# Number of rows updated per statement when syncing embedding_vec
+SYNC_BATCH_SIZE = 500
+
+_availability = {'checked_at': 0.0, 'available': False, 'dimensions': None}
+_availability_lock = threading.Lock()
+
+
+def pgvector_enabled():
+    """
+    Check whether searches should be sent to pgvector
+
+    The result is cached for AVAILABILITY_TTL seconds so the check costs
+    nothing on most queries.
+
+    Returns:
+        bool: True if the extension and the embedding_vec column are present
+    """
+    if SEARCH_BACKEND not in ("auto", "pgvector"):
+        return False
+
+    with _availability_lock:
+        if time.time() - _availability['checked_at'] < AVAILABILITY_TTL:
+            return _availability['available']
+
+        available = False
+        dimensions = None
+        try:
+            # Use a separate connection so a failure cannot abort the caller's transaction
+            with db.engine.connect() as connection:
+                available = bool(connection.execute(sa.text("""
+                    SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'vector')
+                    AND EXISTS (
+                        SELECT 1
+                        FROM information_schema.columns
+                        WHERE table_name = 'vector_embedding'
+                        AND column_name = 'embedding_vec'
+                    )
+                """)).scalar())
+                if available:
+                    # For the vector type the type modifier is the declared dimensionality
+                    dimensions = connection.execute(sa.text("""
+                        SELECT atttypmod
+                        FROM pg_attribute
+                        WHERE attrelid = 'vector_embedding'::regclass
+                        AND attname = 'embedding_vec'
+                    """)).scalar()
+        except Exception as e:
+            logger.warning(f"Could not check for pgvector support: {str(e)}")
+
+        if not available and SEARCH_BACKEND == "pgvector":
+            logger.warning("EMBEDDING_SEARCH_BACKEND is pgvector but the extension or column is missing; "
+                           "using the in-process index")
+
+        _availability['checked_at'] = time.time()
+        _availability['available'] = available
+        _availability['dimensions'] = dimensions if dimensions and dimensions > 0 else None
+        return available
+
+
+def pgvector_dimensions():
+    """
+    Get the declared dimensionality of the embedding_vec column
+
+    Returns:
+        int: Number of dimensions, or None if unknown or pgvector is not enabled
+    """
+    if not pgvector_enabled():
+        return None
+    return _availability['dimensions']
+
+
+def _mark_unavailable():
+    """Stop using pgvector until the next availability check"""
+    with _availability_lock:
+        _availability['checked_at'] = time.time()
+        _availability['available'] = False
+
+
+def to_vector_literal(embedding):
+    """
+    Format an embedding as a pgvector text literal
+
+    Args:
+        embedding (list or np.ndarray): Embedding vector
+
+    Returns:
+        str: Literal such as "[0.1,0.2,0.3]"
+    """
+    return "[" + ",".join(repr(float(value)) for value in np.asarray(embedding, dtype=np.float32)) + "]"
+
+
+def search_with_pgvector(query_vector, top_k=5, similarity_threshold=0.5, ef_search=None, model_version=None):
+    """
+    Find the chunks most similar to a query vector using the database index
+
+    Args:
+        query_vector (np.ndarray): The query embedding
+        top_k (int): Number of top results to return
+        similarity_threshold (float): Minimum similarity score to include result
+        ef_search (int): HNSW candidate list size for this query (overrides PGVECTOR_EF_SEARCH)
+        model_version (int): Embedding version to search (None = every row)
+
+    Returns:
+        list: List of (chunk_id, similarity_score) tuples, highest score first,
+              or None if the caller should fall back to the in-process index
+    """
+    if not pgvector_enabled():
+        return None
+
+    # Cosine distance is undefined for a zero query vector
+    if not np.any(query_vector):
+        return None
+
+    # The column was created for another embedding version's dimensionality
+    dimensions = pgvector_dimensions()
+    if dimensions and dimensions != len(query_vector):
+        logger.debug(f"embedding_vec has {dimensions} dimensions, query has {len(query_vector)}; "
+                     "using the in-process index")
+        return None
+
+    try:
+        ef_search = ef_search or PGVECTOR_EF_SEARCH
+        if ef_search:
+            db.session.execute(sa.text(f"SET LOCAL hnsw.ef_search = {int(ef_search)}"))
+        if PGVECTOR_PROBES:
+            db.session.execute(sa.text(f"SET LOCAL ivfflat.probes = {int(PGVECTOR_PROBES)}"))
+
+        version_filter = "AND model_version = :model_version" if model_version is not None else ""
+        rows = db.session.execute(sa.text(f"""
+            SELECT chunk_id, 1 - (embedding_vec <=> CAST(:query AS vector)) AS similarity
+            FROM vector_embedding
+            WHERE embedding_vec IS NOT NULL
+            {version_filter}
+            ORDER BY embedding_vec <=> CAST(:query AS vector)
+            LIMIT :top_k
+        """), {'query': to_vector_literal(query_vector), 'top_k': top_k, 'model_version': model_version}).all()
+
+        return [(int(chunk_id), float(similarity)) for chunk_id, similarity in rows
+                if similarity is not None and similarity >= similarity_threshold]
+
+    except Exception as e:
+        logger.exception(f"pgvector search failed, falling back to the in-process index: {str(e)}")
+        db.session.rollback()
+        _mark_unavailable()
+        return None
+
+
+def sync_pgvector_embeddings(chunk_ids, model_version=None):
+    """
+    Copy newly written embeddings into the embedding_vec column
+
+    Runs inside the caller's transaction, after the VectorEmbedding rows have
+    been flushed. Does nothing when pgvector is not enabled. Vectors whose
+    size does not match the column are left out.
+
+    Args:
+        chunk_ids (list): Chunks whose embeddings were created or replaced
+        model_version (int): Only copy rows of this embedding version (None = every row)
+    """
+    if not chunk_ids or not pgvector_enabled():
+        return
+    dimensions = pgvector_dimensions()
+
+    from models import VectorEmbedding
+    from utils.embeddings import stored_embedding_vector, select_stored_embeddings
+
+    db.session.flush()
+    for start in range(0, len(chunk_ids), SYNC_BATCH_SIZE):
+        batch = chunk_ids[start:start + SYNC_BATCH_SIZE]
+        query = (
+            select_stored_embeddings(VectorEmbedding.id)
+            .where(VectorEmbedding.chunk_id.in_(batch))
+        )
+        if model_version is not None:
+            query = query.where(VectorEmbedding.model_version == model_version)
+        rows = db.session.execute(query).all()
+
+        params = []
+        for embedding_id, embedding_blob, embedding in rows:
+            vector = stored_embedding_vector(embedding_blob, embedding)
+            if vector is not None and (not dimensions or len(vector) == dimensions):
+                params.append({'id': embedding_id, 'vec': to_vector_literal(vector)})
+
+        if params:
+            db.session.execute(
+                sa.text("UPDATE vector_embedding SET embedding_vec = CAST(:vec AS vector) WHERE id = :id"),
+                params
+            )
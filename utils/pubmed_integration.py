@@ -21,6 +21,7 @@ from typing import Dict, List, Optional, Union, Any
 
 # Import the clean_text function
 from utils.pdf_processor import clean_text
+from utils import http_client
 
 # Base URL for NCBI E-utilities
 EUTILS_BASE_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
@@ -68,9 +69,9 @@ def _make_request(url: str, params: Dict[str, Any], max_retries: int = 2) -> Opt
                 print(f"Retry attempt {attempt} for URL {url}, waiting {delay} seconds")
                 time.sleep(delay)
                 
-            # Add timeouts to prevent hanging requests
-            # Connect timeout of 5 seconds, read timeout of 15 seconds for better reliability
-            response = requests.get(url, params=params, timeout=(5, 15))
+            # Pooled, kept-alive connection to NCBI; utils/http_client.py sets the
+            # timeouts (connect 5 seconds, read 15 seconds) to prevent hanging requests
+            response = http_client.get(url, params=params)
             response.raise_for_status()
             
             # Honor rate limits - sleep for 0.33 seconds (3 requests per second)
@@ -479,7 +480,7 @@ def generate_tags_from_pubmed(pmid: str) -> List[str]:
         List[str]: Generated tags that match our predefined tag list
     """
     # Import our tag matching function from document_processor
-    from utils.document_processor import match_to_predefined_tags
+    from utils.tagging import match_to_predefined_tags
     
     # Get paper details first
     paper_details = get_paper_details_by_pmid(pmid)
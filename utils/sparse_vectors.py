@@ -0,0 +1,213 @@
+"""
+Sparse Vectors Module
+
+SimpleEmbedder vectors are hashed bag-of-words counts, so most positions are
+zero, especially for short chunks or a large vector_size. This module provides
+a minimal compressed sparse row (CSR) matrix built on NumPy alone, so that
+storage and search cost grow with the number of non-zeros instead of the
+vector size.
+
+CSRMatrix implements just the operations the vector index needs: row
+selection, stacking, row normalization and a matrix-vector product.
+"""
+
+import numpy as np
+
+INDEX_DTYPE = np.int32
+VALUE_DTYPE = np.float32
+
+
+def to_sparse(vector):
+    """
+    Split a dense vector into its non-zero positions and values
+
+    Args:
+        vector (np.ndarray or list): Dense vector
+
+    Returns:
+        tuple: (indices int32 array, values float32 array)
+    """
+    vector = np.asarray(vector, dtype=VALUE_DTYPE)
+    indices = np.flatnonzero(vector).astype(INDEX_DTYPE)
+    return indices, vector[indices]
+
+
+def to_dense(indices, values, size):
+    """
+    Expand (indices, values) back into a dense float32 vector
+
+    Args:
+        indices (np.ndarray): Non-zero positions
+        values (np.ndarray): Values at those positions
+        size (int): Length of the dense vector
+
+    Returns:
+        np.ndarray: Dense vector
+    """
+    vector = np.zeros(size, dtype=VALUE_DTYPE)
+    vector[indices] = values
+    return vector
+
+
+class CSRMatrix:
+    """
+    Compressed sparse row matrix
+
+    Row i has its non-zero columns in indices[indptr[i]:indptr[i+1]] and the
+    matching values in data[indptr[i]:indptr[i+1]]. The arrays may be
+    read-only memory maps.
+    """
+
+    def __init__(self, indptr, indices, data, n_cols):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.n_cols = int(n_cols)
+
+    @classmethod
+    def empty(cls, n_cols):
+        """Create a matrix with no rows"""
+        return cls(np.zeros(1, dtype=np.int64), np.zeros(0, dtype=INDEX_DTYPE),
+                   np.zeros(0, dtype=VALUE_DTYPE), n_cols)
+
+    @classmethod
+    def from_rows(cls, rows, n_cols):
+        """
+        Build a matrix from (indices, values) pairs
+
+        Args:
+            rows (list): One (indices, values) pair per row
+            n_cols (int): Number of columns
+
+        Returns:
+            CSRMatrix: The matrix
+        """
+        if not rows:
+            return cls.empty(n_cols)
+        lengths = np.fromiter((len(indices) for indices, _ in rows), dtype=np.int64, count=len(rows))
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        indices = np.concatenate([np.asarray(indices, dtype=INDEX_DTYPE) for indices, _ in rows])
+        data = np.concatenate([np.asarray(values, dtype=VALUE_DTYPE) for _, values in rows])
+        return cls(indptr, indices, data, n_cols)
+
+    @classmethod
+    def from_dense(cls, matrix):
+        """
+        Convert a dense 2-D matrix
+
+        Args:
+            matrix (np.ndarray): Dense matrix
+
+        Returns:
+            CSRMatrix: The matrix
+        """
+        matrix = np.asarray(matrix, dtype=VALUE_DTYPE)
+        rows, cols = np.nonzero(matrix)
+        indptr = np.zeros(matrix.shape[0] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=matrix.shape[0]), out=indptr[1:])
+        return cls(indptr, cols.astype(INDEX_DTYPE), matrix[rows, cols], matrix.shape[1])
+
+    @staticmethod
+    def vstack(blocks):
+        """
+        Stack matrices vertically
+
+        Args:
+            blocks (list): CSRMatrix objects with the same number of columns
+
+        Returns:
+            CSRMatrix: The stacked matrix
+        """
+        indptrs = [np.zeros(1, dtype=np.int64)]
+        offset = 0
+        for block in blocks:
+            indptrs.append(np.asarray(block.indptr[1:], dtype=np.int64) + offset)
+            offset += block.nnz
+        return CSRMatrix(np.concatenate(indptrs),
+                         np.concatenate([block.indices for block in blocks]),
+                         np.concatenate([block.data for block in blocks]),
+                         blocks[0].n_cols)
+
+    @property
+    def shape(self):
+        return (len(self.indptr) - 1, self.n_cols)
+
+    @property
+    def nnz(self):
+        return int(self.indptr[-1])
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def __getitem__(self, rows):
+        """
+        Select rows by boolean mask or integer index array
+
+        Returns:
+            CSRMatrix: A new matrix holding copies of the selected rows
+        """
+        rows = np.asarray(rows)
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+
+        starts = np.asarray(self.indptr[rows], dtype=np.int64)
+        lengths = np.asarray(self.indptr[rows + 1], dtype=np.int64) - starts
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+
+        # Source position of every output non-zero, without a Python loop
+        source = np.repeat(starts - indptr[:-1], lengths) + np.arange(indptr[-1], dtype=np.int64)
+        return CSRMatrix(indptr, self.indices[source], self.data[source], self.n_cols)
+
+    def __matmul__(self, vector):
+        """
+        Multiply by a dense vector
+
+        Args:
+            vector (np.ndarray): Dense vector of length n_cols
+
+        Returns:
+            np.ndarray: float32 vector with one entry per row
+        """
+        n_rows = len(self)
+        scores = np.zeros(n_rows, dtype=VALUE_DTYPE)
+        if not self.nnz:
+            return scores
+
+        products = self.data * np.asarray(vector, dtype=VALUE_DTYPE)[self.indices]
+        starts = np.asarray(self.indptr[:-1])
+        nonempty = starts < np.asarray(self.indptr[1:])
+        scores[nonempty] = np.add.reduceat(products, starts[nonempty])
+        return scores
+
+    def row_norms(self):
+        """Euclidean norm of each row"""
+        squares = self.data.astype(np.float64) ** 2
+        norms = np.zeros(len(self), dtype=np.float64)
+        starts = np.asarray(self.indptr[:-1])
+        nonempty = starts < np.asarray(self.indptr[1:])
+        if self.nnz:
+            norms[nonempty] = np.add.reduceat(squares, starts[nonempty])
+        return np.sqrt(norms).astype(VALUE_DTYPE)
+
+    def normalize_rows(self):
+        """
+        Scale each row to unit length in place, leaving empty rows untouched
+
+        Returns:
+            CSRMatrix: self
+        """
+        norms = self.row_norms()
+        lengths = np.diff(self.indptr)
+        row_norms = np.repeat(norms, lengths)
+        nonzero = row_norms > 0
+        self.data[nonzero] /= row_norms[nonzero]
+        return self
+
+    def toarray(self):
+        """Convert to a dense matrix"""
+        matrix = np.zeros(self.shape, dtype=VALUE_DTYPE)
+        rows = np.repeat(np.arange(len(self)), np.diff(self.indptr))
+        matrix[rows, self.indices] = self.data
+        return matrix
@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 
 from app import db
 from models import SystemMetrics, TextChunk, VectorEmbedding, ProcessingQueue
+from utils.embedding_versions import get_active_embedding_version
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +21,7 @@ def get_system_metrics():
         memory_usage = psutil.virtual_memory().percent
         
         # Get chunk processing stats
-        chunks_processed = VectorEmbedding.query.count()
+        chunks_processed = VectorEmbedding.query.filter_by(model_version=get_active_embedding_version().id).count()
         chunks_pending = TextChunk.query.count() - chunks_processed
         
         return {
@@ -0,0 +1,570 @@
+"""
+Tagging Module
+
+Matches document text and keyword candidates against the predefined disease
+and document type tags. These functions are pure text processing with no
+database or Flask dependencies, so the ingestion pool can run them in worker
+processes (see utils/ingestion_pool.py).
+"""
+
+import re
+import bisect
+
+# Predefined tags and the keywords that indicate them. Keywords of three
+# characters or fewer only match as whole words
+# Common rheumatology disease categories
+DISEASES = {
+    "Rheumatoid Arthritis": ["rheumatoid arthritis", "ra ", "ra,", "ra.", "ra)", "ra-", "rheumatoid", "arthritis, rheumatoid"],
+    "Polymyalgia Rheumatica": ["polymyalgia rheumatica", "pmr ", "pmr,", "pmr.", "pmr)"],
+    "Systemic Lupus Erythematosus": ["systemic lupus", "sle ", "sle,", "sle.", "sle)", "lupus nephritis", "lupus erythematosus"],
+    "Cutaneous lupus": ["discoid lupus", "lupus profundus", "lupus panniculitis", "tumid lupus", "urticarial lupus"],
+    "Systemic Sclerosis": ["systemic sclerosis", "scleroderma", "ssc", "crest syndrome"],
+    "Myositis": ["iim", "idiopathic inflammatory myopathy", "dermatomyositis", "polymyositis"],
+    "Sjögren's": ["sjögren", "sjogren", "sicca syndrome", "sjögren's syndrome", "sjogren's disease", "sjögren's disease"],
+    "Spondyloarthropathy": ["axial spondyloarthritis", "psoriatic arthritis", "reactive arthritis", "enteropathic arthritis"],
+    "Axial Spondyloarthritis": ["ankylosing spondylitis", "non-radiographic axial spondyloarthritis", "axspa", "nr-axspa"],
+    "Psoriatic Arthritis": ["psoriatic arthritis", "psa ", "psa,", "psa.", "psa)"],
+    "Reactive Arthritis": ["rea", "post-infectious arthritis", "gonococcal arthritis", "reiter's syndrome", "reiter"],
+    "Enteropathic Arthritis": ["ibd-arthritis", "ibd", "inflammatory bowel disease", "crohn's", "ulcerative colitis"],
+    "Vasculitis": ["vasculitis", "anca", "giant cell arteritis", "takayasu", "polyarteritis"],
+    "GCA": ["giant cell arteritis", "temporal arteritis"],
+    "Takayasu": ["tak", "takayasu"],
+    "Polyarteritis Nodosa": ["pan", "arteritis"],
+    "GPA": ["granulomatosis with polyangiitis", "wegener's", "anca", "aav"],
+    "MPA": ["microscopic polyangiitis", "anca", "aav"],
+    "EGPA": ["eosinophilic granulomatosis and polyangiitis", "churg-strauss"],
+    "Immune-Complex Vasculitis": ["immune-complex mediated vasculitis"],
+    "IgA Vasculitis": ["iga vasculitis"],
+    "Urticarial Vasculitis": ["urticarial vasculitis"],
+    "Anti-GBM": ["anti-glomerular basement membrane disease", "anti-gbm disease", "goodpasture disease"],
+    "Osteoarthritis": ["osteoarthritis", "oa ", "oa,", "oa.", "oa)", "degenerative joint disease"],
+    "Cryo": ["cryoglobulinemic vasculitis", "mixed cryoglobulinemia syndrome", "cryoglobulinemia"],
+    "Behcet's": ["behçet's"],
+    "Gout": ["gout", "gouty arthritis"],
+    "CPPD": ["calcium pyrophosphate deposition disease", "pseudogout", "crowned dens"],
+    "PCNSV": ["primary cns vasculitis", "primary angiitis of the cns", "pacns"],
+    "Still's Disease": ["adult-onset still's disease", "stills disease", "systemic jia", "aosd"],
+    "Sarcoidosis": ["sarcoid"],
+    "IgG4-RD": ["igg4-related disease", "mikulicz", "riedel's thyroiditis"],
+    "Relapsing Polychondritis": ["rpc", "polychondritis", "vexas"],
+    "Fibromyalgia": ["fibromyalgia", "fibromyalgia syndrome", "fms ", "fms,", "fms.", "fms)"],
+    "ILD": ["interstitial lung disease", "ild ", "ild,", "ild.", "ild)", "pulmonary fibrosis", "ipf", "nsip", "uip", "fibrotic lung disease"]
+}
+
+# Document types
+DOCUMENT_TYPES = {
+    "Guideline": ["guideline", "guidelines", "recommendation", "consensus", "eular", "acr criteria", "practice guidelines"],
+    "Clinical Trial": ["clinical trial", "phase iii", "phase 3", "randomized", "randomised", "rct ", "rct,", "rct.", "randomized controlled trial"],
+    "Meta-Analysis": ["meta-analysis", "meta analysis", "systematic review"],
+    "Cohort Study": ["cohort study", "longitudinal study", "observational study", "prospective studies", "retrospective studies"],
+    "Case Report": ["case report", "case series"],
+    "Review": ["review", "literature review", "primer"],
+    "Cross-Sectional Study": ["cross-sectional study"],
+    "Case-Control Study": ["case-control study"],
+    "Registries": ["registries"],
+    "Real-World Evidence": ["real-world evidence"],
+    "Epidemiology": ["epidemiology"],
+    "Incidence": ["incidence"],
+    "Prevalence": ["prevalence"],
+    "Disease Burden": ["disease burden"],
+    "Risk Factors": ["risk factors"],
+    "Comorbidity": ["comorbidity"],
+    "Population Surveillance": ["population surveillance"],
+    "Health Services Research": ["health services research"],
+    "Outcomes Research": ["outcomes research"]
+}
+
+# Paragraph separators used for co-occurrence scoring
+PARAGRAPH_SEPARATOR = re.compile(r'\n\n|\r\n\r\n')
+
+
+def _is_word_char(char):
+    """Whether a character is a word character, as matched by \\w in a str regex"""
+    return char.isalnum() or char == '_'
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton that finds every tag keyword in one pass over a text
+
+    Counts match what the keyword-by-keyword search counts: a keyword of
+    three characters or fewer is stripped and only matches as a whole word
+    (like re.finditer(r'\\b' + keyword + r'\\b')), a longer keyword matches
+    anywhere (like str.count), and in both cases occurrences of the same
+    keyword do not overlap. Occurrences of different keywords may overlap, so
+    "giant cell arteritis" counts for both that keyword and "arteritis".
+    """
+
+    def __init__(self, tag_keywords):
+        """
+        Args:
+            tag_keywords (dict): Keyword list for each tag, in order
+        """
+        # Distinct (pattern, whole word) pairs, and the tags that list each one;
+        # a tag that lists a keyword twice scores it twice
+        self.patterns = []
+        self.pattern_tags = []
+        pattern_ids = {}
+        for tag, keywords in tag_keywords.items():
+            for keyword in keywords:
+                whole_word = len(keyword) <= 3
+                pattern = keyword.lower().strip() if whole_word else keyword.lower()
+                key = (pattern, whole_word)
+                if key not in pattern_ids:
+                    pattern_ids[key] = len(self.patterns)
+                    self.patterns.append(key)
+                    self.pattern_tags.append([])
+                self.pattern_tags[pattern_ids[key]].append(tag)
+
+        # Trie of the patterns
+        transitions = [{}]
+        outputs = [[]]
+        for pattern_id, (pattern, _) in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                if char not in transitions[state]:
+                    transitions.append({})
+                    outputs.append([])
+                    transitions[state][char] = len(transitions) - 1
+                state = transitions[state][char]
+            outputs[state].append(pattern_id)
+
+        # Turn the trie into a DFA: each state's transitions include those of its
+        # failure state (its longest proper suffix in the trie), so scanning never
+        # backtracks. Characters without a transition lead back to the root
+        fail = [0] * len(transitions)
+        self._delta = [dict(transitions[0])] + [None] * (len(transitions) - 1)
+        queue = list(transitions[0].values())
+        for state in queue:
+            outputs[state] = outputs[state] + outputs[fail[state]]
+            delta = dict(self._delta[fail[state]])
+            for char, child in transitions[state].items():
+                fail[child] = self._delta[fail[state]].get(char, 0)
+                delta[char] = child
+                queue.append(child)
+            self._delta[state] = delta
+        self._outputs = outputs
+
+    def scan(self, text):
+        """
+        Find keyword occurrences in a text
+
+        Args:
+            text (str): Lowercased text
+
+        Returns:
+            tuple: (counts, paragraph_counts) - occurrences of each tag's keywords
+                summed per tag, and the number of paragraphs of at least 10
+                characters mentioning each tag
+        """
+        delta = self._delta
+        outputs = self._outputs
+        hits = []
+        state = 0
+        for index, char in enumerate(text):
+            state = delta[state].get(char, 0)
+            if outputs[state]:
+                hits.append((index, state))
+
+        # Paragraph of each position: paragraphs are split at the separators
+        paragraph_starts = [0]
+        paragraph_ends = []
+        for separator in PARAGRAPH_SEPARATOR.finditer(text):
+            paragraph_ends.append(separator.start())
+            paragraph_starts.append(separator.end())
+        paragraph_ends.append(len(text))
+
+        pattern_counts = [0] * len(self.patterns)
+        pattern_next_start = [0] * len(self.patterns)
+        paragraph_tags = {}
+        for end_index, state in hits:
+            for pattern_id in outputs[state]:
+                pattern, whole_word = self.patterns[pattern_id]
+                start = end_index - len(pattern) + 1
+                if whole_word:
+                    # \b on both sides: the characters around the occurrence differ
+                    # in wordness from its first and last characters
+                    before = start > 0 and _is_word_char(text[start - 1])
+                    after = end_index + 1 < len(text) and _is_word_char(text[end_index + 1])
+                    if before == _is_word_char(pattern[0]) or after == _is_word_char(pattern[-1]):
+                        continue
+
+                # Non-overlapping occurrences, leftmost first
+                if start >= pattern_next_start[pattern_id]:
+                    pattern_counts[pattern_id] += 1
+                    pattern_next_start[pattern_id] = end_index + 1
+
+                paragraph = bisect.bisect_right(paragraph_starts, start) - 1
+                if paragraph_ends[paragraph] - paragraph_starts[paragraph] >= 10:
+                    paragraph_tags.setdefault(paragraph, set()).update(self.pattern_tags[pattern_id])
+
+        counts = {}
+        for pattern_id, count in enumerate(pattern_counts):
+            for tag in self.pattern_tags[pattern_id]:
+                counts[tag] = counts.get(tag, 0) + count
+
+        paragraph_counts = {}
+        for tags in paragraph_tags.values():
+            for tag in tags:
+                paragraph_counts[tag] = paragraph_counts.get(tag, 0) + 1
+
+        return counts, paragraph_counts
+
+
+# Built once per process; every document is scanned with the same automaton
+KEYWORD_AUTOMATON = KeywordAutomaton({**DISEASES, **DOCUMENT_TYPES})
+
+
+def match_to_predefined_tags(text_content, tag_candidates=None):
+    """
+    Match text content or candidate tags to the predefined list of valid tags.
+    This ensures that only approved, standardized tags are used.
+    
+    Args:
+        text_content (str): The text content to analyze for tag matches
+        tag_candidates (list, optional): List of potential tag candidates to filter
+        
+    Returns:
+        list: List of matched predefined tags
+    """
+    # Store all predefined tag keys
+    all_tag_keys = list(DISEASES.keys()) + list(DOCUMENT_TYPES.keys())
+    
+    # Initialize result tags and tag scores
+    matched_tags = []
+    tag_scores = {}
+    
+    # If tag candidates are provided, check if any match our predefined tags
+    if tag_candidates and isinstance(tag_candidates, list):
+        for candidate in tag_candidates:
+            if not isinstance(candidate, str):
+                continue
+                
+            # Direct match (case insensitive)
+            candidate_lower = candidate.lower()
+            
+            # Check for direct match with keys
+            for tag in all_tag_keys:
+                if tag.lower() == candidate_lower:
+                    if tag not in matched_tags:
+                        matched_tags.append(tag)
+                        # High score for exact match
+                        tag_scores[tag] = 100
+                        break
+            
+            # If no direct match, check for partial matches
+            if not any(tag.lower() == candidate_lower for tag in all_tag_keys):
+                # Check disease categories
+                for disease, keywords in DISEASES.items():
+                    for keyword in keywords:
+                        # Improved matching with boundary checking for short keywords
+                        if len(keyword) <= 3:
+                            # For short terms, use word boundary regex
+                            pattern = r'\b' + re.escape(keyword.lower().strip()) + r'\b'
+                            if re.search(pattern, candidate_lower):
+                                if disease not in matched_tags:
+                                    matched_tags.append(disease)
+                                    # Score based on how much of the term matched
+                                    tag_scores[disease] = tag_scores.get(disease, 0) + 5
+                                break
+                        else:
+                            # For longer terms, use contains check
+                            if keyword.lower() in candidate_lower:
+                                if disease not in matched_tags:
+                                    matched_tags.append(disease)
+                                    # Score based on how much of the term matched
+                                    tag_scores[disease] = tag_scores.get(disease, 0) + 5
+                                break
+                
+                # Check document types
+                for doc_type, keywords in DOCUMENT_TYPES.items():
+                    for keyword in keywords:
+                        # Improved matching with boundary checking for short keywords
+                        if len(keyword) <= 3:
+                            # For short terms, use word boundary regex
+                            pattern = r'\b' + re.escape(keyword.lower().strip()) + r'\b'
+                            if re.search(pattern, candidate_lower):
+                                if doc_type not in matched_tags:
+                                    matched_tags.append(doc_type)
+                                    # Score based on how much of the term matched
+                                    tag_scores[doc_type] = tag_scores.get(doc_type, 0) + 5
+                                break
+                        else:
+                            # For longer terms, use contains check
+                            if keyword.lower() in candidate_lower:
+                                if doc_type not in matched_tags:
+                                    matched_tags.append(doc_type)
+                                    # Score based on how much of the term matched
+                                    tag_scores[doc_type] = tag_scores.get(doc_type, 0) + 5
+                                break
+    
+    # If text content is provided, search for mentions of predefined tags
+    if text_content and isinstance(text_content, str):
+        text_lower = text_content.lower()
+        
+        # Count every keyword and find the paragraphs mentioning each tag in one pass
+        counts, paragraph_counts = KEYWORD_AUTOMATON.scan(text_lower)
+        
+        # Add tags mentioned significantly in the entire document, diseases first
+        for tag in list(DISEASES) + list(DOCUMENT_TYPES):
+            current_score = counts.get(tag, 0) * 2
+            if current_score >= 5 and tag not in matched_tags:
+                matched_tags.append(tag)
+                tag_scores[tag] = current_score
+        
+        # Give bonus points for each paragraph that mentions a tag
+        for tag, paragraph_count in paragraph_counts.items():
+            if tag in tag_scores:
+                tag_scores[tag] += 2 * paragraph_count
+    
+    # Sort tags by score (most relevant first)
+    sorted_tags = sorted(matched_tags, key=lambda tag: tag_scores.get(tag, 0), reverse=True)
+    
+    # Apply validation to filter implausible tag combinations
+    validated_tags = validate_tag_combinations(sorted_tags, tag_scores, text_content)
+    
+    # Return the most relevant tags (limit to 6)
+    return validated_tags[:6]
+
+def validate_tag_combinations(tags, tag_scores, text_content=None):
+    """
+    Validate tag combinations to filter out implausible combinations and ensure essential tags aren't missed.
+    
+    Args:
+        tags (list): List of candidate tags, sorted by relevance
+        tag_scores (dict): Dictionary of tag scores for each tag
+        text_content (str, optional): The original text content for additional checking
+        
+    Returns:
+        list: Validated and filtered tag list
+    """
+    import re
+    
+    if not tags:
+        return tags
+        
+    # Check 1: Implausible vasculitis combinations
+    # If more than one specific vasculitis tag is present without strong evidence, keep only the highest-scored one
+    vasculitis_types = [
+        "Takayasu", "Polyarteritis Nodosa", "GCA", "GPA", "MPA", "EGPA", 
+        "Immune-Complex Vasculitis", "IgA Vasculitis", "Urticarial Vasculitis",
+        "Anti-GBM", "Cryo"
+    ]
+    
+    present_vasculitis = [tag for tag in tags if tag in vasculitis_types]
+    if len(present_vasculitis) > 1:
+        # Check if they appear together in the text (strong evidence)
+        has_strong_evidence = False
+        if text_content:
+            text_lower = text_content.lower()
+            # Look for phrases that mention multiple vasculitis types explicitly together
+            for i in range(len(present_vasculitis)):
+                for j in range(i+1, len(present_vasculitis)):
+                    tag1 = present_vasculitis[i].lower()
+                    tag2 = present_vasculitis[j].lower()
+                    
+                    # Check if both types are mentioned in the same sentence
+                    nearby_pattern = f"({tag1}[^.!?]{{0,100}}{tag2})|({tag2}[^.!?]{{0,100}}{tag1})"
+                    if re.search(nearby_pattern, text_lower):
+                        has_strong_evidence = True
+                        break
+        
+        # If no strong evidence, keep only the highest scored one
+        if not has_strong_evidence:
+            # Sort by score and keep only the top vasculitis tag
+            sorted_vasculitis = sorted(
+                present_vasculitis, 
+                key=lambda x: tag_scores.get(x, 0),
+                reverse=True
+            )
+            # Remove all but the highest-scored vasculitis tag
+            for tag in sorted_vasculitis[1:]:
+                tags.remove(tag)
+    
+    # Check 2: Ensure strong title matches aren't missing
+    # For example, if "rheumatoid arthritis" is in the title but missing from tags
+    if text_content:
+        # Common high-confidence title patterns that should definitely be tagged
+        high_confidence_patterns = {
+            "Rheumatoid Arthritis": r"\b(rheumatoid arthritis|ra patients)\b",
+            "Guideline": r"\b(guideline|guidelines|recommendations)\b",
+            "Clinical Trial": r"\b(clinical trial|randomized|randomised)\b"
+        }
+        
+        # Extract the first 300 chars which likely include the title
+        title_text = text_content[:300].lower()
+        
+        for tag, pattern in high_confidence_patterns.items():
+            if re.search(pattern, title_text, re.IGNORECASE) and tag not in tags:
+                # This is a high-confidence tag from the title - add it with a high score
+                tags.insert(0, tag)  # Insert at the beginning as it's high-confidence
+                tag_scores[tag] = 90  # High score but below exact match (100)
+    
+    # Check 3: Ensure disease-specific guidelines have the disease tag
+    if "Guideline" in tags:
+        guideline_disease_patterns = {
+            "Rheumatoid Arthritis": r"\b(rheumatoid arthritis|ra)\s+(?:guideline|recommendation)",
+            "Psoriatic Arthritis": r"\b(psoriatic arthritis|psa)\s+(?:guideline|recommendation)",
+            "Systemic Lupus Erythematosus": r"\b(lupus|sle)\s+(?:guideline|recommendation)",
+            "Osteoarthritis": r"\b(osteoarthritis|oa)\s+(?:guideline|recommendation)",
+            "Gout": r"\b(gout)\s+(?:guideline|recommendation)"
+        }
+        
+        if text_content:
+            for disease, pattern in guideline_disease_patterns.items():
+                if re.search(pattern, text_content[:1000], re.IGNORECASE) and disease not in tags:
+                    # This is a disease-specific guideline - ensure the disease is tagged
+                    tags.insert(1, disease)  # Insert after Guideline
+                    tag_scores[disease] = 85
+                    break
+    
+    return tags
+
+def generate_tags_from_content(text, document=None, metadata=None, title=None):
+    """
+    Generate tags from document content using a multi-strategy approach
+    
+    Priority order:
+    1. Metadata from Crossref/PubMed (if available)
+    2. Explicit keywords listed in the paper
+    3. Important words in title
+    4. Content-based keyword extraction
+    
+    Args:
+        text (str): The full text of the document
+        document (Document, optional): The document object with metadata
+        metadata (dict, optional): Metadata from Crossref/PubMed
+        title (str, optional): The document title, used instead of document.title
+            where the document object is not available (e.g. in a worker process)
+        
+    Returns:
+        list: Generated tags that match our predefined tag list
+    """
+    import re  # Explicitly import re to avoid LSP errors
+    
+    # Initialize list to store tag candidates before filtering
+    tag_candidates = []
+    
+    # STRATEGY 1: Use metadata from Crossref/PubMed if available
+    if metadata:
+        # Get keywords from Crossref (if available)
+        if 'subject' in metadata and isinstance(metadata['subject'], list):
+            # Crossref subjects are often in the form of keywords
+            for subject in metadata['subject']:
+                if isinstance(subject, str) and len(subject) < 50:  # Avoid extremely long subjects
+                    tag_candidates.append(subject)
+        
+        # Some Crossref entries have explicit keywords
+        if 'keyword' in metadata and isinstance(metadata['keyword'], list):
+            for keyword in metadata['keyword']:
+                if isinstance(keyword, str) and len(keyword) < 50:
+                    tag_candidates.append(keyword)
+    
+    # STRATEGY 2: Look for explicit keyword sections in the text
+    # Common patterns for keyword sections
+    keyword_patterns = [
+        # Standard format with space after period
+        r'(?:key[\s-]*words?|KEYWORDS?)[\s:]+([^\n;]{5,200}?)(?:\n\n|\.\s|\.$)',
+        # Format with periods directly followed by next keyword (common in some journals)
+        r'(?:key[\s-]*words?|KEYWORDS?)[\s:]+([^\n;]{5,200}?)(?:\n\n|\n)',
+        # Additional pattern for keywords with period separator (like "word1.word2.word3")
+        r'(?:key[\s-]*words?|KEYWORDS?)[\s:]+([A-Za-z0-9\s\-.]{5,200}?)(?:\n\n|\n)',
+        # MeSH terms format
+        r'(?:MeSH terms?|index terms?|subject headings?)[\s:]+([^\n;]{5,200}?)(?:\n\n|\.\s|\.$)'
+    ]
+    
+    for pattern in keyword_patterns:
+        keyword_match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
+        if keyword_match:
+            keyword_text = keyword_match.group(1).strip()
+            # Keywords are usually separated by commas, semicolons, or periods
+            if ',' in keyword_text:
+                keyword_list = [k.strip() for k in keyword_text.split(',')]
+            elif ';' in keyword_text:
+                keyword_list = [k.strip() for k in keyword_text.split(';')]
+            elif '.' in keyword_text and keyword_text.count('.') > 1:
+                # To handle period-separated keywords which need special processing
+                if re.search(r'\.[A-Z]', keyword_text):
+                    # Handle the format from the rheumatoid vasculitis paper
+                    # First, extract the first keyword before any period
+                    first_match = re.match(r'^([^.]+)', keyword_text)
+                    keywords = []
+                    if first_match:
+                        # Extract the first keyword, before any period
+                        first_keyword = first_match.group(1).strip()
+                        if first_keyword and len(first_keyword) > 2:
+                            keywords.append(first_keyword)
+                    
+                    # Then extract all keywords that start with period + capital letter
+                    period_keywords = re.findall(r'\.([A-Z][^.]+)(?=\.|$)', keyword_text)
+                    for kw in period_keywords:
+                        kw = kw.strip()
+                        if kw and len(kw) > 2:
+                            keywords.append(kw)
+                    
+                    keyword_list = keywords
+                else:
+                    # For other period formats, normalize first
+                    normalized = keyword_text.replace('. ', ' | ').replace(' .', ' | ').replace('.', ' | ')
+                    keyword_list = [k.strip() for k in normalized.split('|') if k.strip()]
+            else:
+                # If no recognized separators, it might be one keyword or space-separated
+                keyword_list = [keyword_text]
+            
+            # Add keywords found in the document
+            for keyword in keyword_list:
+                if len(keyword) > 2 and len(keyword) < 50:  # Avoid very short or long keywords
+                    tag_candidates.append(keyword)
+            
+            # If we found keywords, no need to try other patterns
+            if tag_candidates:
+                break
+    
+    # STRATEGY 3: Extract important terms from title
+    if title is None and document is not None:
+        title = document.title
+    if title:
+        # Add the entire title as a candidate
+        tag_candidates.append(title)
+        title = title.lower()
+        
+        # Add common disease and document type patterns
+        important_patterns = [
+            # Disease patterns
+            r"(rheumatoid arthritis|systemic lupus|psoriatic arthritis|ankylosing spondylitis|osteoarthritis|gout|systemic sclerosis|vasculitis|sjogren's syndrome|polymyalgia rheumatica|polymyositis|fibromyalgia|interstitial lung disease|myositis)",
+            # Study type patterns
+            r"(guidelines?|recommendations?|consensus|meta-analysis|systematic review|cohort study|case report|case series|clinical trial|cross-sectional study|case-control study)"
+        ]
+        
+        for pattern in important_patterns:
+            matches = re.finditer(pattern, title)
+            for match in matches:
+                tag = match.group(1)
+                # Capitalize first letter of each word to make tags look nicer
+                tag = ' '.join(word.capitalize() for word in tag.split())
+                tag_candidates.append(tag)
+    
+    # STRATEGY 4: Include specific sections of the document text for matching
+    # First 200 chars often contain the abstract which has key terms
+    if text and len(text) > 200:
+        tag_candidates.append(text[:200])
+    
+    # Also include any paragraphs that mention "conclusion" as they often contain key concepts
+    conclusion_match = re.search(r'(?:Conclusion|Summary)s?[:\s]+([^\.]+\.){1,3}', text, re.IGNORECASE)
+    if conclusion_match:
+        tag_candidates.append(conclusion_match.group(0))
+    
+    # Now use our helper function to match against predefined tags
+    # This ensures we only use standardized tags from our dictionaries
+    matched_tags = match_to_predefined_tags(text_content=text, tag_candidates=tag_candidates)
+    
+    # If no predefined tags were matched, use some general fallback tags
+    if not matched_tags:
+        matched_tags = ["Rheumatology", "Research Paper"]
+    
+    # The match_to_predefined_tags function already:
+    # 1. Matches text against our standard disease/document type dictionaries
+    # 2. Scores and sorts tags by relevance
+    # 3. Limits to 6 tags maximum
+    
+    return matched_tags
@@ -0,0 +1,798 @@
+"""
+Vector Index Module
+
+This module keeps a process-resident copy of every chunk embedding so that
+similarity search is a single matrix-vector product instead of a Python loop
+over ORM objects. Vectors are stored pre-normalized in one contiguous float32
+matrix with a parallel array of chunk IDs.
+
+Changes made after the index is built are applied incrementally: writers call
+record_embedding_changes() in the same transaction that adds or deletes
+embeddings, which bumps a generation counter row and appends to a change log.
+Each process compares the counter with its own generation on every search and
+only fetches the delta: new vectors go to an append segment and removed chunks
+are tombstoned. The segments are merged by a periodic in-memory compaction.
+
+To avoid one private copy of the matrix per gunicorn worker, the ingestion
+side periodically writes the merged index to a snapshot file (see
+refresh_index_snapshot) that every worker memory-maps as its base segment.
+
+An index covers a single embedding version (see utils/embedding_versions.py).
+Activating another version records a reset, so every process rebuilds its
+index from the newly active set.
+"""
+
+import os
+import logging
+import time
+import datetime
+import threading
+
+import numpy as np
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app import db
+from models import VectorEmbedding, EmbeddingIndexState, EmbeddingChangeLog
+from utils.embeddings import stored_embedding_vector, stored_embedding_sparse, select_stored_embeddings
+from utils.sparse_vectors import CSRMatrix
+from utils.index_snapshot import (
+    read_current_snapshot,
+    load_index_snapshot,
+    write_index_snapshot,
+    SnapshotWriterLock
+)
+
+logger = logging.getLogger(__name__)
+
+# Number of rows fetched per round trip while loading the index
+LOAD_BATCH_SIZE = 2000
+
+# ID of the single EmbeddingIndexState row
+STATE_ROW_ID = 1
+
+# Compact once the delta (appended rows plus tombstones) exceeds this many rows
+# or this fraction of the base segment, whichever is larger
+COMPACT_MIN_ROWS = int(os.environ.get("VECTOR_INDEX_COMPACT_MIN_ROWS", 1024))
+COMPACT_RATIO = float(os.environ.get("VECTOR_INDEX_COMPACT_RATIO", 0.1))
+
+# Storage for the base segment: dense (float32 matrix), sparse (CSR, cost
+# proportional to non-zeros) or auto (sparse once vectors reach SPARSE_MIN_DIMENSIONS)
+INDEX_LAYOUT = os.environ.get("VECTOR_INDEX_LAYOUT", "auto").lower()
+SPARSE_MIN_DIMENSIONS = int(os.environ.get("VECTOR_INDEX_SPARSE_MIN_DIMENSIONS", 512))
+
+# Minimum seconds between checks for a stale shared snapshot (0 disables writing snapshots)
+SNAPSHOT_INTERVAL = int(os.environ.get("VECTOR_INDEX_SNAPSHOT_INTERVAL", 300))
+
+
+class VectorIndex:
+    """
+    In-memory cosine similarity index over the stored chunk embeddings
+
+    Rows live in two segments: a compacted base matrix and an append-only delta
+    matrix. Each segment has an "alive" mask so removed chunks can be
+    tombstoned without copying the matrix.
+
+    Base rows are kept sorted by chunk_id so a chunk's row is found by binary
+    search; this lets the base segment be a read-only memory map of a shared
+    snapshot (see utils/index_snapshot.py) without a per-process lookup table.
+
+    With the sparse layout the base segment is a CSRMatrix, so memory and scan
+    time grow with the number of non-zeros rather than with vector_size. The
+    small delta segment is always dense.
+    """
+
+    def __init__(self, vector_size, model_version=None):
+        self.vector_size = vector_size
+        # Embedding version whose rows are indexed (None = every row)
+        self.model_version = model_version
+        self.sparse = INDEX_LAYOUT == "sparse" or (INDEX_LAYOUT == "auto" and vector_size >= SPARSE_MIN_DIMENSIONS)
+        self.generation = None
+        self.loaded = False
+        self._lock = threading.RLock()
+        self._reset_segments()
+
+    def _reset_segments(self):
+        """Empty both segments"""
+        if self.sparse:
+            self.matrix = CSRMatrix.empty(self.vector_size)
+        else:
+            self.matrix = np.zeros((0, self.vector_size), dtype=np.float32)
+        self.chunk_ids = np.zeros(0, dtype=np.int64)
+        self.alive = np.zeros(0, dtype=bool)
+
+        self.delta_matrix = np.zeros((0, self.vector_size), dtype=np.float32)
+        self.delta_chunk_ids = np.zeros(0, dtype=np.int64)
+        self.delta_alive = np.zeros(0, dtype=bool)
+        self.delta_count = 0
+
+        # Maps chunk_id -> row in the delta segment; base rows are found by binary search
+        self.delta_positions = {}
+        self.live_count = 0
+        self.tombstones = 0
+
+        # Generation of the memory-mapped snapshot backing the base segment, if any
+        self.snapshot_generation = None
+
+    def __len__(self):
+        return self.live_count
+
+    @staticmethod
+    def normalize_rows(matrix):
+        """
+        Scale each row of a matrix to unit length, leaving all-zero rows untouched
+
+        Args:
+            matrix (np.ndarray or CSRMatrix): 2-D float32 matrix
+
+        Returns:
+            np.ndarray: The normalized matrix (modified in place)
+        """
+        if isinstance(matrix, CSRMatrix):
+            return matrix.normalize_rows()
+        norms = np.linalg.norm(matrix, axis=1)
+        nonzero = norms > 0
+        matrix[nonzero] /= norms[nonzero, np.newaxis]
+        return matrix
+
+    def _vector_from_row(self, embedding_blob, embedding):
+        """
+        Convert a stored embedding row (binary or legacy array column) to a float32 vector
+
+        Returns:
+            np.ndarray: The vector, or None if it is empty or wrongly sized
+        """
+        vector = stored_embedding_vector(embedding_blob, embedding)
+        if vector is None or len(vector) != self.vector_size:
+            return None
+        return vector
+
+    def _set_base(self, matrix, chunk_ids, snapshot_generation=None):
+        """
+        Replace both segments with a new base segment
+
+        Args:
+            matrix (np.ndarray): Normalized rows, sorted by chunk_id
+            chunk_ids (np.ndarray): Ascending chunk IDs, one per row
+            snapshot_generation (int): Set when the arrays are a memory-mapped snapshot
+        """
+        self._reset_segments()
+        self.matrix = matrix
+        self.chunk_ids = chunk_ids
+
+        # Only the last row of a chunk that has several embeddings is live
+        alive = np.ones(len(chunk_ids), dtype=bool)
+        if len(chunk_ids) > 1:
+            alive[:-1] = chunk_ids[:-1] != chunk_ids[1:]
+        self.alive = alive
+        self.live_count = int(alive.sum())
+        self.snapshot_generation = snapshot_generation
+
+    def _base_row(self, chunk_id):
+        """Find the live base row for a chunk, or None"""
+        row = int(np.searchsorted(self.chunk_ids, chunk_id, side='right')) - 1
+        if row >= 0 and self.chunk_ids[row] == chunk_id and self.alive[row]:
+            return row
+        return None
+
+    def build(self, use_snapshot=True):
+        """
+        Load the index, preferring the shared snapshot over the database
+
+        Args:
+            use_snapshot (bool): Try to attach to the snapshot before reading the database
+        """
+        with self._lock:
+            if use_snapshot and self._attach_snapshot():
+                return
+            self._build_from_database()
+
+    def _attach_snapshot(self):
+        """
+        Memory-map the live snapshot and catch up with the change log
+
+        Returns:
+            bool: False if there is no usable snapshot and the database must be read
+        """
+        snapshot = load_index_snapshot(self.vector_size, layout="csr" if self.sparse else "dense",
+                                       model_version=self.model_version)
+        if snapshot is None:
+            return False
+        matrix, chunk_ids, snapshot_generation = snapshot
+
+        generation, pruned_through = read_index_state()
+        if snapshot_generation > generation or pruned_through > snapshot_generation:
+            logger.info(f"Vector index snapshot at generation {snapshot_generation} cannot be caught up "
+                        f"(database generation {generation}, change log pruned through {pruned_through})")
+            return False
+
+        self._set_base(matrix, chunk_ids, snapshot_generation)
+        self.generation = snapshot_generation
+        self.loaded = True
+
+        if generation != snapshot_generation and not self.apply_changes(generation):
+            self.loaded = False
+            return False
+
+        logger.info(f"Attached vector index snapshot with {len(chunk_ids)} embeddings at generation "
+                    f"{snapshot_generation} (now at generation {self.generation})")
+        return True
+
+    def _build_from_database(self):
+        """
+        Load every stored embedding into a fresh base segment
+
+        Only the chunk_id and embedding columns are selected so rows are never
+        materialized as ORM objects. Rows in the binary format map straight to
+        np.frombuffer; legacy float8[] rows are converted element by element.
+        """
+        # Read the generation first: changes committed while loading are
+        # re-applied afterwards, which is harmless because applying is idempotent
+        generation, _ = read_index_state()
+        if self.sparse:
+            matrix, chunk_ids, skipped = self._load_sparse_rows()
+        else:
+            matrix, chunk_ids, skipped = self._load_dense_rows()
+
+        # A stable sort keeps the newest embedding last when a chunk has several
+        order = np.argsort(chunk_ids, kind='stable')
+        self._set_base(self.normalize_rows(matrix)[order], chunk_ids[order])
+        self.generation = generation
+        self.loaded = True
+
+        if skipped:
+            logger.warning(f"Skipped {skipped} empty or wrongly sized embeddings while building the vector index")
+        logger.info(f"Built vector index with {len(self)} embeddings at generation {generation}")
+
+    def _stream_rows(self):
+        """Stream (chunk_id, embedding_blob, embedding) for every stored embedding of the indexed version"""
+        return db.session.execute(
+            filter_model_version(
+                select_stored_embeddings(VectorEmbedding.chunk_id),
+                self.model_version
+            )
+            .order_by(VectorEmbedding.id)
+            .execution_options(yield_per=LOAD_BATCH_SIZE)
+        )
+
+    def _load_dense_rows(self):
+        """
+        Read embedding rows into a dense matrix
+
+        Returns:
+            tuple: (matrix, chunk_ids, number of rows skipped)
+        """
+        capacity = db.session.execute(
+            filter_model_version(sa.select(sa.func.count(VectorEmbedding.id)), self.model_version)
+        ).scalar() or 0
+
+        matrix = np.zeros((capacity, self.vector_size), dtype=np.float32)
+        chunk_ids = np.zeros(capacity, dtype=np.int64)
+
+        count = 0
+        skipped = 0
+        for chunk_id, embedding_blob, embedding in self._stream_rows():
+            vector = self._vector_from_row(embedding_blob, embedding)
+            if vector is None:
+                skipped += 1
+                continue
+
+            # Rows added after the count was taken grow the arrays
+            if count >= len(chunk_ids):
+                grow = max(LOAD_BATCH_SIZE, len(chunk_ids))
+                matrix = np.vstack([matrix, np.zeros((grow, self.vector_size), dtype=np.float32)])
+                chunk_ids = np.concatenate([chunk_ids, np.zeros(grow, dtype=np.int64)])
+
+            matrix[count] = vector
+            chunk_ids[count] = chunk_id
+            count += 1
+
+        return matrix[:count], chunk_ids[:count], skipped
+
+    def _load_sparse_rows(self):
+        """
+        Read embedding rows into a CSR matrix without densifying them
+
+        Returns:
+            tuple: (matrix, chunk_ids, number of rows skipped)
+        """
+        rows = []
+        chunk_ids = []
+        skipped = 0
+        for chunk_id, embedding_blob, embedding in self._stream_rows():
+            entry = stored_embedding_sparse(embedding_blob, embedding)
+            if entry is None or entry[2] != self.vector_size:
+                skipped += 1
+                continue
+            rows.append(entry[:2])
+            chunk_ids.append(chunk_id)
+
+        return CSRMatrix.from_rows(rows, self.vector_size), np.array(chunk_ids, dtype=np.int64), skipped
+
+    def _tombstone(self, chunk_id):
+        """Mark the current row for a chunk as deleted, if there is one"""
+        row = self.delta_positions.pop(chunk_id, None)
+        if row is not None:
+            self.delta_alive[row] = False
+        else:
+            row = self._base_row(chunk_id)
+            if row is None:
+                return
+            self.alive[row] = False
+        self.live_count -= 1
+        self.tombstones += 1
+
+    def _append(self, chunk_id, vector):
+        """Add or replace the vector for a chunk in the delta segment"""
+        self._tombstone(chunk_id)
+
+        if self.delta_count >= len(self.delta_chunk_ids):
+            capacity = max(64, 2 * len(self.delta_chunk_ids))
+            matrix = np.zeros((capacity, self.vector_size), dtype=np.float32)
+            chunk_ids = np.zeros(capacity, dtype=np.int64)
+            alive = np.zeros(capacity, dtype=bool)
+            matrix[:self.delta_count] = self.delta_matrix[:self.delta_count]
+            chunk_ids[:self.delta_count] = self.delta_chunk_ids[:self.delta_count]
+            alive[:self.delta_count] = self.delta_alive[:self.delta_count]
+            self.delta_matrix, self.delta_chunk_ids, self.delta_alive = matrix, chunk_ids, alive
+
+        row = self.delta_count
+        norm = np.linalg.norm(vector)
+        self.delta_matrix[row] = vector / norm if norm > 0 else vector
+        self.delta_chunk_ids[row] = chunk_id
+        self.delta_alive[row] = True
+        self.delta_count += 1
+        self.delta_positions[chunk_id] = row
+        self.live_count += 1
+
+    def apply_changes(self, target_generation):
+        """
+        Apply the change log entries recorded since this index was built
+
+        Args:
+            target_generation (int): Generation currently stored in the database
+
+        Returns:
+            bool: False if a full rebuild is required instead
+        """
+        with self._lock:
+            changes = fetch_embedding_changes(self.generation, target_generation, self.vector_size,
+                                              self.model_version)
+            if changes is None:
+                return False
+            removed, added, vectors = changes
+
+            for chunk_id in removed:
+                self._tombstone(chunk_id)
+            for chunk_id in added:
+                if chunk_id in vectors:
+                    self._append(chunk_id, vectors[chunk_id])
+                else:
+                    # The embedding was removed again before we saw the change
+                    self._tombstone(chunk_id)
+
+            self.generation = target_generation
+            logger.debug(f"Applied {len(added)} additions and {len(removed)} removals to the vector index "
+                         f"(generation {target_generation})")
+            return True
+
+    def needs_compaction(self):
+        """Check whether the delta segment and tombstones have grown large enough to merge"""
+        threshold = max(COMPACT_MIN_ROWS, int(COMPACT_RATIO * len(self.chunk_ids)))
+        return self.delta_count + self.tombstones > threshold
+
+    def live_rows(self):
+        """
+        Merge the live rows of both segments
+
+        Returns:
+            tuple: (matrix, chunk_ids) sorted by chunk_id
+        """
+        with self._lock:
+            delta = slice(0, self.delta_count)
+            delta_rows = self.delta_matrix[delta][self.delta_alive[delta]]
+            if self.sparse:
+                matrix = CSRMatrix.vstack([self.matrix[self.alive], CSRMatrix.from_dense(delta_rows)])
+            else:
+                matrix = np.concatenate([self.matrix[self.alive], delta_rows])
+            chunk_ids = np.concatenate([self.chunk_ids[self.alive], self.delta_chunk_ids[delta][self.delta_alive[delta]]])
+
+        order = np.argsort(chunk_ids, kind='stable')
+        if self.sparse:
+            return matrix[order], chunk_ids[order]
+        return np.ascontiguousarray(matrix[order]), chunk_ids[order]
+
+    def compact(self):
+        """
+        Merge the delta segment into the base segment and drop tombstoned rows
+        """
+        with self._lock:
+            matrix, chunk_ids = self.live_rows()
+            self._set_base(matrix, chunk_ids)
+            logger.info(f"Compacted vector index to {len(chunk_ids)} embeddings")
+
+    def ensure_current(self):
+        """
+        Build the index on first use, then keep it in step with the change log
+
+        A single-row lookup of the generation counter is all that happens when
+        nothing has changed.
+        """
+        with self._lock:
+            if not self.loaded:
+                self.build()
+                return
+
+            generation, pruned_through = read_index_state()
+            if generation == self.generation:
+                return
+
+            # Entries we have not seen yet were pruned, so the delta is incomplete
+            if pruned_through > self.generation or not self.apply_changes(generation):
+                self.build()
+                return
+
+            if self.needs_compaction():
+                # Re-attaching to a newer shared snapshot avoids a private copy of the matrix
+                current = read_current_snapshot()
+                if current and current['generation'] > (self.snapshot_generation or -1):
+                    self.build()
+                else:
+                    self.compact()
+
+    def write_snapshot(self):
+        """
+        Write the current contents as the shared snapshot and attach to it
+
+        The caller must hold the snapshot writer lock.
+        """
+        with self._lock:
+            matrix, chunk_ids = self.live_rows()
+            generation = self.generation
+
+        write_index_snapshot(matrix, chunk_ids, generation, model_version=self.model_version)
+        del matrix, chunk_ids
+
+        # Swap the private copy for the shared mapping
+        with self._lock:
+            if not self._attach_snapshot():
+                self._build_from_database()
+
+    def search(self, query_vector, top_k=5, similarity_threshold=0.5):
+        """
+        Find the chunks whose embeddings are most similar to a query vector
+
+        Args:
+            query_vector (np.ndarray): The query embedding
+            top_k (int): Number of top results to return
+            similarity_threshold (float): Minimum similarity score to include result
+
+        Returns:
+            list: List of (chunk_id, similarity_score) tuples, highest score first
+        """
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        if top_k <= 0:
+            return []
+
+        with self._lock:
+            if not self.live_count:
+                return []
+
+            delta = slice(0, self.delta_count)
+            scores = np.concatenate([self.matrix @ query, self.delta_matrix[delta] @ query])
+            alive = np.concatenate([self.alive, self.delta_alive[delta]])
+            chunk_ids = np.concatenate([self.chunk_ids, self.delta_chunk_ids[delta]])
+
+        # Apply the threshold (and tombstones) before selecting the top-k candidates
+        candidates = np.flatnonzero((scores >= similarity_threshold) & alive)
+        logger.debug(f"Found {len(candidates)} similar chunks with similarity >= {similarity_threshold}")
+
+        if len(candidates) > top_k:
+            top = np.argpartition(-scores[candidates], top_k - 1)[:top_k]
+            candidates = candidates[top]
+
+        order = np.argsort(-scores[candidates], kind='stable')
+        candidates = candidates[order]
+
+        return [(int(chunk_ids[i]), float(scores[i])) for i in candidates]
+
+
+def filter_model_version(statement, model_version):
+    """
+    Restrict a VectorEmbedding query to one embedding version
+
+    Args:
+        statement (sa.Select): Query over VectorEmbedding
+        model_version (int): Embedding version ID, or None for every row
+
+    Returns:
+        sa.Select: The filtered query
+    """
+    if model_version is None:
+        return statement
+    return statement.where(VectorEmbedding.model_version == model_version)
+
+
+def fetch_embedding_changes(since_generation, target_generation, vector_size, model_version=None):
+    """
+    Read the change log between two generations and load the added vectors
+
+    Args:
+        since_generation (int): Generation the caller has already applied
+        target_generation (int): Generation to catch up to
+        vector_size (int): Expected dimensionality of the vectors
+        model_version (int): Embedding version to load vectors from (None = any)
+
+    Returns:
+        tuple: (removed chunk IDs, added chunk IDs, {chunk_id: vector}), or None
+               if the log contains a reset and the caller must rebuild
+    """
+    changes = db.session.execute(
+        sa.select(EmbeddingChangeLog.chunk_id, EmbeddingChangeLog.operation)
+        .where(EmbeddingChangeLog.generation > since_generation)
+        .where(EmbeddingChangeLog.generation <= target_generation)
+        .order_by(EmbeddingChangeLog.generation, EmbeddingChangeLog.id)
+    ).all()
+
+    # Collapse the log to the last operation per chunk
+    final_ops = {}
+    for chunk_id, operation in changes:
+        if operation == 'reset':
+            return None
+        final_ops[chunk_id] = operation
+
+    added = [chunk_id for chunk_id, op in final_ops.items() if op == 'add']
+    removed = [chunk_id for chunk_id, op in final_ops.items() if op == 'delete']
+
+    vectors = {}
+    for start in range(0, len(added), LOAD_BATCH_SIZE):
+        batch = added[start:start + LOAD_BATCH_SIZE]
+        rows = db.session.execute(
+            filter_model_version(
+                select_stored_embeddings(VectorEmbedding.chunk_id),
+                model_version
+            )
+            .where(VectorEmbedding.chunk_id.in_(batch))
+            .order_by(VectorEmbedding.id)
+        ).all()
+        for chunk_id, embedding_blob, embedding in rows:
+            vector = stored_embedding_vector(embedding_blob, embedding)
+            if vector is not None and len(vector) == vector_size:
+                vectors[chunk_id] = vector
+
+    return removed, added, vectors
+
+
+def iter_stored_embeddings(vector_size, model_version=None):
+    """
+    Stream every stored embedding without materializing ORM objects
+
+    Args:
+        vector_size (int): Expected dimensionality; other rows are skipped
+        model_version (int): Embedding version to read (None = every row)
+
+    Yields:
+        tuple: (chunk_id, float32 vector)
+    """
+    result = db.session.execute(
+        filter_model_version(
+            select_stored_embeddings(VectorEmbedding.chunk_id),
+            model_version
+        )
+        .order_by(VectorEmbedding.id)
+        .execution_options(yield_per=LOAD_BATCH_SIZE)
+    )
+    for chunk_id, embedding_blob, embedding in result:
+        vector = stored_embedding_vector(embedding_blob, embedding)
+        if vector is not None and len(vector) == vector_size:
+            yield chunk_id, vector
+
+
+def read_index_state():
+    """
+    Read the embedding generation counter
+
+    Returns:
+        tuple: (generation, pruned_through), both 0 if the counter row does not exist yet
+    """
+    row = db.session.execute(
+        sa.select(EmbeddingIndexState.generation, EmbeddingIndexState.pruned_through)
+        .where(EmbeddingIndexState.id == STATE_ROW_ID)
+    ).first()
+    if not row:
+        return 0, 0
+    return row[0], row[1]
+
+
+def _bump_generation():
+    """
+    Increment the generation counter within the current transaction
+
+    The UPDATE takes a row lock that is held until commit, so concurrent
+    writers commit their generations in order and readers never skip one.
+
+    Returns:
+        int: The new generation
+    """
+    bump = (
+        sa.update(EmbeddingIndexState)
+        .where(EmbeddingIndexState.id == STATE_ROW_ID)
+        .values(generation=EmbeddingIndexState.generation + 1, updated_at=datetime.datetime.utcnow())
+        .returning(EmbeddingIndexState.generation)
+        .execution_options(synchronize_session=False)
+    )
+    generation = db.session.execute(bump).scalar()
+    if generation is None:
+        # First change ever recorded: create the counter row
+        db.session.execute(
+            pg_insert(EmbeddingIndexState)
+            .values(id=STATE_ROW_ID, generation=0, pruned_through=0)
+            .on_conflict_do_nothing(index_elements=['id'])
+        )
+        generation = db.session.execute(bump).scalar()
+    return generation
+
+
+def record_embedding_changes(added_chunk_ids=(), removed_chunk_ids=(), reset=False):
+    """
+    Record added or removed embeddings so every process can update its index
+
+    Must be called inside the transaction that makes the change; the caller
+    is responsible for committing.
+
+    Args:
+        added_chunk_ids (iterable): Chunks whose embeddings were created or replaced
+        removed_chunk_ids (iterable): Chunks whose embeddings were deleted
+        reset (bool): Force every process to rebuild its index from scratch
+    """
+    added_chunk_ids = list(added_chunk_ids)
+    removed_chunk_ids = list(removed_chunk_ids)
+    if not (added_chunk_ids or removed_chunk_ids or reset):
+        return
+
+    generation = _bump_generation()
+
+    rows = [{'generation': generation, 'chunk_id': chunk_id, 'operation': 'delete'}
+            for chunk_id in removed_chunk_ids]
+    rows.extend({'generation': generation, 'chunk_id': chunk_id, 'operation': 'add'}
+                for chunk_id in added_chunk_ids)
+    if reset:
+        rows.append({'generation': generation, 'chunk_id': None, 'operation': 'reset'})
+
+    db.session.execute(sa.insert(EmbeddingChangeLog), rows)
+
+    # Keep the database-side vector column in step when pgvector is in use
+    from utils.pgvector_search import sync_pgvector_embeddings
+    sync_pgvector_embeddings(added_chunk_ids)
+
+
+def prune_embedding_change_log(max_age_hours=24):
+    """
+    Delete old change log entries
+
+    Processes whose index is older than the pruned generation rebuild it on
+    their next search.
+
+    Args:
+        max_age_hours (int): Keep entries newer than this
+
+    Returns:
+        int: Number of entries deleted
+    """
+    try:
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(hours=max_age_hours)
+        pruned_through = db.session.execute(
+            sa.select(sa.func.max(EmbeddingChangeLog.generation))
+            .where(EmbeddingChangeLog.created_at < cutoff)
+        ).scalar()
+        if pruned_through is None:
+            return 0
+
+        deleted = db.session.execute(
+            sa.delete(EmbeddingChangeLog)
+            .where(EmbeddingChangeLog.generation <= pruned_through)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.execute(
+            sa.update(EmbeddingIndexState)
+            .where(EmbeddingIndexState.id == STATE_ROW_ID)
+            .where(EmbeddingIndexState.pruned_through < pruned_through)
+            .values(pruned_through=pruned_through)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+        logger.info(f"Pruned {deleted} embedding change log entries through generation {pruned_through}")
+        return deleted
+    except Exception as e:
+        logger.exception(f"Error pruning embedding change log: {str(e)}")
+        db.session.rollback()
+        return 0
+
+
+_last_snapshot_check = 0.0
+_snapshot_check_lock = threading.Lock()
+
+
+def refresh_index_snapshot(force=False):
+    """
+    Write a new shared snapshot if the live one is behind the database
+
+    Called from the background document processor when it is idle. Checks are
+    rate limited to one per SNAPSHOT_INTERVAL seconds, and a file lock ensures
+    only one process writes at a time; the others skip the check.
+
+    Args:
+        force (bool): Ignore the rate limit
+
+    Returns:
+        bool: True if a snapshot was written
+    """
+    global _last_snapshot_check
+
+    if not SNAPSHOT_INTERVAL and not force:
+        return False
+
+    with _snapshot_check_lock:
+        now = time.time()
+        if not force and now - _last_snapshot_check < SNAPSHOT_INTERVAL:
+            return False
+        _last_snapshot_check = now
+
+    try:
+        with SnapshotWriterLock() as acquired:
+            if not acquired:
+                return False
+
+            generation, _ = read_index_state()
+            current = read_current_snapshot()
+            if current and current['generation'] >= generation:
+                return False
+
+            from utils.embeddings import get_embedding_model
+            model = get_embedding_model()
+            index = get_vector_index(model.vector_size, model.model_version)
+            index.write_snapshot()
+            return True
+    except Exception as e:
+        logger.exception(f"Error writing vector index snapshot: {str(e)}")
+        return False
+
+
+# Global index instance, shared by all threads in this process
+_vector_index = None
+_vector_index_lock = threading.Lock()
+
+
+def get_vector_index(vector_size, model_version=None):
+    """
+    Get or initialize the process-wide vector index
+
+    Args:
+        vector_size (int): Dimensionality of the stored embeddings
+        model_version (int): Embedding version to index (None = every row)
+
+    Returns:
+        VectorIndex: The shared index, loaded and up to date
+    """
+    global _vector_index
+
+    with _vector_index_lock:
+        if (_vector_index is None or _vector_index.vector_size != vector_size
+                or _vector_index.model_version != model_version):
+            _vector_index = VectorIndex(vector_size, model_version)
+
+    _vector_index.ensure_current()
+    return _vector_index
+
+
+def invalidate_vector_index():
+    """Drop the in-memory index so the next search reloads it"""
+    global _vector_index
+
+    with _vector_index_lock:
+        _vector_index = None
@@ -12,7 +12,6 @@ import datetime
 import threading
 import time
 import queue
-import requests
 from urllib.parse import urlparse
 from bs4 import BeautifulSoup
 import trafilatura
@@ -20,7 +19,10 @@ import trafilatura
 from app import db, app
 from models import Webpage, TextChunk, VectorEmbedding, WebpageProcessingQueue
 from utils.pdf_processor import clean_text
-from utils.embeddings import generate_embeddings
+from utils import http_client
+from utils.embeddings import insert_text_chunks, insert_chunk_embeddings
+from utils.vector_index import record_embedding_changes
+from utils.job_queue import claim_queue_entry, fail_abandoned_entries, release_lease, LeaseHeartbeat
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -86,7 +88,7 @@ def extract_content_with_bs4(url):
         headers = {
             'User-Agent': 'ROXI-Rheumatology/1.0 (Research Tool)'
         }
-        response = requests.get(url, headers=headers, timeout=10)
+        response = http_client.get(url, headers=headers)
         response.raise_for_status()
         
         soup = BeautifulSoup(response.text, 'html.parser')
@@ -151,11 +153,13 @@ def create_chunks_for_webpage(webpage):
     """
     Create text chunks for a webpage and store them in the database
     
+    All chunks are written with one bulk INSERT ... RETURNING.
+    
     Args:
         webpage (Webpage): The webpage model object
         
     Returns:
-        list: List of created TextChunk objects
+        list: (chunk_id, text) pairs of the created chunks
     """
     if not webpage.content:
         logger.error(f"No content to chunk for webpage {webpage.id}")
@@ -169,78 +173,88 @@ def create_chunks_for_webpage(webpage):
         return []
     
     # Store chunks in database
-    created_chunks = []
-    for idx, chunk_text in enumerate(chunks):
-        chunk = TextChunk(
-            webpage_id=webpage.id,
-            text=chunk_text,
-            chunk_index=idx
-        )
-        db.session.add(chunk)
-        created_chunks.append(chunk)
+    chunk_ids = insert_text_chunks(chunks, webpage_id=webpage.id)
     
     db.session.commit()
-    logger.info(f"Created {len(created_chunks)} chunks for webpage {webpage.id}")
+    logger.info(f"Created {len(chunk_ids)} chunks for webpage {webpage.id}")
     
-    return created_chunks
+    return list(zip(chunk_ids, chunks))
 
 def create_embeddings_for_chunks(chunks):
     """
     Create vector embeddings for webpage chunks
     
+    The chunks are encoded in one batch and written with one bulk INSERT.
+    
     Args:
-        chunks (list): List of TextChunk objects
+        chunks (list): (chunk_id, text) pairs, as returned by create_chunks_for_webpage
         
     Returns:
-        list: List of created VectorEmbedding objects
+        list: IDs of the chunks that got an embedding
     """
     if not chunks:
         return []
     
-    created_embeddings = []
-    for chunk in chunks:
-        embedding_vec = generate_embeddings(chunk.text)
-        if embedding_vec is not None:
-            embedding = VectorEmbedding(
-                chunk_id=chunk.id,
-                embedding=embedding_vec
-            )
-            db.session.add(embedding)
-            created_embeddings.append(embedding)
-    
-    if created_embeddings:
+    chunk_ids, chunk_texts = zip(*chunks)
+    embedded_chunk_ids = insert_chunk_embeddings(list(chunk_ids), list(chunk_texts))
+    
+    if embedded_chunk_ids:
+        record_embedding_changes(added_chunk_ids=embedded_chunk_ids)
         db.session.commit()
-        logger.info(f"Created {len(created_embeddings)} embeddings for webpage chunks")
+        logger.info(f"Created {len(embedded_chunk_ids)} embeddings for webpage chunks")
+    
+    return embedded_chunk_ids
+
+def claim_webpage(webpage_id=None):
+    """
+    Claim a webpage's queue entry, or the oldest claimable one
     
-    return created_embeddings
+    Args:
+        webpage_id (int, optional): Only claim this webpage
+        
+    Returns:
+        QueueLease: The claimed entry (lease.key is the webpage ID), or None
+    """
+    return claim_queue_entry(WebpageProcessingQueue, WebpageProcessingQueue.webpage_id, key=webpage_id)
 
-def process_webpage(webpage_id):
+def process_webpage(webpage_id, lease=None):
     """
     Process a webpage's content and generate embeddings
     
     Args:
         webpage_id (int): ID of the webpage to process
+        lease (QueueLease, optional): The caller's claim on the webpage's queue
+            entry; without one the webpage is claimed here if it has an entry
         
     Returns:
         bool: True if processing succeeded, False otherwise
     """
     logger.info(f"Starting to process webpage: {webpage_id}")
     
+    if lease is None:
+        lease = claim_webpage(webpage_id)
+        if not lease and WebpageProcessingQueue.query.filter_by(webpage_id=webpage_id).first():
+            logger.info(f"Webpage {webpage_id} is not pending or is being processed by another worker")
+            return False
+    
     # Get the webpage and its queue entry
     webpage = Webpage.query.get(webpage_id)
-    queue_entry = WebpageProcessingQueue.query.filter_by(webpage_id=webpage_id).first()
+    queue_entry = WebpageProcessingQueue.query.get(lease.entry_id) if lease else None
     
     if not webpage:
         logger.error(f"Webpage not found for ID: {webpage_id}")
+        if queue_entry:
+            # Give up the claim instead of holding it until the lease expires
+            queue_entry.status = 'failed'
+            queue_entry.error_message = "Webpage not found"
+            queue_entry.completed_at = datetime.datetime.utcnow()
+            release_lease(queue_entry)
+            db.session.commit()
         return False
     
+    # Keep the claim alive while the webpage is processed
+    heartbeat = LeaseHeartbeat(WebpageProcessingQueue, lease).start() if lease else None
     try:
-        # Update queue status to processing if it exists
-        if queue_entry:
-            queue_entry.status = 'processing'
-            queue_entry.started_at = datetime.datetime.utcnow()
-            db.session.commit()
-        
         # Extract content if not already extracted
         if not webpage.content:
             title, content = extract_webpage_content(webpage.url)
@@ -267,8 +281,11 @@ def process_webpage(webpage_id):
         
         # Update queue status to completed if it exists
         if queue_entry:
+            if heartbeat.lost:
+                raise RuntimeError(f"Lost the claim on webpage {webpage_id} while processing it")
             queue_entry.status = 'completed'
             queue_entry.completed_at = datetime.datetime.utcnow()
+            release_lease(queue_entry)
         
         db.session.commit()
         logger.info(f"Successfully processed webpage: {webpage_id}")
@@ -277,15 +294,22 @@ def process_webpage(webpage_id):
         
     except Exception as e:
         logger.exception(f"Error processing webpage {webpage_id}: {str(e)}")
+        db.session.rollback()
         
-        # Update queue status to failed if it exists
-        if queue_entry:
+        # Update queue status to failed if it exists and is still ours
+        if queue_entry and not heartbeat.lost:
+            queue_entry = WebpageProcessingQueue.query.get(lease.entry_id)
             queue_entry.status = 'failed'
             queue_entry.error_message = str(e)
             queue_entry.completed_at = datetime.datetime.utcnow()
+            release_lease(queue_entry)
             db.session.commit()
         
         return False
+    
+    finally:
+        if heartbeat:
+            heartbeat.stop()
 
 def background_processor():
     """Background thread to process webpages from the queue"""
@@ -300,24 +324,25 @@ def background_processor():
                 try:
                     webpage_id = webpage_queue.get(timeout=5)
                 except queue.Empty:
-                    # No webpages in queue, check for pending ones in database
-                    with app.app_context():
-                        pending_queue = WebpageProcessingQueue.query.filter_by(status='pending').all()
-                        if pending_queue:
-                            for entry in pending_queue:
-                                webpage_queue.put(entry.webpage_id)
-                            continue
-                    # If no webpages in queue or database, just continue the loop
-                    continue
-                
-                logger.info(f"Processing webpage {webpage_id} from queue")
+                    webpage_id = None
                 
                 # Process webpage with app context
                 with app.app_context():
-                    process_webpage(webpage_id)
-                
-                # Mark task as complete
-                webpage_queue.task_done()
+                    if webpage_id is not None:
+                        lease = claim_webpage(webpage_id)
+                        # Mark task as complete
+                        webpage_queue.task_done()
+                        if not lease:
+                            continue
+                    else:
+                        # No webpages in queue, claim a pending one from the database
+                        fail_abandoned_entries(WebpageProcessingQueue)
+                        lease = claim_webpage()
+                        if not lease:
+                            continue
+                    
+                    logger.info(f"Processing webpage {lease.key} from queue")
+                    process_webpage(lease.key, lease=lease)
                 
             except Exception as e:
                 logger.exception(f"Error in background processor: {str(e)}")